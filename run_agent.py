@@ -1,6 +1,5 @@
 import sys
-from splitwise_mcp.agent.audio import AudioTranscriber
-from splitwise_mcp.agent.client import SplitwiseAgent
+from splitwise_mcp.agent.backends import create_agent, create_transcriber
 from colorama import Fore, Style
 import time
 import json
@@ -12,8 +11,9 @@ def main():
     print(" - 't' or 'text':   Type text input")
     print(" - 'q' or 'quit':   Exit")
     
-    agent = SplitwiseAgent()
-    transcriber = AudioTranscriber()
+    # Backends come from SPLITWISE_LLM_BACKEND / SPLITWISE_STT_BACKEND
+    agent = create_agent()
+    transcriber = create_transcriber()
     
     while True:
         try:
@@ -53,18 +53,18 @@ def main():
                         break # Done with this turn
                         
                     elif result["type"] == "confirmation_required":
-                        tool_name = result["tool_name"]
-                        args = result["tool_args"]
+                        calls = result["calls"]
                         
-                        print(f"\n{Fore.YELLOW}⚠️  Proposed Action:{Style.RESET_ALL}")
-                        print(f"   Function: {tool_name}")
-                        print(f"   Args: {json.dumps(args, indent=2)}")
+                        print(f"\n{Fore.YELLOW}⚠️  Proposed Action{'s' if len(calls) > 1 else ''}:{Style.RESET_ALL}")
+                        for call in calls:
+                            print(f"   Function: {call['tool_name']}")
+                            print(f"   Args: {json.dumps(call['tool_args'], indent=2)}")
                         
                         confirm = input(f"\n{Fore.WHITE}Proceed? (yes/edit/cancel): {Style.RESET_ALL}").lower().strip()
                         
                         if confirm in ['y', 'yes']:
                             print("Executing...")
-                            final_resp = agent.execute_tool_and_reply(tool_name, args)
+                            final_resp = agent.execute_tools_and_reply(calls)
                             print(f"\n{Fore.MAGENTA}🤖 Agent: {final_resp}{Style.RESET_ALL}")
                             break # Request completed
                             
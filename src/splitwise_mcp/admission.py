@@ -0,0 +1,421 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import time
+from collections import deque
+from functools import lru_cache
+from splitwise_mcp.state import get_backend
+
+# Admission control for the HTTP servers (SSE and the FastAPI connector).
+#
+# Every request is attributed to a tenant, must pass that tenant's token
+# bucket, and then takes one of a fixed number of global slots. When the slots
+# are busy, requests wait in per-tenant queues that are served by weighted
+# fair queueing, so a tenant flooding the server only lengthens its own queue.
+# Anything that can't be admitted gets 429/503 with a Retry-After hint instead
+# of tying up a worker.
+#
+# On the MCP SSE transport a tool call is a POST /messages that is answered
+# with 202 before the tool runs; the tool then runs inside the long-lived
+# /sse request. So the middleware only rate-limits those POSTs, and tools
+# decorated with @admitted() take their slot (and queue) while they run,
+# attributed to the tenant that opened the stream.
+
+# Idle tenant state is dropped once this many tenants are tracked.
+MAX_TRACKED_TENANTS = 10000
+
+# (controller, tenant key) of the stream a tool call arrived on
+_stream_tenant = contextvars.ContextVar("splitwise_stream_tenant", default=None)
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+def parse_weights(spec: str) -> dict:
+    """'alice=2,bob=0.5' -> {'alice': 2.0, 'bob': 0.5}"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            tenant, weight = item.split("=", 1)
+            weights[tenant.strip()] = float(weight)
+    return weights
+
+@lru_cache(maxsize=8)
+def parse_proxies(value: str):
+    """
+    Trusted proxy networks from a comma-separated list of addresses/CIDRs.
+    "unix" trusts requests without a peer address (a unix socket, as used
+    between the supervisor and its workers).
+    """
+    networks = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if item:
+            networks.append(item if item == "unix" else ipaddress.ip_network(item, strict=False))
+    return tuple(networks)
+
+def _trusted(client, proxies) -> bool:
+    if not client or not client[0]:
+        return "unix" in proxies
+    try:
+        address = ipaddress.ip_address(client[0])
+    except ValueError:
+        return False
+    return any(n != "unix" and address in n for n in proxies)
+
+def tenant_of(scope, trusted_proxies: str = None) -> str:
+    """
+    Tenant key for a request: a hash of the Authorization header (the
+    caller's credential), else the client address. X-Tenant-ID and
+    X-Forwarded-For are only honoured when the request comes from a trusted
+    proxy (`trusted_proxies`, default SPLITWISE_TRUSTED_PROXIES); anyone
+    else could rotate them to get fresh quotas.
+    """
+    if trusted_proxies is None:
+        trusted_proxies = os.getenv("SPLITWISE_TRUSTED_PROXIES", "")
+    headers = dict(scope.get("headers") or [])
+    client = scope.get("client")
+    if _trusted(client, parse_proxies(trusted_proxies)):
+        tenant = headers.get(b"x-tenant-id")
+        if tenant:
+            return tenant.decode("latin-1")[:64]
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            # The address our proxy saw is the last hop it appended
+            client = (forwarded.decode("latin-1").split(",")[-1].strip(), 0)
+    auth = headers.get(b"authorization")
+    if auth:
+        return "auth:" + hashlib.sha256(auth).hexdigest()[:12]
+    return f"ip:{client[0]}" if client and client[0] else "anonymous"
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TenantState:
+    def __init__(self, weight: float, rate: float, burst: float, now: float):
+        self.weight = weight
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = now
+        self.inflight = 0
+        self.streams = 0
+        self.vtime = 0.0
+        self.waiters = deque()
+        self.admitted = 0
+        self.rejected = {"rate": 0, "queue": 0, "timeout": 0, "streams": 0}
+        self.wait_total = 0.0
+
+    def take_token(self, now: float) -> float:
+        """Consume a token; returns 0, or seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class SharedRateLimiter:
+    """
+    Tenant rate limit enforced across replicas through a shared state backend.
+    Fixed windows of burst/rate seconds allowing `burst` requests each, so
+    the long-run rate matches the per-process token buckets.
+    """
+
+    def __init__(self, backend, rate: float, burst: float, clock=time.time):
+        self.backend = backend
+        self.burst = int(burst)
+        self.window = burst / rate
+        self.clock = clock
+
+    def take(self, key: str) -> float:
+        """Count a request; returns 0, or seconds until the tenant's window resets."""
+        now = self.clock()
+        slot = int(now // self.window)
+        count = self.backend.incr(f"rl:{key}:{slot}", ttl=2 * self.window)
+        if count <= self.burst:
+            return 0.0
+        return (slot + 1) * self.window - now
+
+
+class AdmissionController:
+    """
+    Per-tenant rate and concurrency quotas with weighted fair queueing.
+
+    `max_concurrent` slots are shared by all tenants; each tenant may hold at
+    most `tenant_concurrency` of them and may queue up to `tenant_queue`
+    more requests for at most `queue_timeout` seconds. Long-lived streams
+    (the SSE connection) are counted separately against `tenant_streams`.
+
+    With a shared state backend (SPLITWISE_STATE_URL) the rate limit is also
+    checked through `limiter`, so it holds across replicas; slots and queues
+    stay per process.
+    """
+
+    def __init__(self, max_concurrent=None, tenant_concurrency=None, tenant_rate=None, tenant_burst=None,
+                 tenant_queue=None, queue_timeout=None, tenant_streams=None, weights=None, clock=time.monotonic,
+                 limiter=None):
+        self.max_concurrent = int(max_concurrent or _env_float("SPLITWISE_MAX_CONCURRENT", "64"))
+        self.tenant_concurrency = int(tenant_concurrency or _env_float("SPLITWISE_TENANT_CONCURRENCY", "8"))
+        self.tenant_rate = tenant_rate or _env_float("SPLITWISE_TENANT_RATE", "10")
+        self.tenant_burst = tenant_burst or _env_float("SPLITWISE_TENANT_BURST", "20")
+        self.tenant_queue = int(tenant_queue or _env_float("SPLITWISE_TENANT_QUEUE", "32"))
+        self.queue_timeout = queue_timeout or _env_float("SPLITWISE_QUEUE_TIMEOUT", "10")
+        self.tenant_streams = int(tenant_streams or _env_float("SPLITWISE_TENANT_STREAMS", "4"))
+        self.weights = weights if weights is not None else parse_weights(os.getenv("SPLITWISE_TENANT_WEIGHTS"))
+        self.clock = clock
+        if limiter is None:
+            backend = get_backend()
+            if backend.shared:
+                limiter = SharedRateLimiter(backend, self.tenant_rate, self.tenant_burst)
+        self.limiter = limiter
+        self.inflight = 0
+        self.vtime = 0.0
+        self.tenants = {}
+        self._avg_service = 0.5
+
+    def _tenant(self, key: str) -> TenantState:
+        state = self.tenants.get(key)
+        if state is None:
+            if len(self.tenants) >= MAX_TRACKED_TENANTS:
+                self._prune()
+            state = self.tenants[key] = TenantState(
+                self.weights.get(key, 1.0), self.tenant_rate, self.tenant_burst, self.clock()
+            )
+        return state
+
+    def _prune(self):
+        """Forget idle tenants (nothing in flight or queued) to bound memory."""
+        for key in [k for k, s in self.tenants.items() if not (s.inflight or s.streams or s.waiters)]:
+            del self.tenants[key]
+
+    def _eligible(self, state: TenantState) -> bool:
+        return self.inflight < self.max_concurrent and state.inflight < self.tenant_concurrency
+
+    def _grant(self, state: TenantState):
+        self.inflight += 1
+        state.inflight += 1
+        state.admitted += 1
+        # Start-time fair queueing: a tenant that was idle doesn't bank credit.
+        state.vtime = max(state.vtime, self.vtime) + 1.0 / state.weight
+
+    def _dispatch(self):
+        """Hand freed slots to waiting tenants, lowest virtual time first."""
+        while self.inflight < self.max_concurrent:
+            ready = [s for s in self.tenants.values() if s.waiters and s.inflight < self.tenant_concurrency]
+            if not ready:
+                return
+            state = min(ready, key=lambda s: max(s.vtime, self.vtime))
+            future = state.waiters.popleft()
+            if future.done():
+                continue
+            self.vtime = max(self.vtime, state.vtime)
+            self._grant(state)
+            future.set_result(None)
+
+    def _retry_after(self, state: TenantState) -> float:
+        backlog = len(state.waiters) + state.inflight
+        return max(1.0, backlog * self._avg_service / max(1, self.tenant_concurrency))
+
+    async def acquire(self, key: str, rate_limited: bool = True) -> TenantState:
+        """
+        Wait for a slot for `key`. Raises Rejected when the request must be
+        shed. With rate_limited=False the token bucket is not charged (the
+        request that carried the work already was).
+        """
+        now = self.clock()
+        state = self._tenant(key)
+        wait = state.take_token(now) if rate_limited else 0.0
+        if wait:
+            state.rejected["rate"] += 1
+            raise Rejected(429, "Rate limit exceeded", wait)
+        if self.limiter is not None and rate_limited:
+            wait = await asyncio.to_thread(self.limiter.take, key)
+            if wait:
+                state.rejected["rate"] += 1
+                raise Rejected(429, "Rate limit exceeded", wait)
+
+        if not state.waiters and self._eligible(state):
+            self._grant(state)
+            return state
+
+        if len(state.waiters) >= self.tenant_queue:
+            state.rejected["queue"] += 1
+            raise Rejected(503, "Server busy", self._retry_after(state))
+
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return state  # granted just as we timed out
+            future.cancel()
+            state.rejected["timeout"] += 1
+            raise Rejected(503, "Server busy", self._retry_after(state))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(state, 0.0)
+            else:
+                future.cancel()
+            raise
+        finally:
+            if future in state.waiters and future.done():
+                state.waiters.remove(future)
+        state.wait_total += self.clock() - now
+        return state
+
+    def release(self, state: TenantState, service_time: float):
+        self.inflight -= 1
+        state.inflight -= 1
+        self._avg_service = 0.9 * self._avg_service + 0.1 * service_time
+        self._dispatch()
+
+    def open_stream(self, key: str) -> TenantState:
+        """Count a long-lived connection against the tenant's stream quota."""
+        state = self._tenant(key)
+        wait = state.take_token(self.clock())
+        if wait:
+            state.rejected["rate"] += 1
+            raise Rejected(429, "Rate limit exceeded", wait)
+        if state.streams >= self.tenant_streams:
+            state.rejected["streams"] += 1
+            raise Rejected(429, "Too many open connections", 5.0)
+        state.streams += 1
+        state.admitted += 1
+        return state
+
+    def close_stream(self, state: TenantState):
+        state.streams -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "max_concurrent": self.max_concurrent,
+            "queued": sum(len(s.waiters) for s in self.tenants.values()),
+            "tenants": {
+                key: {
+                    "weight": s.weight,
+                    "inflight": s.inflight,
+                    "queued": len(s.waiters),
+                    "streams": s.streams,
+                    "tokens": round(s.tokens, 2),
+                    "admitted": s.admitted,
+                    "rejected": dict(s.rejected),
+                    "avg_wait_ms": round(1000 * s.wait_total / s.admitted, 1) if s.admitted else 0.0,
+                }
+                for key, s in self.tenants.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController. Paths in `stream_paths`
+    are long-lived (SSE) and use the stream quota. `metrics_path` serves the
+    controller's metrics as JSON to holders of the admin token
+    (SPLITWISE_ADMIN_TOKEN, `Authorization: Bearer <token>`); without a
+    token it is not served. See tenant_of for `trusted_proxies`.
+    """
+
+    def __init__(self, app, controller: AdmissionController = None, stream_paths=("/sse",),
+                 metrics_path: str = "/admission/metrics", admin_token: str = None, trusted_proxies: str = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+        self.stream_paths = tuple(stream_paths)
+        self.metrics_path = metrics_path
+        self.admin_token = admin_token if admin_token is not None else os.getenv("SPLITWISE_ADMIN_TOKEN")
+        self.trusted_proxies = (trusted_proxies if trusted_proxies is not None
+                                else os.getenv("SPLITWISE_TRUSTED_PROXIES", ""))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope.get("path", "")
+        if path == self.metrics_path and self.admin_token:
+            # Compared as bytes: compare_digest rejects str with non-ASCII characters
+            supplied = dict(scope.get("headers") or []).get(b"authorization", b"")
+            if not hmac.compare_digest(supplied, f"Bearer {self.admin_token}".encode()):
+                return await _send_json(send, 401, {"detail": "Invalid admin token."})
+            return await _send_json(send, 200, self.controller.metrics())
+
+        key = tenant_of(scope, self.trusted_proxies)
+        if path in self.stream_paths:
+            try:
+                state = self.controller.open_stream(key)
+            except Rejected as e:
+                return await _send_rejection(send, e)
+            token = _stream_tenant.set((self.controller, key))
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _stream_tenant.reset(token)
+                self.controller.close_stream(state)
+
+        try:
+            state = await self.controller.acquire(key)
+        except Rejected as e:
+            return await _send_rejection(send, e)
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(state, time.monotonic() - started)
+
+
+def admitted():
+    """
+    Decorator for async MCP tools: while the call runs it holds one of the
+    admission slots of the stream's tenant, queueing fairly like any other
+    request. A call that is shed returns an error string. Outside an
+    admitted stream (stdio) it runs as is. Sync tools run on the event loop
+    one at a time, so they don't need a slot.
+    """
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            current = _stream_tenant.get()
+            if current is None:
+                return await fn(*args, **kwargs)
+            controller, key = current
+            try:
+                state = await controller.acquire(key, rate_limited=False)
+            except Rejected as e:
+                return f"Error: {e.reason}. Please retry in {max(1, int(e.retry_after + 0.999))}s."
+            started = time.monotonic()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                controller.release(state, time.monotonic() - started)
+        return wrapper
+
+    return decorate
+
+
+async def _send_json(send, status: int, body: dict, headers=()):
+    payload = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+async def _send_rejection(send, rejected: Rejected):
+    retry_after = max(1, int(rejected.retry_after + 0.999))
+    await _send_json(
+        send, rejected.status, {"detail": rejected.reason, "retry_after": retry_after},
+        headers=[(b"retry-after", str(retry_after).encode())],
+    )
@@ -1,34 +1,24 @@
-import sounddevice as sd
-import numpy as np
-import scipy.io.wavfile as wav
 import tempfile
 import os
 from deepgram import DeepgramClient
+from splitwise_mcp.agent.backends import SpeechSynthesizer, Transcriber
+from splitwise_mcp.env import load_env
+from splitwise_mcp.resilience import get_upstream
+
+class AudioTranscriber(Transcriber, SpeechSynthesizer):
+    """Deepgram speech-to-text (nova-2) and text-to-speech (Aura)."""
 
-class AudioTranscriber:
     def __init__(self):
+        load_env()
         # Initialize Deepgram client
         api_key = os.getenv("DEEPGRAM_API_KEY")
         if not api_key:
              raise ValueError("Missing DEEPGRAM_API_KEY in .env")
         self.client = DeepgramClient(api_key=api_key)
 
-    def record_audio(self, duration=10, sample_rate=44100):
-        """
-        Record audio from the microphone for a fixed duration.
-        Returns the path to the temporary WAV file.
-        """
-        print(f"🎤 Recording for {duration} seconds... (Speak now!)")
-        
-        recording = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1)
-        sd.wait()  # Wait until recording is finished
-        
-        print("✅ Recording finished.")
-        
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            wav.write(temp_audio.name, sample_rate, recording)
-            return temp_audio.name
+    def warm(self):
+        """Handshake with Deepgram through a free call (the model list)."""
+        self.client.manage.v1.models.list()
 
     def transcribe_bytes(self, buffer_data):
         """
@@ -37,7 +27,9 @@ class AudioTranscriber:
         print("📝 Transcribing bytes with Deepgram...")
         
         # v5.x: Pass bytes as 'request' kwarg, and options as kwargs
-        response = self.client.listen.v1.media.transcribe_file(
+        # Bounded by the command's deadline and hedged when slower than usual
+        response = get_upstream("deepgram").call(
+            self.client.listen.v1.media.transcribe_file,
             request=buffer_data, 
             model="nova-2", 
             smart_format=True, 
@@ -90,16 +82,3 @@ class AudioTranscriber:
             
         os.remove(filename) # Clean up
         return audio_bytes
-
-    def transcribe(self, audio_path):
-        """
-        Transcribes the audio file using Deepgram.
-        """
-        print("📝 Transcribing with Deepgram...")
-        with open(audio_path, "rb") as audio:
-             buffer_data = audio.read()
-        return self.transcribe_bytes(buffer_data)
-
-    def cleanup(self, audio_path):
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
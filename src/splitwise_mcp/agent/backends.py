@@ -0,0 +1,95 @@
+import importlib
+import os
+import tempfile
+
+class Transcriber:
+    """
+    Speech-to-text engine. Backends implement `transcribe_bytes`; recording
+    and file helpers are shared.
+    """
+
+    def transcribe_bytes(self, buffer_data) -> str:
+        raise NotImplementedError
+
+    def warm(self):
+        """Open connections ahead of the first request. No-op by default."""
+
+    def record_audio(self, duration=10, sample_rate=44100):
+        """
+        Record audio from the microphone for a fixed duration.
+        Returns the path to the temporary WAV file.
+        """
+        import sounddevice as sd
+        import scipy.io.wavfile as wav
+
+        print(f"🎤 Recording for {duration} seconds... (Speak now!)")
+
+        recording = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1)
+        sd.wait()  # Wait until recording is finished
+
+        print("✅ Recording finished.")
+
+        # Save to temp file
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
+            wav.write(temp_audio.name, sample_rate, recording)
+            return temp_audio.name
+
+    def transcribe(self, audio_path):
+        """
+        Transcribes an audio file.
+        """
+        with open(audio_path, "rb") as audio:
+             buffer_data = audio.read()
+        return self.transcribe_bytes(buffer_data)
+
+    def cleanup(self, audio_path):
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+
+class SpeechSynthesizer:
+    """Text-to-speech engine. Returns encoded audio bytes."""
+
+    def generate_speech(self, text) -> bytes:
+        raise NotImplementedError
+
+
+# name -> ("module:attr", extra that provides its dependencies)
+STT_BACKENDS = {
+    "deepgram": ("splitwise_mcp.agent.audio:AudioTranscriber", "voice"),
+    "whispercpp": ("splitwise_mcp.agent.local:WhisperCppTranscriber", "local"),
+}
+LLM_BACKENDS = {
+    "gemini": ("splitwise_mcp.agent.client:GeminiSplitwiseAgent", "agent"),
+    "local": ("splitwise_mcp.agent.local:LocalIntentAgent", "local"),
+}
+TTS_BACKENDS = {
+    "deepgram": ("splitwise_mcp.agent.audio:AudioTranscriber", "voice"),
+    "espeak": ("splitwise_mcp.agent.local:EspeakSynthesizer", "local"),
+}
+
+def _load(registry, name, kind):
+    if name not in registry:
+        raise ValueError(f"Unknown {kind} backend '{name}'. Choose one of: {', '.join(sorted(registry))}")
+    path, extra = registry[name]
+    module_name, attr = path.split(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"{e}. The '{name}' {kind} backend needs: pip install 'splitwise-mcp[{extra}]'") from e
+    return getattr(module, attr)
+
+def create_transcriber(name: str = None) -> Transcriber:
+    """Speech-to-text engine selected by `name` or SPLITWISE_STT_BACKEND (default: deepgram)."""
+    name = name or os.getenv("SPLITWISE_STT_BACKEND", "deepgram")
+    return _load(STT_BACKENDS, name, "speech-to-text")()
+
+def create_agent(name: str = None, **kwargs):
+    """Intent engine selected by `name` or SPLITWISE_LLM_BACKEND (default: gemini)."""
+    name = name or os.getenv("SPLITWISE_LLM_BACKEND", "gemini")
+    return _load(LLM_BACKENDS, name, "intent")(**kwargs)
+
+def create_synthesizer(name: str = None) -> SpeechSynthesizer:
+    """Text-to-speech engine selected by `name` or SPLITWISE_TTS_BACKEND (default: deepgram)."""
+    name = name or os.getenv("SPLITWISE_TTS_BACKEND", "deepgram")
+    return _load(TTS_BACKENDS, name, "text-to-speech")()
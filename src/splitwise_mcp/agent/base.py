@@ -0,0 +1,336 @@
+import os
+from splitwise_mcp.agent.planner import is_error, is_read_only, render_confirmation
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.matching import normalize
+from colorama import Fore, Style
+
+AFFIRMATIVE = {"y", "yes", "yeah", "yep", "yup", "sure", "correct", "right", "ok", "okay", "yes please"}
+SELF_NAMES = {"me", "i", "myself"}
+
+class SplitwiseAgentBase:
+    """
+    Intent engine interface shared by every agent backend.
+
+    Subclasses implement `process_input` (turn user text into a reply or a set
+    of proposed tool calls, see GeminiSplitwiseAgent.process_input for the
+    result shape). Tool execution, local name clarification, confirmation
+    templates and the auto-execute helpers used by the MCP server live here.
+    """
+
+    def __init__(self, splitwise: SplitwiseClient = None):
+        self.splitwise = splitwise or SplitwiseClient()
+        
+        # Tools definitions
+        self.tool_functions = {
+            "add_expense": self._add_expense_impl,
+            "list_friends": self._list_friends_impl,
+            "delete_expense": self._delete_expense_impl,
+            "update_expense": self._update_expense_impl,
+            "_add_expense_impl": self._add_expense_impl,
+            "_list_friends_impl": self._list_friends_impl,
+            "_delete_expense_impl": self._delete_expense_impl,
+            "_update_expense_impl": self._update_expense_impl
+        }
+        
+        # Name correction offered locally, applied if the user answers "yes"
+        self._pending_correction = None
+        # Calls proposed to the user and not yet executed
+        self._awaiting_confirmation = []
+
+        self.candidate_k = int(os.getenv("SPLITWISE_AGENT_CANDIDATES", "8"))
+        print(f"{Fore.CYAN}👥 Pre-loading friends and groups...{Style.RESET_ALL}")
+        try:
+            self.splitwise.directory.name_index()
+        except Exception as e:
+            print(f"{Fore.RED}⚠️ Failed to pre-load data: {e}{Style.RESET_ALL}")
+
+    def warm(self):
+        """Prepare connections and caches ahead of the first turn. No-op by default."""
+
+    # --- Tool Implementations ---
+    def _add_expense_impl(self, amount: str, description: str, friend_names: list[str], split_map: dict = None, group_name: str = None, payer_name: str = None, exclude_names: list[str] = None, currency: str = None, convert_to: str = None):
+        """Add a new expense to Splitwise. Use this when the user wants to split a cost.
+        
+        Args:
+            amount: The numeric amount of the expense (e.g. '50.00').
+            description: Short description of the expense (e.g. 'Dinner', 'Cab').
+            friend_names: List of names of friends to split with. Can be empty if matching a group.
+            split_map: Optional dictionary for unequal splits. 
+                       Keys are names (use 'me' for yourself), Values are amounts (e.g. '10.50') OR percentages (e.g. '50%').
+                       Example: {'me': '40%', 'Sumeet Singh': '60%'}
+            group_name: Optional name of the group to add this expense to.
+            payer_name: Optional name of who paid the full amount. Defaults to current user if not specified.
+            exclude_names: Optional list of names to exclude from a group split.
+            currency: Optional ISO currency code of the amount when the user names one (e.g. 'EUR' for '50 euros').
+            convert_to: Optional ISO currency code to record the expense in, converted at the day's rate.
+        """
+        # This function won't be called automatically by Gemini anymore.
+        # We will call it manually in 'execute_tool'.
+        print(f"{Fore.YELLOW}🛠️  Executing: add_expense({amount}, {description}, {friend_names}, split_map={split_map}, group_name={group_name}, payer={payer_name}, exclude={exclude_names}, currency={currency}, convert_to={convert_to}){Style.RESET_ALL}")
+        try:
+            res = self.splitwise.add_expense(amount, description, friend_names, split_map=split_map, group_name=group_name, payer_name=payer_name, exclude_names=exclude_names, currency=currency, convert_to=convert_to)
+            if res:
+                return f"Success! Added expense (ID: {res.getId()})"
+            return "Failed to add expense."
+        except Exception as e:
+            return f"Error: {e}"
+
+    def _update_expense_impl(self, expense_id: str, amount: str = None, description: str = None, split_map: dict = None, payer_name: str = None, friend_names: list[str] = None):
+        """Correct an existing expense in place. Use this instead of deleting and re-adding when the user fixes an amount, description, payer or split.
+
+        Args:
+            expense_id: ID of the expense to correct.
+            amount: Optional new total amount (e.g. '45.00'). Existing split proportions are kept unless split_map is given.
+            description: Optional new description.
+            split_map: Optional new unequal split, same format as add_expense. Example: {'me': '40%', 'Sumeet Singh': '60%'}
+            payer_name: Optional new payer ('me' for the user).
+            friend_names: Optional new list of friends to split with (the user is always included).
+        """
+        print(f"{Fore.YELLOW}🛠️  Executing: update_expense({expense_id}, amount={amount}, description={description}, split_map={split_map}, payer={payer_name}, friends={friend_names}){Style.RESET_ALL}")
+        try:
+            _, changed = self.splitwise.update_expense(expense_id, amount=amount, description=description, split_map=split_map, payer_name=payer_name, friend_names=friend_names)
+            if not changed:
+                return f"Expense {expense_id} already matches; nothing changed."
+            return f"Success! Updated {', '.join(changed)} of expense {expense_id}."
+        except Exception as e:
+            return f"Error: {e}"
+
+    def _delete_expense_impl(self, expense_id: str):
+        """Delete an expense by ID."""
+        print(f"{Fore.YELLOW}🛠️  Executing: delete_expense({expense_id}){Style.RESET_ALL}")
+        try:
+            self.splitwise.delete_expense(expense_id)
+            return f"Success! Deleted expense {expense_id}."
+        except Exception as e:
+            return f"Error: {e}"
+
+    def _list_friends_impl(self):
+        """List the user's friends on Splitwise."""
+        print(f"{Fore.YELLOW}🛠️  Executing: list_friends(){Style.RESET_ALL}")
+        try:
+            friends = self.splitwise.get_friends()
+            names = [f.name for f in friends]
+            return f"Friends: {', '.join(names)}"
+        except Exception as e:
+            return f"Error: {e}"
+
+    # --- Agent Logic ---
+
+    def process_input(self, user_text: str):
+        raise NotImplementedError
+
+    def _defer_response(self, tool_name, result):
+        """Hook for backends that must report tool results back to a model."""
+
+    def _clarify_names(self, tool_name, tool_args):
+        """
+        Check the names in an add_expense call against the local directory.
+        Returns None when every name resolves. Otherwise returns a clarification
+        question and, when each unknown name has one clear best match, stores
+        the corrected call so a plain "yes" can run it without asking Gemini.
+        """
+        if tool_name not in ("add_expense", "_add_expense_impl", "update_expense", "_update_expense_impl"):
+            return None
+        directory = self.splitwise.directory
+        corrected = dict(tool_args)
+        renames = {}
+        unresolved = []
+
+        def check(name, kind):
+            if not name or name.lower() in SELF_NAMES:
+                return
+            found = self.splitwise.find_friend_by_name(name) if kind == "friend" else self.splitwise.find_group_by_name(name)
+            if found:
+                return
+            match = directory.resolve(name, kind)
+            if match.clear:
+                renames[name] = match.entry[3]
+            else:
+                unresolved.append((name, [c[3] for c in match.candidates]))
+
+        try:
+            for name in tool_args.get("friend_names") or []:
+                check(name, "friend")
+            check(tool_args.get("payer_name"), "friend")
+            check(tool_args.get("group_name"), "group")
+        except Exception as e:
+            print(f"{Fore.RED}⚠️ Name check skipped: {e}{Style.RESET_ALL}")
+            return None
+
+        if unresolved:
+            name, options = unresolved[0]
+            if options:
+                return f"I couldn't find '{name}'. Did you mean {' or '.join(options)}?"
+            return f"I couldn't find '{name}' in your friends or groups. Could you spell it?"
+        if not renames:
+            return None
+
+        if corrected.get("friend_names"):
+            corrected["friend_names"] = [renames.get(n, n) for n in corrected["friend_names"]]
+        for key in ("payer_name", "group_name"):
+            if corrected.get(key) in renames:
+                corrected[key] = renames[corrected[key]]
+        if corrected.get("split_map"):
+            corrected["split_map"] = {renames.get(k, k): v for k, v in corrected["split_map"].items()}
+        self._pending_correction = (tool_name, corrected)
+
+        asks = [f"'{new}' instead of '{old}'" for old, new in renames.items()]
+        return f"Did you mean {' and '.join(asks)}? Say yes to continue."
+
+    def _begin_turn(self, user_text: str):
+        """
+        Settle state left over from the previous turn. Returns a result when the
+        message can be answered without Gemini (a "yes" to a local correction).
+        """
+        if self._awaiting_confirmation:
+            # The user answered with new text instead of confirming.
+            for call in self._awaiting_confirmation:
+                self._defer_response(call["tool_name"], "Not executed. The user replied instead of confirming.")
+            self._awaiting_confirmation = []
+
+        if self._pending_correction:
+            pending, self._pending_correction = self._pending_correction, None
+            if normalize(user_text) in AFFIRMATIVE:
+                # Answered locally: the real tool result replaces the deferred one.
+                self._pending_responses = []
+                return self._confirmation([pending], "local_clarification")
+        return None
+
+    def _plan(self, calls, text):
+        """Turn the function calls and text of one model response into a reply, answering what we can locally."""
+        if not calls:
+            return {
+                "type": "text",
+                "content": text
+            }
+
+        replies = []
+        writes = []
+        for tool_name, tool_args in calls:
+            if is_read_only(tool_name):
+                replies.append(self._answer_read_only(tool_name, tool_args))
+            else:
+                writes.append((tool_name, tool_args))
+
+        if not writes:
+            return {
+                "type": "text",
+                "content": "\n".join(replies)
+            }
+
+        for tool_name, tool_args in writes:
+            clarification = self._clarify_names(tool_name, tool_args)
+            if clarification:
+                for name, _ in writes:
+                    self._defer_response(name, f"Not executed. Asked the user: {clarification}")
+                if self._pending_correction and len(writes) > 1:
+                    # Only a single corrected call can be confirmed with a bare "yes".
+                    self._pending_correction = None
+                return {
+                    "type": "text",
+                    "content": clarification
+                }
+
+        return self._confirmation(writes, "manual_execution")
+
+    def _answer_read_only(self, tool_name, tool_args):
+        # Read-only tools are answered from the local directory. The result is
+        # owed to Gemini but sent with the next message instead of costing a
+        # round trip now.
+        print(f"{Fore.MAGENTA}🔄 Answering read-only tool locally: {tool_name}{Style.RESET_ALL}")
+        result = self._call_tool(tool_name, tool_args)
+        self._defer_response(tool_name, result)
+        return result
+
+    def _confirmation(self, calls, call_id):
+        self._awaiting_confirmation = [{"tool_name": name, "tool_args": args} for name, args in calls]
+        return {
+            "type": "confirmation_required",
+            "tool_name": calls[0][0],
+            "tool_args": calls[0][1], # Dictionary
+            "calls": list(self._awaiting_confirmation),
+            "call_id": call_id
+        }
+
+    def _call_tool(self, tool_name, tool_args):
+        func = self.tool_functions.get(tool_name)
+        if not func:
+            return f"Error: Tool {tool_name} not found."
+        try:
+            # Unpack args
+            return func(**tool_args)
+        except Exception as e:
+            return f"Error calling function: {e}"
+
+    def execute_tool_and_reply(self, tool_name, tool_args):
+        """
+        Executes the tool (after user said YES) and returns the reply text.
+        """
+        return self.execute_tools_and_reply([{"tool_name": tool_name, "tool_args": tool_args}])
+
+    def execute_tools_and_reply(self, calls):
+        """
+        Executes confirmed tool calls and returns the reply text.
+
+        Successful results are phrased from local templates and handed to Gemini
+        with the next message. Gemini is only asked for a follow-up reply right
+        away when a call failed, so it can explain or ask for a correction.
+        """
+        self._awaiting_confirmation = []
+        results = []
+        for call in calls:
+            tool_name, tool_args = call["tool_name"], call["tool_args"]
+            result = self._call_tool(tool_name, tool_args)
+            print(f"{Fore.GREEN}✅ Output: {result}{Style.RESET_ALL}")
+            results.append((tool_name, tool_args, result))
+        return self._reply(results)
+
+    def _reply(self, results):
+        """Reply text for executed (tool_name, tool_args, result) triples."""
+        if not any(is_error(result) for _, _, result in results):
+            for tool_name, _, result in results:
+                self._defer_response(tool_name, result)
+            return "\n".join(render_confirmation(name, args, result) for name, args, result in results)
+
+        return self._follow_up(results)
+
+    def _follow_up(self, results):
+        """Reply for a batch of results that contains an error."""
+        return "\n".join(result for _, _, result in results)
+
+    def reject_tool(self, reason: str):
+        """
+        User said NO or provided correction.
+        We send this feedback to Gemini so it can try again.
+        """
+        # process_input answers the pending call with a "not executed" function
+        # response before the correction, so Gemini knows it was rejected.
+        return self.process_input(reason)
+
+    def process_and_execute(self, user_text: str) -> str:
+        """
+        Process user text and auto-execute any tool calls.
+        Used by MCP server where tools should be executed without human confirmation.
+        
+        Returns the final response text (either from Gemini or tool execution result).
+        """
+        result = self.process_input(user_text)
+        
+        if result["type"] == "text":
+            return result["content"]
+        
+        elif result["type"] == "confirmation_required":
+            # Auto-execute every proposed call
+            return self.execute_tools_and_reply(result["calls"])
+        
+        return "Unexpected response type."
+
+    def process_and_execute_stream(self, user_text: str, on_event=None) -> str:
+        """
+        Streaming variant of process_and_execute. Backends without a streaming
+        API report the whole reply as a single text event.
+        """
+        reply = self.process_and_execute(user_text)
+        if on_event:
+            on_event("text", reply)
+        return reply
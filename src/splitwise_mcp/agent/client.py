@@ -1,120 +1,201 @@
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from google.genai import types
+from splitwise_mcp.agent.base import SplitwiseAgentBase
+from splitwise_mcp.agent.context_cache import ContextCache, GeminiCacheBackend
+from splitwise_mcp.agent.planner import canonical_name, function_calls, is_read_only, response_text
 from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.env import load_env
+from splitwise_mcp.resilience import UpstreamTimeout, get_upstream
 from colorama import Fore, Style
 
-class GeminiSplitwiseAgent:
-    def __init__(self):
+class GeminiSplitwiseAgent(SplitwiseAgentBase):
+    def __init__(self, splitwise: SplitwiseClient = None, context_cache: ContextCache = None):
+        load_env()
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
              raise ValueError("Missing GEMINI_API_KEY in .env")
         
         self.client = genai.Client(api_key=api_key)
-        self.splitwise = SplitwiseClient()
         self.model_name = "gemini-3-flash-preview"
-        
-        # Tools definitions
-        self.tool_functions = {
-            "add_expense": self._add_expense_impl,
-            "list_friends": self._list_friends_impl,
-            "delete_expense": self._delete_expense_impl,
-            "_add_expense_impl": self._add_expense_impl,
-            "_list_friends_impl": self._list_friends_impl,
-            "_delete_expense_impl": self._delete_expense_impl
-        }
-        
-        # Pre-load friends and groups for context
-        print(f"{Fore.CYAN}👥 Pre-loading friends and groups...{Style.RESET_ALL}")
-        try:
-            friends = self.splitwise.get_friends()
-            self.friend_list_str = ", ".join([f"{f.getFirstName()} {f.getLastName()} (ID: {f.getId()})" for f in friends])
-            
-            groups = self.splitwise.get_groups()
-            self.group_list_str = ", ".join([f"{g.getName()} (ID: {g.getId()})" for g in groups])
-        except Exception as e:
-            print(f"{Fore.RED}⚠️ Failed to pre-load data: {e}{Style.RESET_ALL}")
-            self.friend_list_str = "Could not load friends."
-            self.group_list_str = "Could not load groups."
 
-        system_prompt = (
+        # Function responses owed to Gemini, sent along with the next message
+        self._pending_responses = []
+
+        # Friends/groups are not pasted into the inline system prompt. Each
+        # message gets only the top-k candidates retrieved from the local
+        # directory index, so prompt size stays constant however large the
+        # account is. A cached prefix also carries the full roster (up to
+        # SPLITWISE_AGENT_CACHED_ROSTER entries), since it is not resent.
+        super().__init__(splitwise)
+        self.max_cached_roster = int(os.getenv("SPLITWISE_AGENT_CACHED_ROSTER", "1000"))
+
+        self.system_prompt = (
             "You are a helpful assistant that manages Splitwise expenses.\n"
-            f"Here is the user's current friend list: [{self.friend_list_str}].\n"
-            f"Here is the user's current group list: [{self.group_list_str}].\n"
+            "Each user message starts with a [Directory candidates] block listing the friends and groups "
+            "from the user's account whose names best match that message, with their IDs.\n"
             "Rules:\n"
-            "1. If the transcribed name does NOT exactly match a friend's name in the list, "
-            "you MUST ask for clarification. For example, if user says 'Humeet' but you have 'Sumeet' in the list, "
-            "ask 'Did you mean Sumeet?' Do NOT assume phonetic matches.\n"
+            "1. Always call the tool with the names exactly as the user said them, even if they look mis-transcribed "
+            "(e.g. 'Humeet' when the candidates have 'Sumeet'). Names are checked locally and the user is asked to "
+            "confirm near-misses. Do NOT silently substitute a different name.\n"
             "2. If the name is completely not found, ask the user to spell it again.\n"
-            "3. Do NOT guess friend IDs. Only use IDs from the list above.\n"
+            "3. Do NOT guess friend IDs. Only use IDs from the candidates.\n"
             "4. If the user wants to add an expense, call 'add_expense' with the matched friend names.\n"
             "5. If the user specifies unequal splits (e.g. 'I owe 10, Sumeet owes 20', or 'Split 50/50%'), use 'split_map'. "
             "Map 'me' or 'I' to the user's share, and friend names to their share (amounts or percentages).\n"
-            "6. If the user mentions a group (e.g. 'add to Apartment group'), use 'group_name'. Match against the group list above.\n"
+            "6. If the user mentions a group (e.g. 'add to Apartment group'), use 'group_name'. Match against the group candidates.\n"
             "7. If the user specifies who paid (e.g. 'Alice paid'), use 'payer_name'. Default is YOU paid.\n"
             "8. If excluding someone from a group expense, use 'exclude_names'.\n"
             "9. To delete an expense, use 'delete_expense' with the ID (if known) or ask user for it.\n"
-            "10. Be concise and conversational."
+            "10. To correct an expense (wrong amount, split, payer or description), use 'update_expense' with its ID "
+            "and only the fields that change. Do not delete and re-add it.\n"
+            "11. If the user names a currency (e.g. '50 euros', '2000 yen'), pass its ISO code as 'currency'. "
+            "Only set 'convert_to' when the user asks to record it in another currency.\n"
+            "12. Be concise and conversational."
         )
 
-        # Create chat session
-        self.chat = self.client.chats.create(
-            model=self.model_name,
-            config=types.GenerateContentConfig(
-                tools=[self._add_expense_impl, self._list_friends_impl, self._delete_expense_impl],
-                system_instruction=system_prompt,
-                automatic_function_calling={"disable": True} 
+        self.tools = [self._add_expense_impl, self._list_friends_impl, self._delete_expense_impl, self._update_expense_impl]
+
+        # The prompt, tool schemas and roster as one server-side cached prefix
+        # (see context_cache.py); SPLITWISE_AGENT_CONTEXT_CACHE=0 sends them inline.
+        if context_cache is None and os.getenv("SPLITWISE_AGENT_CONTEXT_CACHE", "1").lower() in ("1", "true", "yes"):
+            context_cache = ContextCache(
+                GeminiCacheBackend(self.client), self.model_name,
+                ttl=float(os.getenv("SPLITWISE_AGENT_CACHE_TTL", "3600")),
+                min_chars=int(os.getenv("SPLITWISE_AGENT_CACHE_MIN_CHARS", "4000")),
             )
-        )
+        self.context_cache = context_cache
+        self._cached_name = None
+        self.chat = self._new_chat()
 
-    # --- Tool Implementations ---
-    # --- Tool Implementations ---
-    def _add_expense_impl(self, amount: str, description: str, friend_names: list[str], split_map: dict = None, group_name: str = None, payer_name: str = None, exclude_names: list[str] = None):
-        """Add a new expense to Splitwise. Use this when the user wants to split a cost.
-        
-        Args:
-            amount: The numeric amount of the expense (e.g. '50.00').
-            description: Short description of the expense (e.g. 'Dinner', 'Cab').
-            friend_names: List of names of friends to split with. Can be empty if matching a group.
-            split_map: Optional dictionary for unequal splits. 
-                       Keys are names (use 'me' for yourself), Values are amounts (e.g. '10.50') OR percentages (e.g. '50%').
-                       Example: {'me': '40%', 'Sumeet Singh': '60%'}
-            group_name: Optional name of the group to add this expense to.
-            payer_name: Optional name of who paid the full amount. Defaults to current user if not specified.
-            exclude_names: Optional list of names to exclude from a group split.
-        """
-        # This function won't be called automatically by Gemini anymore.
-        # We will call it manually in 'execute_tool'.
-        print(f"{Fore.YELLOW}🛠️  Executing: add_expense({amount}, {description}, {friend_names}, split_map={split_map}, group_name={group_name}, payer={payer_name}, exclude={exclude_names}){Style.RESET_ALL}")
+    def _new_chat(self, history=None):
+        if self._cached_name:
+            config = types.GenerateContentConfig(
+                cached_content=self._cached_name,
+                automatic_function_calling={"disable": True}
+            )
+        else:
+            config = types.GenerateContentConfig(
+                tools=self.tools,
+                system_instruction=self.system_prompt,
+                automatic_function_calling={"disable": True}
+            )
+        return self.client.chats.create(model=self.model_name, config=config, history=history)
+
+    def _cached_prefix(self):
+        """(system instruction, tool declarations) for the cached prefix."""
+        directory = self.splitwise.directory
+        friends, groups = directory.friends(), directory.groups()
+        instruction = self.system_prompt
+        if len(friends) + len(groups) <= self.max_cached_roster:
+            friend_str = ", ".join(f"{f.name} (ID: {f.id})" for f in friends) or "none"
+            group_str = ", ".join(f"{g.name} (ID: {g.id})" for g in groups) or "none"
+            instruction += (
+                "\n\n[Account directory]\n"
+                "All of the user's friends and groups. The per-message candidates are the likeliest matches.\n"
+                f"Friends: {friend_str}\n"
+                f"Groups: {group_str}"
+            )
+        tools = [types.Tool(function_declarations=[
+            types.FunctionDeclaration.from_callable_with_api_option(callable=fn) for fn in self.tools
+        ])]
+        return instruction, tools
+
+    def _sync_prefix(self):
+        """Move the chat onto the current cached prefix, keeping its history."""
+        if self.context_cache is None:
+            return
         try:
-            res = self.splitwise.add_expense(amount, description, friend_names, split_map=split_map, group_name=group_name, payer_name=payer_name, exclude_names=exclude_names)
-            if res:
-                return f"Success! Added expense (ID: {res.getId()})"
-            return "Failed to add expense."
+            name = self.context_cache.handle(self.splitwise.directory.version, self._cached_prefix)
         except Exception as e:
-            return f"Error: {e}"
+            print(f"{Fore.RED}⚠️ Prompt cache unavailable: {e}{Style.RESET_ALL}")
+            name = None
+        if name != self._cached_name:
+            self._cached_name = name
+            self.chat = self._new_chat(history=self.chat.get_history())
 
-    def _delete_expense_impl(self, expense_id: str):
-        """Delete an expense by ID."""
-        print(f"{Fore.YELLOW}🛠️  Executing: delete_expense({expense_id}){Style.RESET_ALL}")
+    def warm(self):
+        """Handshake with Gemini and create the cached prefix before the first turn."""
+        self.client.models.get(model=self.model_name)
+        self._sync_prefix()
+
+    # --- Agent Logic ---
+
+    def build_context(self, user_text: str) -> str:
+        """
+        Prefix a message with the directory entries that best match it.
+        Re-reads the directory on every call, so friends or groups added since
+        the agent started show up without rebuilding the chat.
+        """
         try:
-            self.splitwise.delete_expense(expense_id)
-            return f"Success! Deleted expense {expense_id}."
+            friends, groups = self.splitwise.directory.candidates(
+                user_text, k_friends=self.candidate_k, k_groups=max(1, self.candidate_k // 2)
+            )
         except Exception as e:
-            return f"Error: {e}"
+            print(f"{Fore.RED}⚠️ Directory lookup failed: {e}{Style.RESET_ALL}")
+            return user_text
+        friend_str = ", ".join(f"{name} (ID: {i})" for _, _, i, name in friends) or "none matched"
+        group_str = ", ".join(f"{name} (ID: {i})" for _, _, i, name in groups) or "none matched"
+        return (
+            "[Directory candidates]\n"
+            f"Friends: {friend_str}\n"
+            f"Groups: {group_str}\n"
+            "[User message]\n"
+            f"{user_text}"
+        )
 
-    def _list_friends_impl(self):
-        """List the user's friends on Splitwise."""
-        print(f"{Fore.YELLOW}🛠️  Executing: list_friends(){Style.RESET_ALL}")
+    def _with_pending(self, message):
+        """
+        Prepend any function responses owed for calls that were answered
+        locally, so the chat history stays well-formed.
+        """
+        if not self._pending_responses:
+            return message
+        parts = self._pending_responses
+        self._pending_responses = []
+        if isinstance(message, str):
+            return parts + [types.Part(text=message)]
+        return parts + list(message)
+
+    def _send(self, message):
+        # Bounded by the command's deadline; never hedged, since a chat turn
+        # can't be sent twice.
+        self._sync_prefix()
+        pending, history = self._pending_responses, list(self.chat.get_history())
         try:
-            friends = self.splitwise.get_friends()
-            names = [f"{f.getFirstName()} {f.getLastName()}" for f in friends]
-            return f"Friends: {', '.join(names)}"
-        except Exception as e:
-            return f"Error: {e}"
+            return get_upstream("gemini").call(self.chat.send_message, self._with_pending(message))
+        except UpstreamTimeout:
+            self._roll_back(history, pending)
+            raise
 
-    # --- Agent Logic ---
+    def _send_stream(self, message):
+        """Streaming counterpart of _send; yields response chunks."""
+        self._sync_prefix()
+        pending, history = self._pending_responses, list(self.chat.get_history())
+        message = self._with_pending(message)
+        chat = self.chat
+        try:
+            yield from get_upstream("gemini").stream(lambda: chat.send_message_stream(message))
+        except UpstreamTimeout:
+            self._roll_back(history, pending)
+            raise
+
+    def _roll_back(self, history, pending):
+        """
+        Forget a turn that timed out. The abandoned call keeps running and
+        would append to the chat's history after the user got an error, so
+        continue on a new chat from the history before it, with the function
+        responses it carried owed again.
+        """
+        self._pending_responses = pending + self._pending_responses
+        self.chat = self._new_chat(history=history)
+
+    def _defer_response(self, tool_name, result):
+        self._pending_responses.append(types.Part(
+            function_response=types.FunctionResponse(name=tool_name, response={'result': result})
+        ))
 
     def process_input(self, user_text: str):
         """
@@ -122,160 +203,108 @@ class GeminiSplitwiseAgent:
         Returns structure:
          { "type": "text", "content": "..." }
          OR
-         { "type": "confirmation_required", "tool_name": "...", "tool_args": {...}, "call_id": ... }
+         { "type": "confirmation_required", "tool_name": "...", "tool_args": {...}, "call_id": ...,
+           "calls": [{"tool_name": "...", "tool_args": {...}}, ...] }
+        `tool_name`/`tool_args` mirror the first entry of `calls`; Gemini may
+        return several function calls in one response.
         """
-        print(f"{Fore.CYAN}🧠 Thinking...{Style.RESET_ALL}")
-        response = self.chat.send_message(user_text)
-        
-        # Check if the model wants to call a function
-        # response.parts is a list. Look for function_call.
-        if response.candidates and response.candidates[0].content.parts:
-            for part in response.candidates[0].content.parts:
-                if part.function_call:
-                    fc = part.function_call
-                    tool_name = fc.name
-                    tool_args = fc.args
-                    
-                    # Optimization: Auto-execute read-only tools
-                    if tool_name == "_list_friends_impl":
-                        print(f"{Fore.MAGENTA}🔄 Auto-executing read-only tool: {tool_name}{Style.RESET_ALL}")
-                        # Execute and feed back to model
-                        # 1. Execute tool locally.
-                        func = self.tool_functions.get(tool_name)
-                        if not func:
-                             res_str = f"Error: Tool {tool_name} not found."
-                        else:
-                             res_str = func(**tool_args)
-                        
-                        # 2. Send ToolResponse to Gemini
-                        tool_response_part = types.Part(
-                            function_response=types.FunctionResponse(
-                                name=tool_name,
-                                response={'result': res_str}
-                            )
-                        )
-                        print(f"{Fore.MAGENTA}📤 Sending auto-result back to model...{Style.RESET_ALL}")
-                        
-                        # Recurse: Ask model again
-                        next_response = self.chat.send_message([tool_response_part])
-                        
-                        # Check THIS response for function calls (e.g. add_expense)
-                        if next_response.candidates and next_response.candidates[0].content.parts:
-                             for next_part in next_response.candidates[0].content.parts:
-                                 if next_part.function_call:
-                                     return {
-                                        "type": "confirmation_required",
-                                        "tool_name": next_part.function_call.name,
-                                        "tool_args": next_part.function_call.args, 
-                                        "call_id": "auto_recursive"
-                                     }
-                        
-                        # Else it's text
-                        return {
-                            "type": "text",
-                            "content": next_response.text
-                        }
+        local = self._begin_turn(user_text)
+        if local:
+            return local
 
+        print(f"{Fore.CYAN}🧠 Thinking...{Style.RESET_ALL}")
+        response = self._send(self.build_context(user_text))
+        return self._plan(function_calls(response), response_text(response))
 
-
-                    return {
-                        "type": "confirmation_required",
-                        "tool_name": tool_name,
-                        "tool_args": tool_args, # Dictionary
-                        "call_id": "manual_execution" 
-                    }
-        
-        # Otherwise just text
-        return {
-            "type": "text",
-            "content": response.text
-        }
-
-    def execute_tool_and_reply(self, tool_name, tool_args):
+    def _follow_up(self, results):
         """
-        Executes the tool (after user said YES) and sends the output back to Gemini.
-        Returns the final text response from Gemini.
+        Reply for a batch of results that contains an error. Gemini is asked to
+        explain the failure or ask for a correction.
         """
-        # 1. Execute
-        func = self.tool_functions.get(tool_name)
-        if not func:
-            result = f"Error: Tool {tool_name} not found."
-        else:
-            try:
-                # Unpack args
-                result = func(**tool_args)
-            except Exception as e:
-                result = f"Error calling function: {e}"
-
-        print(f"{Fore.GREEN}✅ Output: {result}{Style.RESET_ALL}")
-
-        # 2. Send result back to Gemini
-        # We need to construct a ToolResponse part.
-        
-        # In the new SDK, we send the message with the function response.
-        # We need to construct the 'parts' with 'function_response'.
-        
         # NOTE: With automatic_function_calling disabled, we need to send the response manually.
-        # The SDK expects us to send a message containing the function response.
-        
-        # part = types.Part.from_function_response(name=tool_name, response={'result': result}) 
-        # API expects specific structure. 
-        
-        # Let's try sending it as a properly formatted tool response.
-        tool_response_part = types.Part(
-            function_response=types.FunctionResponse(
-                name=tool_name,
-                response={'result': result}
+        tool_response_parts = [
+            types.Part(
+                function_response=types.FunctionResponse(
+                    name=tool_name,
+                    response={'result': result}
+                )
             )
-        )
+            for tool_name, _, result in results
+        ]
 
         try:
-            response = self.chat.send_message([tool_response_part])
-            return response.text
+            response = self._send(tool_response_parts)
+            return response_text(response)
         except Exception as e:
             print(f"{Fore.RED}⚠️ Gemini failed to acknowledge tool execution: {e}{Style.RESET_ALL}")
-            return f"✅ Action Executed Successfully: {result}\n\n(Note: Gemini could not generate a follow-up reply due to network/server issues)."
+            outcome = "\n".join(result for _, _, result in results)
+            return f"{outcome}\n\n(Note: Gemini could not generate a follow-up reply due to network/server issues)."
 
-    def reject_tool(self, reason: str):
-        """
-        User said NO or provided correction.
-        We send this feedback to Gemini so it can try again.
+    def process_and_execute_stream(self, user_text: str, on_event=None) -> str:
         """
-        # We just send the user's correction text.
-        # Gemini sees: 
-        # User: "Split 50..."
-        # Model: Call add_expense(50)
-        # User (Feedback): "No, change amount to 15"
-        # Model: Call add_expense(15)
-        
-        # BUT, if we just send "No..." does Gemini know we REJECTED the previous call?
-        # Since we didn't send the ToolResponse, the previous turn is technically incomplete?
-        # Actually in Google GenAI, if we don't send the function response, 
-        # we might need to "rewind" or just send the text.
-        # Sending text "No, do X" usually works as a follow up.
-        
-        # Let's treat it as a new user message.
-        return self.process_input(reason)
+        Streaming variant of process_and_execute.
 
-    def process_and_execute(self, user_text: str) -> str:
+        Reads the Gemini response as a stream. Text deltas are reported through
+        `on_event("text", delta)` as they arrive, and each function call through
+        `on_event("tool", name)` as soon as it is complete. Read-only lookups
+        start right away, in parallel with the rest of the stream. Write calls
+        wait for the full response and then run one at a time, in order, so a
+        clarification for a later call keeps all of them from executing.
         """
-        Process user text and auto-execute any tool calls.
-        Used by MCP server where tools should be executed without human confirmation.
-        
-        Returns the final response text (either from Gemini or tool execution result).
-        """
-        result = self.process_input(user_text)
-        
-        if result["type"] == "text":
-            return result["content"]
-        
-        elif result["type"] == "confirmation_required":
-            # Auto-execute the tool
-            tool_name = result["tool_name"]
-            tool_args = result["tool_args"]
-            return self.execute_tool_and_reply(tool_name, tool_args)
-        
-        return "Unexpected response type."
+        emit = on_event or (lambda kind, payload: None)
+
+        local = self._begin_turn(user_text)
+        if local:
+            emit("tool", canonical_name(local["tool_name"]))
+            return self.execute_tools_and_reply(local["calls"])
+
+        print(f"{Fore.CYAN}🧠 Thinking (streaming)...{Style.RESET_ALL}")
+        texts = []
+        calls = []
+        lookups = {}  # index in calls -> Future
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for chunk in self._send_stream(self.build_context(user_text)):
+                for tool_name, tool_args in function_calls(chunk):
+                    calls.append((tool_name, tool_args))
+                    emit("tool", canonical_name(tool_name))
+                    if is_read_only(tool_name):
+                        lookups[len(calls) - 1] = pool.submit(self._call_tool, tool_name, tool_args)
+                delta = response_text(chunk)
+                if delta:
+                    texts.append(delta)
+                    emit("text", delta)
+
+            replies = []
+            for i, future in sorted(lookups.items()):
+                tool_name = calls[i][0]
+                print(f"{Fore.MAGENTA}🔄 Answering read-only tool locally: {tool_name}{Style.RESET_ALL}")
+                result = future.result()
+                self._defer_response(tool_name, result)
+                replies.append(result)
+
+        if not calls:
+            return "".join(texts)
+
+        writes = [(name, args) for name, args in calls if not is_read_only(name)]
+        if not writes:
+            return "\n".join(replies)
+        for tool_name, tool_args in writes:
+            clarification = self._clarify_names(tool_name, tool_args)
+            if clarification:
+                for name, _ in writes:
+                    self._defer_response(name, f"Not executed. Asked the user: {clarification}")
+                if self._pending_correction and len(writes) > 1:
+                    # Only a single corrected call can be confirmed with a bare "yes".
+                    self._pending_correction = None
+                return "\n".join(replies + [clarification])
+
+        results = []
+        for tool_name, tool_args in writes:
+            result = self._call_tool(tool_name, tool_args)
+            print(f"{Fore.GREEN}✅ Output: {result}{Style.RESET_ALL}")
+            results.append((tool_name, tool_args, result))
+        replies.append(self._reply(results))
+        return "\n".join(replies)
 
 # Export
 SplitwiseAgent = GeminiSplitwiseAgent
@@ -0,0 +1,121 @@
+import hashlib
+import itertools
+import threading
+import time
+
+# The agent's static prefix (rules, tool declarations and the account's
+# friend/group roster) stored once as a Gemini cached-content handle, so a
+# turn only sends the new message.
+#
+# The handle is keyed by the directory version. A new version only
+# recreates the handle when the prefix text actually changed (friends or
+# groups were added, removed or renamed; balance changes leave it alone).
+# Handles are renewed shortly before their TTL runs out. Prefixes shorter
+# than `min_chars` stay inline: Gemini rejects caches below a minimum token
+# count, and small prompts gain nothing from them.
+
+
+class LocalCacheBackend:
+    """In-process stand-in for Gemini's cachedContents, for tests."""
+
+    def __init__(self):
+        self.entries = {}  # name -> (model, system_instruction, tools, ttl)
+        self._ids = itertools.count(1)
+
+    def create(self, model: str, system_instruction: str, tools: list, ttl: float) -> str:
+        name = f"cachedContents/local-{next(self._ids)}"
+        self.entries[name] = (model, system_instruction, tools, ttl)
+        return name
+
+    def delete(self, name: str):
+        self.entries.pop(name, None)
+
+
+class GeminiCacheBackend:
+    """cachedContents on the Gemini API."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model: str, system_instruction: str, tools: list, ttl: float) -> str:
+        from google.genai import types
+        cached = self.client.caches.create(model=model, config=types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            tools=tools,
+            ttl=f"{int(ttl)}s",
+            display_name="splitwise-mcp agent prefix",
+        ))
+        return str(cached.name)
+
+    def delete(self, name: str):
+        self.client.caches.delete(name=name)
+
+
+class ContextCache:
+    """The current cached-content handle for one model's prefix."""
+
+    # Renew a handle once this fraction of its TTL has passed
+    RENEW_AT = 0.9
+
+    def __init__(self, backend, model: str, ttl: float = 3600, min_chars: int = 4000, clock=time.monotonic):
+        self.backend = backend
+        self.model = model
+        self.ttl = ttl
+        self.min_chars = min_chars
+        self.clock = clock
+        self.key = None
+        self.digest = None
+        self.name = None
+        self.created_at = 0.0
+        self.creates = 0
+        self.reuses = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def handle(self, key, build):
+        """
+        Cached-content name for the prefix at `key`, or None to send it
+        inline. build() -> (system_instruction, tools) is only called when
+        `key` changed or the handle is due for renewal.
+        """
+        with self._lock:
+            fresh = self.clock() - self.created_at < self.ttl * self.RENEW_AT
+            if key == self.key and (self.name is None or fresh):
+                self.reuses += 1
+                return self.name
+            system_instruction, tools = build()
+            digest = hashlib.sha1(repr((self.model, system_instruction, tools)).encode()).hexdigest()
+            self.key = key
+            if digest == self.digest and (self.name is None or fresh):
+                # Same prefix under a new directory version (e.g. only balances moved)
+                self.reuses += 1
+                return self.name
+            self.digest = digest
+            self._drop()
+            if len(system_instruction) < self.min_chars:
+                return None
+            try:
+                self.name = self.backend.create(self.model, system_instruction, tools, self.ttl)
+                self.created_at = self.clock()
+                self.creates += 1
+            except Exception:
+                # Unsupported model, prefix below the minimum, quota... Stay
+                # inline until the prefix changes.
+                self.failures += 1
+            return self.name
+
+    def _drop(self):
+        if self.name is None:
+            return
+        name, self.name = self.name, None
+        try:
+            self.backend.delete(name)
+        except Exception:
+            pass  # expires on its own
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def stats(self) -> dict:
+        return {"name": self.name, "creates": self.creates, "reuses": self.reuses, "failures": self.failures}
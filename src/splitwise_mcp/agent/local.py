@@ -0,0 +1,177 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from splitwise_mcp.agent.backends import SpeechSynthesizer, Transcriber
+from splitwise_mcp.agent.base import SplitwiseAgentBase
+from splitwise_mcp.env import load_env
+
+class WhisperCppTranscriber(Transcriber):
+    """
+    Offline speech-to-text with whisper.cpp.
+
+    Uses the `pywhispercpp` bindings when installed, otherwise the
+    `whisper-cli` binary. WHISPER_CPP_MODEL names the ggml model (a path, or a
+    model name such as "base.en" for pywhispercpp); WHISPER_CPP_BIN overrides
+    the binary. Input is converted to 16 kHz mono WAV with ffmpeg when it is
+    available.
+    """
+
+    def __init__(self):
+        load_env()
+        self.model_name = os.getenv("WHISPER_CPP_MODEL", "base.en")
+        self.binary = os.getenv("WHISPER_CPP_BIN", "whisper-cli")
+        self.threads = int(os.getenv("WHISPER_CPP_THREADS", str(os.cpu_count() or 4)))
+        self._model = None
+        try:
+            from pywhispercpp.model import Model
+            self._model = Model(self.model_name, n_threads=self.threads)
+        except ImportError:
+            if not shutil.which(self.binary):
+                raise ValueError(
+                    f"whisper.cpp not found: install pywhispercpp or put '{self.binary}' on PATH (WHISPER_CPP_BIN)"
+                )
+
+    def _to_wav16k(self, src_path):
+        if not shutil.which("ffmpeg"):
+            return src_path
+        dst_path = src_path + ".16k.wav"
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", src_path, "-ar", "16000", "-ac", "1", dst_path],
+            check=True,
+        )
+        return dst_path
+
+    def transcribe_bytes(self, buffer_data):
+        print("📝 Transcribing bytes with whisper.cpp...")
+        with tempfile.NamedTemporaryFile(suffix=".audio", delete=False) as f:
+            f.write(buffer_data)
+            src_path = f.name
+        wav_path = src_path
+        try:
+            wav_path = self._to_wav16k(src_path)
+            if self._model is not None:
+                segments = self._model.transcribe(wav_path)
+                return " ".join(seg.text.strip() for seg in segments).strip()
+            out = subprocess.run(
+                [self.binary, "-m", self.model_name, "-f", wav_path, "-t", str(self.threads), "-nt", "-np"],
+                check=True, capture_output=True, text=True,
+            )
+            return " ".join(line.strip() for line in out.stdout.splitlines() if line.strip())
+        finally:
+            for path in {src_path, wav_path}:
+                self.cleanup(path)
+
+
+class EspeakSynthesizer(SpeechSynthesizer):
+    """Offline text-to-speech with espeak-ng. Returns WAV bytes."""
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise ValueError("espeak-ng not found on PATH")
+        self.voice = os.getenv("ESPEAK_VOICE", "en-us")
+
+    def generate_speech(self, text):
+        out = subprocess.run([self.binary, "-v", self.voice, "--stdout", text], check=True, capture_output=True)
+        return out.stdout
+
+
+AMOUNT_RE = re.compile(r"(?<![\w.])(\d+(?:\.\d{1,2})?)(?!\s*%)")
+PERCENT_RE = re.compile(r"\b(me|i|[a-z]+(?: [a-z]+)?)\s+(\d+(?:\.\d+)?)\s*%")
+DELETE_RE = re.compile(r"\b(?:delete|remove)\b.*?\b(\d{3,})\b")
+UPDATE_RE = re.compile(r"\b(?:change|update|correct|fix|make)\b.*?\bexpense (\d{3,})\b.*?\bto (\d+(?:\.\d{1,2})?)\b")
+PAYER_RE = re.compile(r"\b(?:paid by ([a-z]+(?: [a-z]+)?)|([a-z]+) paid)\b")
+GROUP_RE = re.compile(r"\b(?:in|to) (?:the |my )?([a-z0-9 ]+?) group\b")
+EXCLUDE_RE = re.compile(r"\b(?:except|excluding|exclude|but not|without) ([a-z ,]+?)(?= for | paid |$|\.)")
+WITH_RE = re.compile(r"\bwith ([a-z ,]+?)(?= for | in | to | paid | except | excluding | exclude | but not |$|\.)")
+CURRENCY_RE = re.compile(r"\b\d+(?:\.\d{1,2})? ?(euros?|dollars?|pounds?|rupees?|yen)\b")
+CURRENCY_CODES = {"euro": "EUR", "dollar": "USD", "pound": "GBP", "rupee": "INR", "yen": "JPY"}
+FOR_RE = re.compile(r"\bfor (?!me\b)([a-z0-9 ]+?)(?= with | in | paid | except | excluding |,|$|\.)")
+
+def _split_names(text):
+    names = [n.strip() for n in re.split(r",| and ", text) if n.strip()]
+    return [n.title() for n in names if n not in ("me", "us", "everyone", "all")]
+
+def parse_command(text: str):
+    """
+    Parse a spoken/typed command into (tool_name, tool_args), or None.
+
+    Understands the phrasings the Gemini prompt documents: equal splits with
+    friends, group splits with exclusions, an explicit payer, percentage
+    splits ("me 40% alice 60%"), correcting an amount ("change expense 123 to
+    45"), deleting by ID and listing friends.
+    """
+    t = re.sub(r"\s+", " ", text.lower().replace("$", " ").replace("₹", " ")).strip()
+
+    m = UPDATE_RE.search(t)
+    if m:
+        return "update_expense", {"expense_id": m.group(1), "amount": m.group(2)}
+    m = DELETE_RE.search(t)
+    if m:
+        return "delete_expense", {"expense_id": m.group(1)}
+    if re.search(r"\b(list|show|who are)\b.*\bfriends\b", t):
+        return "list_friends", {}
+
+    amounts = AMOUNT_RE.findall(t)
+    if not amounts:
+        return None
+    args = {"amount": amounts[0], "description": "Expense", "friend_names": []}
+
+    m = CURRENCY_RE.search(t)
+    if m:
+        args["currency"] = CURRENCY_CODES[m.group(1).rstrip("s")]
+    m = FOR_RE.search(t)
+    if m:
+        args["description"] = m.group(1).strip().capitalize()
+    m = GROUP_RE.search(t)
+    if m:
+        args["group_name"] = m.group(1).strip().title()
+    m = PAYER_RE.search(t)
+    if m:
+        payer = (m.group(1) or m.group(2)).strip()
+        if payer not in ("i", "me"):
+            args["payer_name"] = payer.title()
+    m = EXCLUDE_RE.search(t)
+    if m:
+        args["exclude_names"] = _split_names(m.group(1))
+    m = WITH_RE.search(t)
+    if m:
+        args["friend_names"] = _split_names(m.group(1))
+
+    percents = PERCENT_RE.findall(t)
+    if percents:
+        split_map = {}
+        for name, pct in percents:
+            key = "me" if name in ("me", "i") else name.split()[-1].title()
+            split_map[key] = f"{pct}%"
+            if key != "me" and key not in args["friend_names"]:
+                args["friend_names"].append(key)
+        args["split_map"] = split_map
+
+    if not args["friend_names"] and "group_name" not in args:
+        return None
+    return "add_expense", args
+
+
+class LocalIntentAgent(SplitwiseAgentBase):
+    """
+    Offline intent engine: a rule-based parser over the documented command
+    phrasings, with names resolved against the local directory index. No
+    network hop per command, and deterministic for tests.
+    """
+
+    def process_input(self, user_text: str):
+        local = self._begin_turn(user_text)
+        if local:
+            return local
+
+        parsed = parse_command(user_text)
+        if not parsed:
+            return {
+                "type": "text",
+                "content": "Sorry, I didn't catch that. Try e.g. 'Split 50 with Alice for dinner' or 'Delete expense 12345'."
+            }
+        tool_name, tool_args = parsed
+        return self._plan([(tool_name, tool_args)], "")
@@ -0,0 +1,64 @@
+# Turn planning for the Gemini agent: split a model response into its function
+# calls, answer read-only calls locally and render confirmations from templates,
+# so the model is only called again when a reply actually needs it.
+
+# Tools whose result can be produced from the local directory.
+READ_ONLY_TOOLS = {"list_friends"}
+
+def canonical_name(tool_name: str) -> str:
+    """'_add_expense_impl' -> 'add_expense'."""
+    name = tool_name or ""
+    if name.startswith("_"):
+        name = name[1:]
+    if name.endswith("_impl"):
+        name = name[:-len("_impl")]
+    return name
+
+def is_read_only(tool_name: str) -> bool:
+    return canonical_name(tool_name) in READ_ONLY_TOOLS
+
+def function_calls(response):
+    """All (name, args) function calls in a response, in order."""
+    calls = []
+    if response.candidates and response.candidates[0].content.parts:
+        for part in response.candidates[0].content.parts:
+            if part.function_call:
+                calls.append((part.function_call.name, dict(part.function_call.args or {})))
+    return calls
+
+def response_text(response) -> str:
+    """Text parts of a response without the SDK warning about non-text parts."""
+    texts = []
+    if response.candidates and response.candidates[0].content.parts:
+        for part in response.candidates[0].content.parts:
+            if getattr(part, "text", None):
+                texts.append(part.text)
+    return "".join(texts)
+
+def is_error(result) -> bool:
+    return isinstance(result, str) and result.startswith("Error")
+
+def _with_whom(args) -> str:
+    parts = []
+    if args.get("friend_names"):
+        parts.append(f"with {', '.join(args['friend_names'])}")
+    if args.get("group_name"):
+        parts.append(f"in {args['group_name']}")
+    if args.get("exclude_names"):
+        parts.append(f"excluding {', '.join(args['exclude_names'])}")
+    if args.get("payer_name") and args["payer_name"].lower() not in ("me", "i", "myself"):
+        parts.append(f"paid by {args['payer_name']}")
+    return (" " + " ".join(parts)) if parts else ""
+
+def render_confirmation(tool_name: str, args: dict, result: str) -> str:
+    """User-facing reply for a successful tool call, without asking the model."""
+    name = canonical_name(tool_name)
+    if name == "add_expense":
+        split = " (custom split)" if args.get("split_map") else ""
+        currency = f" {args['currency']}" if args.get("currency") else ""
+        return f"✅ Added '{args.get('description')}' for {args.get('amount')}{currency}{_with_whom(args)}{split}. {result}"
+    if name == "update_expense":
+        return f"✏️ {result}"
+    if name == "delete_expense":
+        return f"🗑️ Deleted expense {args.get('expense_id')}."
+    return f"✅ {result}"
@@ -0,0 +1,255 @@
+import threading
+from array import array
+from datetime import date as _date
+
+# Spending aggregates over the local expense index.
+#
+# SpendingCube keeps every expense as a row in flat columns (day, cost,
+# currency, group, payer, category) plus one row per participant share. The
+# columns are plain arrays that grow in place as the index changes: each
+# refresh reloads only the expenses written since the last one (see
+# ExpenseIndex.changes_since), retires their old rows and appends the new
+# ones. Queries view the arrays through numpy without copying them, filter
+# with boolean masks and sum with bincount, so an answer over years of
+# history takes milliseconds. numpy is only imported when a query runs.
+#
+# Settle-up payments are not spending and are left out.
+
+PERIODS = ("day", "week", "month", "quarter", "year")
+DIMENSIONS = ("category", "group", "friend", "payer")
+
+_EPOCH = _date(1970, 1, 1).toordinal()
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(f"{e}. Spending summaries need: pip install 'splitwise-mcp[analytics]'") from e
+    return np
+
+
+def _day(value) -> int:
+    try:
+        return _date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _period_label(period: str, key: int) -> str:
+    if period == "day":
+        return _date.fromordinal(key).isoformat()
+    if period == "week":
+        return _date.fromordinal(key * 7 + 1).isoformat()  # the Monday starting it
+    if period == "month":
+        return f"{1970 + key // 12}-{key % 12 + 1:02d}"
+    if period == "quarter":
+        return f"{1970 + key // 4}-Q{key % 4 + 1}"
+    if period == "year":
+        return str(1970 + key)
+    return "all"
+
+
+class SpendingCube:
+    """Columnar copy of an ExpenseIndex for aggregate queries."""
+
+    # Rebuild from scratch once this many rows (and a quarter of all rows) are retired
+    COMPACT_AFTER = 1024
+
+    def __init__(self, index):
+        self.index = index
+        self.revision = -1
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array("q")
+        self.days = array("i")
+        self.costs = array("d")
+        self.currencies = array("i")
+        self.groups = array("q")
+        self.payers = array("q")
+        self.categories = array("i")
+        self.alive = array("b")
+        self.share_rows = array("q")
+        self.share_users = array("q")
+        self.share_owed = array("d")
+        self._row_of = {}
+        self._codes = {"currency": {}, "category": {}}
+        self.labels = {"currency": [], "category": []}
+        self.retired = 0
+
+    def _code(self, kind: str, value) -> int:
+        codes = self._codes[kind]
+        value = value or ""
+        if value not in codes:
+            codes[value] = len(self.labels[kind])
+            self.labels[kind].append(value)
+        return codes[value]
+
+    def __len__(self):
+        return len(self.ids) - self.retired
+
+    # Loading
+
+    def refresh(self) -> bool:
+        """Bring the columns up to date with the index. Returns True if anything changed."""
+        with self._lock:
+            if self.revision >= 0 and self.retired > max(self.COMPACT_AFTER, len(self.ids) // 4):
+                self.revision = -1
+            if self.revision < 0:
+                # Read the revision first: writes racing the load are replayed next time.
+                revision = self.index.revision
+                rows, shares = self.index.columns()
+                self._reset()
+                self._append(rows, shares)
+                self.revision = revision
+                return True
+            changed, revision = self.index.changes_since(self.revision)
+            if not changed:
+                return False
+            for expense_id in changed:
+                row = self._row_of.pop(expense_id, None)
+                if row is not None:
+                    self.alive[row] = 0
+                    self.retired += 1
+            self._append(*self.index.columns(changed))
+            self.revision = revision
+            return True
+
+    def _append(self, rows, shares):
+        first = len(self.ids)
+        for expense_id, day, cost, currency, group_id, payer_id, category, payment in rows:
+            if payment:
+                continue
+            self._row_of[expense_id] = len(self.ids)
+            self.ids.append(expense_id)
+            self.days.append(_day(day))
+            self.costs.append(cost or 0.0)
+            self.currencies.append(self._code("currency", currency))
+            self.groups.append(group_id or 0)
+            self.payers.append(payer_id or 0)
+            self.categories.append(self._code("category", category))
+            self.alive.append(1)
+        for expense_id, user_id, owed in shares:
+            row = self._row_of.get(expense_id)
+            if row is None or row < first:
+                continue
+            self.share_rows.append(row)
+            self.share_users.append(user_id)
+            self.share_owed.append(owed or 0.0)
+
+    # Queries
+
+    def summarize(self, period: str = "month", by: str = None, dated_after: str = None, dated_before: str = None,
+                  group_id: int = None, payer_id: int = None, friend_id: int = None, category: str = None,
+                  me_id: int = None):
+        """
+        Totals per (period, `by`, currency), oldest period first and largest
+        total first within a period. `by` is None, "category", "group",
+        "payer" or "friend" (each participant's owed share). With `me_id`,
+        only the current user's share of each expense is counted.
+
+        Returns a list of {"period", by, "currency", "total", "count"} dicts;
+        group, payer and friend values are user/group IDs.
+        """
+        if period is not None and period not in PERIODS:
+            raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+        if by is not None and by not in DIMENSIONS:
+            raise ValueError(f"by must be one of: {', '.join(DIMENSIONS)}")
+        np = _numpy()
+        with self._lock:
+            # numpy views pin the arrays' buffers; they are all released when
+            # _aggregate returns, before anything can append again.
+            return self._aggregate(np, period, by, dated_after, dated_before, group_id, payer_id, friend_id,
+                                   category, me_id)
+
+    def _aggregate(self, np, period, by, dated_after, dated_before, group_id, payer_id, friend_id, category, me_id):
+        if not self.ids:
+            return []
+        days = np.frombuffer(self.days, dtype=np.int32).astype(np.int64)
+        costs = np.frombuffer(self.costs, dtype=np.float64)
+        currencies = np.frombuffer(self.currencies, dtype=np.int32)
+        share_rows = np.frombuffer(self.share_rows, dtype=np.int64)
+        share_users = np.frombuffer(self.share_users, dtype=np.int64)
+        share_owed = np.frombuffer(self.share_owed, dtype=np.float64)
+
+        mask = np.frombuffer(self.alive, dtype=np.int8).astype(bool)
+        if dated_after:
+            mask &= days >= _day(dated_after)
+        if dated_before:
+            mask &= days <= _day(dated_before)
+        if group_id is not None:
+            mask &= np.frombuffer(self.groups, dtype=np.int64) == int(group_id)
+        if payer_id is not None:
+            mask &= np.frombuffer(self.payers, dtype=np.int64) == int(payer_id)
+        if category:
+            wanted = [code for label, code in self._codes["category"].items() if label.lower() == category.lower()]
+            if not wanted:
+                return []
+            mask &= np.isin(np.frombuffer(self.categories, dtype=np.int32), wanted)
+        if friend_id is not None:
+            involved = np.zeros(len(mask), dtype=bool)
+            involved[share_rows[share_users == int(friend_id)]] = True
+            mask &= involved
+
+        if by == "friend" or me_id is not None:
+            # One entry per share rather than per expense
+            keep = mask[share_rows]
+            if me_id is not None:
+                keep &= share_users == int(me_id)
+            rows = share_rows[keep]
+            values = share_owed[keep]
+            dimension = share_users[keep] if by == "friend" else None
+        else:
+            rows = np.flatnonzero(mask)
+            values = costs[rows]
+            dimension = None
+        if by in ("category", "group", "payer"):
+            column = {"category": (self.categories, np.int32), "group": (self.groups, np.int64),
+                      "payer": (self.payers, np.int64)}[by]
+            dimension = np.frombuffer(column[0], dtype=column[1])[rows]
+        if len(rows) == 0:
+            return []
+
+        row_days = days[rows]
+        if period == "day":
+            periods = row_days
+        elif period == "week":
+            periods = (row_days - 1) // 7
+        elif period in ("month", "quarter", "year"):
+            dates = (row_days - _EPOCH).astype("datetime64[D]")
+            if period == "year":
+                periods = dates.astype("datetime64[Y]").astype(np.int64)
+            else:
+                periods = dates.astype("datetime64[M]").astype(np.int64)
+                if period == "quarter":
+                    periods //= 3
+        else:
+            periods = np.zeros(len(rows), dtype=np.int64)
+
+        keys = np.stack([
+            periods.astype(np.int64),
+            np.zeros(len(rows), dtype=np.int64) if dimension is None else dimension.astype(np.int64),
+            currencies[rows].astype(np.int64),
+        ])
+        unique, inverse = np.unique(keys, axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        totals = np.bincount(inverse, weights=values, minlength=unique.shape[1])
+        counts = np.bincount(inverse, minlength=unique.shape[1])
+
+        result = []
+        for (p, d, c), total, count in zip(unique.T.tolist(), totals.tolist(), counts.tolist()):
+            entry = {"period": _period_label(period, p)}
+            if by == "category":
+                entry[by] = self.labels["category"][d] or None
+            elif by is not None:
+                entry[by] = d or None
+            entry["currency"] = self.labels["currency"][c] or None
+            entry["total"] = round(total, 2)
+            entry["count"] = count
+            result.append(entry)
+        # np.unique sorts by period already; within a period, largest first
+        order = {label: i for i, label in enumerate(dict.fromkeys(e["period"] for e in result))}
+        result.sort(key=lambda e: (order[e["period"]], -e["total"]))
+        return result
@@ -0,0 +1,353 @@
+import base64
+import functools
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Opt-in traffic capture for load replay (see splitwise_mcp.replay).
+#
+# With SPLITWISE_CAPTURE=<path> the server appends one JSON line per MCP tool
+# call made through a @recorded() tool, and one per upstream HTTP exchange
+# (Splitwise goes through requests; Gemini and Deepgram through httpx), each
+# with its offset from the start of the capture and its duration. Streamed
+# responses are recorded as the caller consumes them, not buffered up front,
+# so their duration covers the whole stream.
+#
+# Sanitisation: credentials are never written. Request headers and bodies are
+# dropped (only a body hash is kept), secret-looking query parameters and
+# tool arguments are redacted, and audio is replaced by its length. Response
+# bodies ARE kept, since replay serves them back; treat captures as
+# containing user data. A path ending in .gz is written gzip-compressed.
+
+FORMAT = 1
+REDACTED = "[redacted]"
+_SECRET_WORDS = ("key", "secret", "token", "password", "auth", "signature")
+_AUDIO_ARGS = ("audio_base64",)
+_SKIP_ARGS = ("ctx", "self")
+
+
+def _is_secret(name: str) -> bool:
+    name = name.lower()
+    return any(word in name for word in _SECRET_WORDS)
+
+
+def sanitize_url(url: str) -> str:
+    """`url` with secret-looking query parameters redacted."""
+    parts = urlsplit(str(url))
+    if not parts.query:
+        return str(url)
+    query = [(k, REDACTED if _is_secret(k) else v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe="[]")))
+
+
+def sanitize_args(arguments: dict) -> dict:
+    clean = {}
+    for name, value in arguments.items():
+        if name in _SKIP_ARGS:
+            continue
+        if _is_secret(name):
+            clean[name] = REDACTED
+        elif name in _AUDIO_ARGS and isinstance(value, str):
+            # Replay substitutes the recorded transcription, so only the size matters.
+            clean[name] = {"$audio": len(value)}
+        elif value is None or isinstance(value, (str, int, float, bool, list, dict)):
+            clean[name] = value
+        else:
+            clean[name] = repr(value)
+    return clean
+
+
+def body_digest(body) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, str):
+        body = body.encode()
+    elif not isinstance(body, (bytes, bytearray)):
+        return ""
+    return hashlib.sha256(body).hexdigest()[:16] if body else ""
+
+
+def encode_body(content: bytes):
+    """(text, is_base64) for a response body."""
+    try:
+        return content.decode("utf-8"), False
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode("ascii"), True
+
+
+class Recorder:
+    """Appends capture records to `path` (JSON lines, gzip if it ends in .gz)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "at") if path.endswith(".gz") else open(path, "a")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.calls = 0
+        self._write({"t": "start", "v": FORMAT, "at": 0.0,
+                     "wall": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+
+    def _write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def offset(self, started: float) -> float:
+        return round(started - self._started, 4)
+
+    def tool(self, name: str, arguments: dict, started: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            seq = self.calls
+        self._write({
+            "t": "tool", "seq": seq, "at": self.offset(started), "name": name,
+            "args": sanitize_args(arguments), "ms": round((time.monotonic() - started) * 1000, 2), "ok": ok,
+        })
+
+    def http(self, method: str, url, request_body, status: int, content_type, content: bytes, started: float):
+        body, b64 = encode_body(content or b"")
+        record = {
+            "t": "http", "at": self.offset(started), "method": method.upper(), "url": sanitize_url(url),
+            "req": body_digest(request_body), "status": status, "ct": content_type or "",
+            "body": body, "ms": round((time.monotonic() - started) * 1000, 2),
+        }
+        if b64:
+            record["b64"] = True
+        self._write(record)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+recorder = None
+_originals = {}
+
+
+def recorded(name: str = None):
+    """Decorator capturing calls to a sync or async MCP tool while a recorder is active."""
+
+    def decorate(fn):
+        label = name or fn.__name__
+        signature = inspect.signature(fn)
+
+        def arguments(args, kwargs):
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError:
+                return dict(kwargs)
+            return dict(bound.arguments)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                rec = recorder
+                if rec is None:
+                    return await fn(*args, **kwargs)
+                started, ok = time.monotonic(), False
+                try:
+                    result = await fn(*args, **kwargs)
+                    ok = not (isinstance(result, str) and result.startswith("Error"))
+                    return result
+                finally:
+                    rec.tool(label, arguments(args, kwargs), started, ok)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                rec = recorder
+                if rec is None:
+                    return fn(*args, **kwargs)
+                started, ok = time.monotonic(), False
+                try:
+                    result = fn(*args, **kwargs)
+                    ok = not (isinstance(result, str) and result.startswith("Error"))
+                    return result
+                finally:
+                    rec.tool(label, arguments(args, kwargs), started, ok)
+        return wrapper
+
+    return decorate
+
+
+# Upstream hooks. Both the recorder and the replay stubs replace the send()
+# methods of requests.Session and httpx.Client/AsyncClient; patch_http keeps
+# the originals so they can be put back.
+
+def patch_http(sync_send, async_send=None):
+    """
+    Route requests.Session.send and httpx.Client.send through
+    `sync_send(original, client, request, **kwargs)` (and httpx.AsyncClient.send
+    through the coroutine `async_send`). Libraries that aren't installed are skipped.
+    """
+    unpatch_http()
+    try:
+        import requests
+        _patch(requests.Session, "send", sync_send)
+    except ImportError:
+        pass
+    try:
+        import httpx
+        _patch(httpx.Client, "send", sync_send)
+        if async_send is not None:
+            _patch(httpx.AsyncClient, "send", async_send, is_async=True)
+    except ImportError:
+        pass
+
+
+def _patch(cls, attr, hook, is_async=False):
+    original = getattr(cls, attr)
+    _originals[(cls, attr)] = original
+
+    if is_async:
+        async def send(client, request, **kwargs):
+            return await hook(original, client, request, **kwargs)
+    else:
+        def send(client, request, **kwargs):
+            return hook(original, client, request, **kwargs)
+
+    functools.update_wrapper(send, original)
+    setattr(cls, attr, send)
+
+
+def unpatch_http():
+    for (cls, attr), original in _originals.items():
+        setattr(cls, attr, original)
+    _originals.clear()
+
+
+def _record_sync(original, client, request, **kwargs):
+    started = time.monotonic()
+    response = original(client, request, **kwargs)
+    rec = recorder
+    if rec is None:
+        return response
+
+    def record(content):
+        rec.http(request.method, request.url, _request_body(request), response.status_code,
+                 response.headers.get("content-type"), content, started)
+
+    if kwargs.get("stream"):
+        # Leave the body to the caller and record it as it is consumed.
+        name = "iter_bytes" if hasattr(response, "iter_bytes") else "iter_content"
+        setattr(response, name, _recording_iter(getattr(response, name), record))
+    else:
+        # httpx responses have read() (and are loaded by now); requests
+        # bodies are in .content.
+        record(response.read() if hasattr(response, "read") else response.content)
+    return response
+
+
+async def _record_async(original, client, request, **kwargs):
+    started = time.monotonic()
+    response = await original(client, request, **kwargs)
+    rec = recorder
+    if rec is None:
+        return response
+
+    def record(content):
+        rec.http(request.method, request.url, _request_body(request), response.status_code,
+                 response.headers.get("content-type"), content, started)
+
+    if kwargs.get("stream"):
+        response.aiter_bytes = _recording_aiter(response.aiter_bytes, record)
+    else:
+        record(await response.aread())
+    return response
+
+
+def _chunk_bytes(chunk) -> bytes:
+    # requests' iter_content(decode_unicode=True) yields str
+    return chunk.encode() if isinstance(chunk, str) else chunk
+
+
+def _recording_iter(iterate, record):
+    """
+    Wrap a response's body iterator (httpx iter_bytes, requests iter_content;
+    read(), .content and iter_lines go through them) so the decoded chunks are
+    recorded once the caller has finished with the body, however far it read.
+    Only the first pass is recorded: httpx serves later ones from memory.
+    """
+    done = []
+
+    @functools.wraps(iterate)
+    def wrapper(*args, **kwargs):
+        if done:
+            yield from iterate(*args, **kwargs)
+            return
+        done.append(True)
+        chunks = []
+        try:
+            for chunk in iterate(*args, **kwargs):
+                chunks.append(_chunk_bytes(chunk))
+                yield chunk
+        finally:
+            record(b"".join(chunks))
+    return wrapper
+
+
+def _recording_aiter(iterate, record):
+    """_recording_iter for httpx's aiter_bytes."""
+    done = []
+
+    @functools.wraps(iterate)
+    async def wrapper(*args, **kwargs):
+        if done:
+            async for chunk in iterate(*args, **kwargs):
+                yield chunk
+            return
+        done.append(True)
+        chunks = []
+        try:
+            async for chunk in iterate(*args, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            record(b"".join(chunks))
+    return wrapper
+
+
+def _request_body(request):
+    body = getattr(request, "body", None)
+    if body is None and hasattr(request, "content"):
+        try:
+            body = request.content
+        except Exception:
+            body = None
+    return body
+
+
+def start(path: str) -> Recorder:
+    """Start capturing to `path` (stops any capture already running)."""
+    global recorder
+    stop()
+    recorder = Recorder(path)
+    patch_http(_record_sync, _record_async)
+    return recorder
+
+
+def stop():
+    global recorder
+    rec, recorder = recorder, None
+    if rec is not None:
+        unpatch_http()
+        rec.close()
+
+
+def start_from_env():
+    """Start capturing if SPLITWISE_CAPTURE names a file."""
+    path = os.getenv("SPLITWISE_CAPTURE")
+    if path and recorder is None:
+        import atexit
+        start(path)
+        atexit.register(stop)
+    return recorder
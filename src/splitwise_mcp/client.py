@@ -1,14 +1,93 @@
 import os
-from dotenv import load_dotenv
-from splitwise import Splitwise
-from splitwise.expense import Expense
-from splitwise.user import ExpenseUser
+import time
 from typing import List, Optional
+from splitwise_mcp.directory import Directory
+from splitwise_mcp.env import load_env
+from splitwise_mcp.expense_index import ExpenseIndex, ExpenseSync, decode_cursor, encode_cursor
+from splitwise_mcp.model import User
+from splitwise_mcp.refresh import BackgroundRefresher, change_from_notification
+from splitwise_mcp.snapshot import DirectorySnapshot, SharedDirectoryCache, credential_key
+from splitwise_mcp.state import get_backend
 
-load_dotenv()
+# The splitwise SDK pulls in requests/oauthlib, so it is imported on first use
+# rather than at module import (see _load_sdk).
+Splitwise = None
+Expense = None
+ExpenseUser = None
+
+def _load_sdk():
+    global Splitwise, Expense, ExpenseUser
+    if Splitwise is None:
+        from splitwise import Splitwise
+    if Expense is None:
+        from splitwise.expense import Expense
+    if ExpenseUser is None:
+        from splitwise.user import ExpenseUser
+
+def _owed_share(user, split_map: dict, me_id, total_amount: float) -> float:
+    """A user's owed share from a split_map keyed by name or "me"/"I" (amounts or percentages)."""
+    key_to_use = None
+
+    # Check "me"
+    if user.id == me_id:
+        if "me" in split_map: key_to_use = "me"
+        elif "Me" in split_map: key_to_use = "Me"
+        elif "I" in split_map: key_to_use = "I"
+
+    # Check Name
+    if not key_to_use:
+        f_name = user.name
+        if f_name in split_map: key_to_use = f_name
+        else:
+            for k in split_map:
+                 if k.lower() in f_name.lower():
+                     key_to_use = k
+                     break
+
+    if not key_to_use:
+        return 0.0
+    val = split_map[key_to_use]
+    # Percentage Check
+    if isinstance(val, str) and val.strip().endswith("%"):
+        pct = float(val.strip().replace("%", ""))
+        return (pct / 100.0) * total_amount
+    return float(val)
+
+def _cents(value: float) -> int:
+    return int(round(float(value) * 100))
+
+def _scale_shares(owed: dict, total: float) -> dict:
+    """Scale {user_id: owed} to a new total in whole cents; the remainder goes to the largest share."""
+    old_total = sum(owed.values())
+    if old_total <= 0:
+        share = total / len(owed)
+        scaled = {uid: _cents(share) for uid in owed}
+    else:
+        scaled = {uid: _cents(v * total / old_total) for uid, v in owed.items()}
+    if scaled:
+        largest = max(scaled, key=scaled.get)
+        scaled[largest] += _cents(total) - sum(scaled.values())
+    return {uid: c / 100 for uid, c in scaled.items()}
+
+def _has_prefix(user, prefix: str) -> bool:
+    p = prefix.lower()
+    return any((n or "").lower().startswith(p) for n in (user.first_name, user.last_name, user.name))
+
+def _page(entries, to_item, limit: int, cursor: str = None):
+    """Keyset page over entries ordered by (lowercased name, id): (items, next_cursor)."""
+    limit = max(1, min(int(limit), 500))
+    key = lambda e: ((e.name or "").lower(), e.id)
+    entries = sorted(entries, key=key)
+    if cursor:
+        after = decode_cursor(cursor)
+        entries = [e for e in entries if key(e) > after]
+    page = entries[:limit]
+    next_cursor = encode_cursor(*key(page[-1])) if len(entries) > limit else None
+    return [to_item(e) for e in page], next_cursor
 
 class SplitwiseClient:
     def __init__(self):
+        load_env()
         self.consumer_key = os.getenv("SPLITWISE_CONSUMER_KEY")
         self.consumer_secret = os.getenv("SPLITWISE_CONSUMER_SECRET")
         self.api_key = os.getenv("SPLITWISE_API_KEY")
@@ -16,12 +95,31 @@ class SplitwiseClient:
         
         self.client = None
         self._current_user = None
+
+        # Local expense index (search/list without pulling history every time)
+        self.expense_index = ExpenseIndex(os.getenv("SPLITWISE_EXPENSE_DB", ":memory:"))
+        self.expense_sync = ExpenseSync(self.expense_index)
+
+        # Cached friends/groups shared by name matching and the agent
+        self.directory = Directory(
+            lambda: self.client.getFriends(),
+            lambda: self.client.getGroups(),
+            fetch_me=lambda: self.client.getCurrentUser(),
+        )
+
+        # Optional notification poller (see start_refresher)
+        self.refresher = None
+        self.fx = None
+        self.spending = None
         
         # Try to initialize if env vars are present
         if (self.consumer_key and self.consumer_secret) or self.api_key:
             self._init_client()
+            # Serve the last known directory from disk while it revalidates
+            self.directory.warm()
 
     def _init_client(self):
+        _load_sdk()
         self.client = Splitwise(
             consumer_key=self.consumer_key,
             consumer_secret=self.consumer_secret,
@@ -36,6 +134,28 @@ class SplitwiseClient:
             # We'll set it as a dictionary which is a common pattern for this lib.
             self.client.setAccessToken({'oauth_token': self.access_token, 'oauth_token_secret': ''})
 
+        self.directory.reset(self._snapshot(), self._shared_cache())
+        # The expense index (and its sync cursors) belongs to one account
+        if self.expense_index.claim(self._credential_key()):
+            self.expense_sync.mark_stale()
+
+    def _credential_key(self):
+        return credential_key(self.consumer_key, self.consumer_secret, self.api_key, self.access_token)
+
+    def _snapshot(self):
+        """On-disk directory snapshot for the current credentials (SPLITWISE_SNAPSHOT_DIR)."""
+        snapshot_dir = os.getenv("SPLITWISE_SNAPSHOT_DIR")
+        if not snapshot_dir:
+            return None
+        return DirectorySnapshot(os.path.expanduser(snapshot_dir), self._credential_key())
+
+    def _shared_cache(self):
+        """Directory cache shared with other replicas, when SPLITWISE_STATE_URL is set."""
+        backend = get_backend()
+        if not backend.shared:
+            return None
+        return SharedDirectoryCache(backend, self._credential_key(), self.directory.ttl)
+
     def configure(self, consumer_key: str = None, consumer_secret: str = None, api_key: str = None, access_token: str = None):
         """
         Configure the client with credentials at runtime.
@@ -48,47 +168,124 @@ class SplitwiseClient:
         self._init_client()
 
         self._current_user = None
+        self.expense_sync.mark_stale()
 
     def get_current_user(self):
         if not self.client:
             raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
             
         if not self._current_user:
-            self._current_user = self.client.getCurrentUser()
+            self._current_user = self.directory.me() or User.from_sdk(self.client.getCurrentUser())
         return self._current_user
 
+    def warm(self):
+        """Fetch the current user, friends and groups ahead of the first command."""
+        self.get_current_user()
+        self.directory.name_index()
+
     def get_friends(self):
         if not self.client:
             raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
-        return self.client.getFriends()
+        return self.directory.friends()
 
     def find_friend_by_name(self, name: str):
+        if not self.client:
+            raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
+        # Exact full/first/last name hits come straight from the name index
+        for _, friend_id, _ in self.directory.name_index().lookup(name, kind="friend"):
+            return self.directory.get("friend", friend_id)
+
         friends = self.get_friends()
         name_lower = name.lower()
         for friend in friends:
             # Check first, last, and full name
-            first = (friend.getFirstName() or "").lower()
-            last = (friend.getLastName() or "").lower()
+            first = (friend.first_name or "").lower()
+            last = (friend.last_name or "").lower()
             full = f"{first} {last}".strip()
             
             if name_lower in full or name_lower == first or name_lower == last:
                 return friend
         return None
 
+    def suggest_names(self, name: str, kind: str = "friend", k: int = 3) -> List[str]:
+        """Closest friend (or group) names for a name that did not resolve."""
+        if not self.client:
+            return []
+        return [n for _, _, _, n in self.directory.name_index().match(name, k=k, kind=kind)]
+
+    def _not_found(self, label: str, name: str, kind: str = "friend"):
+        suggestions = self.suggest_names(name, kind)
+        hint = f" Did you mean {' or '.join(suggestions)}?" if suggestions else ""
+        return ValueError(f"{label} not found: {name}.{hint}")
+
     def get_groups(self):
         if not self.client:
             raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
-        return self.client.getGroups()
+        return self.directory.groups()
 
-    def find_group_by_name(self, name: str):
+    def list_friends(self, prefix: str = None, has_balance: bool = None, group_name: str = None,
+                     limit: int = 50, cursor: str = None):
+        """
+        One page of friends from the directory cache, ordered by name.
+        Filters: name `prefix` (first, last or full name), `has_balance`
+        (non-zero balance with you, as of the last directory refresh) and
+        membership of `group_name`. Returns (items, next_cursor); items are
+        compact dicts.
+        """
+        friends = self.get_friends()
+        if group_name:
+            group = self.find_group_by_name(group_name)
+            if not group:
+                raise self._not_found("Group", group_name, kind="group")
+            member_ids = {m.id for m in group.members}
+            friends = [f for f in friends if f.id in member_ids]
+        if prefix:
+            friends = [f for f in friends if _has_prefix(f, prefix)]
+        if has_balance is not None:
+            friends = [f for f in friends if bool(f.balances) == has_balance]
+
+        def item(f):
+            entry = {"id": f.id, "name": f.name}
+            if f.balances:
+                entry["balance"] = f.balances
+            return entry
+        return _page(friends, item, limit, cursor)
+
+    def list_groups(self, prefix: str = None, member_name: str = None, limit: int = 50, cursor: str = None):
+        """
+        One page of groups from the directory cache, ordered by name, filtered
+        by name `prefix` and/or a friend (`member_name`) who belongs to them.
+        Returns (items, next_cursor).
+        """
         groups = self.get_groups()
+        if member_name:
+            friend = self.find_friend_by_name(member_name)
+            if not friend:
+                raise self._not_found("Friend", member_name)
+            groups = [g for g in groups if any(m.id == friend.id for m in g.members)]
+        if prefix:
+            p = prefix.lower()
+            groups = [g for g in groups if (g.name or "").lower().startswith(p)]
+        return _page(groups, lambda g: {"id": g.id, "name": g.name, "members": len(g.members)}, limit, cursor)
+
+    def find_group_by_name(self, name: str):
+        if not self.client:
+            raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
         name_lower = name.lower()
-        for group in groups:
-            if group.getName().lower() == name_lower:
+        for _, group_id, group_name in self.directory.name_index().lookup(name, kind="group"):
+            group = self.directory.get("group", group_id)
+            if group and group.name.lower() == name_lower:
                 return group
         return None
 
-    def add_expense(self, amount: str, description: str, friend_names: List[str], split_map: dict = None, group_name: str = None, payer_name: str = None, exclude_names: List[str] = None):
+    def fx_table(self):
+        """Lazily created FX rate table (cached at SPLITWISE_FX_CACHE when set)."""
+        if self.fx is None:
+            from splitwise_mcp.fx import FxTable
+            self.fx = FxTable(path=os.getenv("SPLITWISE_FX_CACHE"))
+        return self.fx
+
+    def add_expense(self, amount: str, description: str, friend_names: List[str], split_map: dict = None, group_name: str = None, payer_name: str = None, exclude_names: List[str] = None, date: str = None, currency: str = None, convert_to: str = None, details: str = None):
         """
         Splits an expense. 
         If split_map is None, splits equally.
@@ -102,7 +299,27 @@ class SplitwiseClient:
             - Specifies who paid the full amount. Defaults to current user.
         If exclude_names is provided:
             - Remixes group members to exclude these names.
+        If date is provided (ISO 8601), the expense is dated then instead of now.
+        If currency is provided (ISO 4217, e.g. "EUR"), the expense is in that
+        currency instead of the account default. With convert_to as well, the
+        amount (and fixed split_map amounts) are converted at the cached
+        reference rate for the expense date and recorded in convert_to.
+        details is stored as the expense's notes.
         """
+        _load_sdk()
+        if currency and convert_to and currency.upper() != convert_to.upper():
+            rate = self.fx_table().rate(currency, convert_to, date)
+            note = f"Converted from {float(amount):.2f} {currency.upper()} at {rate:.6g}"
+            details = f"{note}\n{details}" if details else note
+            amount = float(amount) * rate
+            if split_map:
+                split_map = {
+                    k: v if isinstance(v, str) and v.strip().endswith("%") else f"{float(v) * rate:.2f}"
+                    for k, v in split_map.items()
+                }
+            currency = convert_to
+        elif convert_to:
+            currency = convert_to
         current_user = self.get_current_user()
         users_in_split = []
         
@@ -111,20 +328,20 @@ class SplitwiseClient:
         if group_name:
             group = self.find_group_by_name(group_name)
             if not group:
-                raise ValueError(f"Group not found: {group_name}")
-            group_id = group.getId()
+                raise self._not_found("Group", group_name, kind="group")
+            group_id = group.id
             
             # Auto-fetch members if friend_names is empty
             if not friend_names:
-                members = group.getMembers()
+                members = list(group.members)
                 # Filter out excluded members
                 if exclude_names:
                     # Normalize exclude names
                     excludes_lower = [n.lower() for n in exclude_names]
                     members = [
                         m for m in members 
-                        if f"{m.getFirstName()} {m.getLastName()}".strip().lower() not in excludes_lower
-                        and m.getFirstName().lower() not in excludes_lower
+                        if m.name.lower() not in excludes_lower
+                        and (m.first_name or "").lower() not in excludes_lower
                     ]
                 users_in_split = members
 
@@ -135,18 +352,18 @@ class SplitwiseClient:
             for name in friend_names:
                 friend = self.find_friend_by_name(name)
                 if not friend:
-                    raise ValueError(f"Friend not found: {name}")
+                    raise self._not_found("Friend", name)
                 users_in_split.append(friend)
             
             # Key by full name for split_map matching
-            full_name = f"{friend.getFirstName()} {friend.getLastName()}".strip()
+            full_name = friend.name
             friend_objects[full_name] = friend
             # Also key by first name? Ideally agent canonicalizes names.
 
         # Deduplicate based on ID just in case
         unique_users = {}
         for u in users_in_split:
-             unique_users[u.getId()] = u
+             unique_users[u.id] = u
         users_in_split = list(unique_users.values())
 
         total_amount = float(amount)
@@ -155,15 +372,15 @@ class SplitwiseClient:
         expense_users = []
         
         # Resolve Payer
-        payer_id = current_user.getId()
+        payer_id = current_user.id
         if payer_name and payer_name.lower() not in ["me", "i", "myself"]:
              # Find payer in our list or friend list
              payer_found = False
              # Search in split users first
              for u in users_in_split:
-                 f_name = f"{u.getFirstName()} {u.getLastName()}".strip()
-                 if payer_name.lower() in f_name.lower() or payer_name.lower() == u.getFirstName().lower():
-                     payer_id = u.getId()
+                 f_name = u.name
+                 if payer_name.lower() in f_name.lower() or payer_name.lower() == (u.first_name or "").lower():
+                     payer_id = u.id
                      payer_found = True
                      break
              
@@ -171,13 +388,13 @@ class SplitwiseClient:
                  # Try finding explicitly if not in split (e.g. payer paid but is not part of split?)
                  p = self.find_friend_by_name(payer_name)
                  if p:
-                     payer_id = p.getId()
+                     payer_id = p.id
                      # If payer is not in split, add them to users (paid share set later)
-                     if p.getId() not in unique_users:
+                     if p.id not in unique_users:
                          users_in_split.append(p)
-                         unique_users[p.getId()] = p
+                         unique_users[p.id] = p
                  else:
-                     raise ValueError(f"Payer not found: {payer_name}")
+                     raise self._not_found("Payer", payer_name)
         
         if split_map:
             # Unequal split logic
@@ -185,44 +402,16 @@ class SplitwiseClient:
             
             for user in users_in_split:
                 eu = ExpenseUser()
-                eu.setId(user.getId())
+                eu.setId(user.id)
                 
                 # Paid Share
-                if user.getId() == payer_id:
+                if user.id == payer_id:
                     eu.setPaidShare(f"{total_amount:.2f}")
                 else:
                     eu.setPaidShare("0.00")
                 
                 # Owed Share
-                owed = 0.0
-                
-                # Match user in split_map
-                key_to_use = None
-                
-                # Check "me"
-                if user.getId() == current_user.getId():
-                    if "me" in split_map: key_to_use = "me"
-                    elif "Me" in split_map: key_to_use = "Me"
-                    elif "I" in split_map: key_to_use = "I"
-                
-                # Check Name
-                if not key_to_use:
-                    f_name = f"{user.getFirstName()} {user.getLastName()}".strip()
-                    if f_name in split_map: key_to_use = f_name
-                    else:
-                        for k in split_map:
-                             if k.lower() in f_name.lower():
-                                 key_to_use = k
-                                 break
-                
-                if key_to_use:
-                    val = split_map[key_to_use]
-                    # Percentage Check
-                    if isinstance(val, str) and val.strip().endswith("%"):
-                        pct = float(val.strip().replace("%", ""))
-                        owed = (pct / 100.0) * total_amount
-                    else:
-                        owed = float(val)
+                owed = _owed_share(user, split_map, current_user.id, total_amount)
 
                 eu.setOwedShare(f"{owed:.2f}")
                 total_split += owed
@@ -238,9 +427,9 @@ class SplitwiseClient:
             share = total_amount / num_users
             for user in users_in_split:
                 eu = ExpenseUser()
-                eu.setId(user.getId())
+                eu.setId(user.id)
                 
-                if user.getId() == payer_id:
+                if user.id == payer_id:
                     eu.setPaidShare(f"{total_amount:.2f}")
                 else:
                     eu.setPaidShare("0.00")
@@ -255,6 +444,12 @@ class SplitwiseClient:
         
         if group_id:
             expense.setGroupId(group_id)
+        if date:
+            expense.setDate(date)
+        if currency:
+            expense.setCurrencyCode(currency.upper())
+        if details:
+            expense.setDetails(details)
         
         # Handling potential 0.01 rounding errors? 
         # API might reject if sums don't match exactly.
@@ -267,9 +462,195 @@ class SplitwiseClient:
         
         if errors:
              raise Exception(f"Splitwise Error: {errors.getErrors()}")
-             
+
+        self._index_expense(expense)
+        self._note_write()
+        return expense
+
+    def record_payment(self, payer_name: str, recipient_name: str, amount: str, group_name: str = None, description: str = "Settle up", date: str = None,
+                       details: str = None):
+        """
+        Record a settle-up: `payer_name` paid `recipient_name` back. Either
+        side may be "me". Returns the created payment expense.
+        """
+        _load_sdk()
+        me = self.get_current_user()
+
+        def resolve(name, label):
+            if name.lower() in ["me", "i", "myself"]:
+                return me
+            friend = self.find_friend_by_name(name)
+            if not friend:
+                raise self._not_found(label, name)
+            return friend
+
+        payer = resolve(payer_name, "Payer")
+        recipient = resolve(recipient_name, "Recipient")
+        if payer.id == recipient.id:
+            raise ValueError("Payer and recipient must be different people.")
+
+        total = f"{float(amount):.2f}"
+        paid = ExpenseUser()
+        paid.setId(payer.id)
+        paid.setPaidShare(total)
+        paid.setOwedShare("0.00")
+        received = ExpenseUser()
+        received.setId(recipient.id)
+        received.setPaidShare("0.00")
+        received.setOwedShare(total)
+
+        expense = Expense()
+        expense.setCost(total)
+        expense.setDescription(description)
+        expense.setUsers([paid, received])
+        expense.setPayment(True)
+        if group_name:
+            group = self.find_group_by_name(group_name)
+            if not group:
+                raise self._not_found("Group", group_name, kind="group")
+            expense.setGroupId(group.id)
+        if date:
+            expense.setDate(date)
+        if details:
+            expense.setDetails(details)
+
+        expense, errors = self.client.createExpense(expense)
+        if errors:
+            raise Exception(f"Splitwise Error: {errors.getErrors()}")
+
+        self._index_expense(expense)
+        self._note_write()
         return expense
 
+    def find_tagged_expense(self, tag: str, dated_after: str = None, dated_before: str = None):
+        """
+        The expense dated in the given range with `tag` as a whole line of its
+        details, or None. Asks Splitwise directly, so a write that errored out
+        on our side (e.g. a timeout) but was created anyway is found.
+        """
+        for expense in self.client.getExpenses(dated_after=dated_after, dated_before=dated_before, limit=0):
+            lines = [line.strip() for line in (expense.getDetails() or "").splitlines()]
+            if tag in lines and not expense.getDeletedAt():
+                return expense
+        return None
+
+    def update_expense(self, expense_id: str, amount: str = None, description: str = None, split_map: dict = None,
+                       payer_name: str = None, friend_names: List[str] = None, date: str = None):
+        """
+        Correct an existing expense in place (same ID and history).
+
+        The requested state is compared with the cached expense and only what
+        changed is sent, in one call. Shares are recomputed when the amount,
+        split_map, payer or participants change: a new amount alone keeps the
+        existing proportions, split_map works as in add_expense, and
+        friend_names replaces the participants (you plus those friends) with an
+        equal split unless split_map is given.
+
+        Returns (expense, changed_fields); expense is None when nothing changed.
+        """
+        _load_sdk()
+        current = self.expense_index.get(expense_id)
+        if current is None:
+            self.expense_index.upsert([self.client.getExpense(expense_id)])
+            current = self.expense_index.get(expense_id)
+            if current is None:
+                raise ValueError(f"Expense {expense_id} not found.")
+
+        shares = {uid: (paid, owed) for uid, paid, owed in current["shares"]}
+        payer_id = current["payer_id"]
+        total = float(amount) if amount is not None else current["cost"]
+
+        users = None
+        if friend_names is not None:
+            me = self.get_current_user()
+            users = {me.id: me}
+            for name in friend_names:
+                friend = self.find_friend_by_name(name)
+                if not friend:
+                    raise self._not_found("Friend", name)
+                users[friend.id] = friend
+        if payer_name is not None:
+            if payer_name.lower() in ["me", "i", "myself"]:
+                payer_id = self.get_current_user().id
+            else:
+                payer = self.find_friend_by_name(payer_name)
+                if not payer:
+                    raise self._not_found("Payer", payer_name)
+                payer_id = payer.id
+                if users is not None:
+                    users.setdefault(payer.id, payer)
+
+        if split_map:
+            me = self.get_current_user()
+            if users is None:
+                known = {m.id: m for g in self.directory.groups() for m in g.members}
+                known.update({f.id: f for f in self.directory.friends()})
+                known[me.id] = me
+                users = {uid: known.get(uid) or User(uid) for uid in shares}
+            owed = {uid: _owed_share(u, split_map, me.id, total) for uid, u in users.items()}
+        elif users is not None:
+            owed = _scale_shares({uid: 1.0 for uid in users}, total)
+        elif _cents(total) != _cents(current["cost"]):
+            owed = _scale_shares({uid: o for uid, (_, o) in shares.items()}, total)
+        else:
+            owed = {uid: o for uid, (_, o) in shares.items()}
+        # Paid shares are only rebuilt when the payer or amount changes, so a
+        # multi-payer expense keeps its payers through other edits.
+        existing_paid = {uid: p for uid, (p, _) in shares.items() if _cents(p)}
+        payer_changed = payer_name is not None and set(existing_paid) != {payer_id}
+        if payer_changed or not existing_paid:
+            paid = {payer_id: total}
+        elif _cents(total) != _cents(current["cost"]):
+            paid = _scale_shares(existing_paid, total)
+        else:
+            paid = existing_paid
+        desired = {uid: (paid.get(uid, 0.0), o) for uid, o in owed.items()}
+        for uid, p in paid.items():
+            if uid not in desired:
+                desired[uid] = (p, 0.0)
+
+        expense = Expense()
+        expense.setId(int(expense_id))
+        changed = []
+        if _cents(total) != _cents(current["cost"]):
+            expense.setCost(f"{total:.2f}")
+            changed.append("cost")
+        if description is not None and description != current["description"]:
+            expense.setDescription(description)
+            changed.append("description")
+        if date is not None and date != current["date"]:
+            expense.setDate(date)
+            changed.append("date")
+        as_cents = lambda d: {uid: (_cents(p), _cents(o)) for uid, (p, o) in d.items()}
+        if as_cents(desired) != as_cents(shares):
+            # The API replaces all shares when any are sent, so send the full set.
+            expense_users = []
+            for uid, (paid, owed_share) in desired.items():
+                eu = ExpenseUser()
+                eu.setId(uid)
+                eu.setPaidShare(f"{paid:.2f}")
+                eu.setOwedShare(f"{owed_share:.2f}")
+                expense_users.append(eu)
+            for uid in shares.keys() - desired.keys():
+                eu = ExpenseUser()
+                eu.setId(uid)
+                eu.setPaidShare("0.00")
+                eu.setOwedShare("0.00")
+                expense_users.append(eu)
+            expense.setUsers(expense_users)
+            changed.append("shares")
+
+        if not changed:
+            return None, []
+
+        updated, errors = self.client.updateExpense(expense)
+        if errors:
+            raise Exception(f"Splitwise Error: {errors.getErrors()}")
+
+        self._index_expense(updated)
+        self._note_write()
+        return updated, changed
+
     def delete_expense(self, expense_id: str):
         """
         Delete an expense by ID.
@@ -279,7 +660,190 @@ class SplitwiseClient:
         
         success, errors = self.client.deleteExpense(expense_id)
         if success:
+            self.expense_index.remove(expense_id)
+            self._note_write()
             return True
         else:
             raise Exception(f"Failed to delete expense: {errors.getErrors()}")
 
+
+    # --- Expense search ---
+
+    def _index_expense(self, expense):
+        # Write-through so a fresh expense is searchable before the next sync.
+        try:
+            self.expense_index.upsert([expense])
+        except Exception:
+            self.expense_sync.mark_stale()
+
+    def sync_expenses(self, force: bool = False) -> int:
+        """
+        Pull expenses changed since the last sync into the local index.
+        Throttled to once per `ExpenseSync.min_interval` unless forced.
+        """
+        if not self.client:
+            raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
+        return self.expense_sync.sync(self.client, force=force)
+
+    def search_expenses(
+        self,
+        query: str = None,
+        dated_after: str = None,
+        dated_before: str = None,
+        min_cost: float = None,
+        max_cost: float = None,
+        friend_name: str = None,
+        group_name: str = None,
+        payer_name: str = None,
+        limit: int = 20,
+        cursor: str = None,
+    ):
+        """
+        Query the local expense index. Names are resolved to IDs first.
+        Returns (rows, next_cursor).
+        """
+        self.sync_expenses()
+        friend_id, group_id, payer_id = self._filter_ids(friend_name, group_name, payer_name)
+        return self.expense_index.query(
+            text=query,
+            dated_after=dated_after,
+            dated_before=dated_before,
+            min_cost=min_cost,
+            max_cost=max_cost,
+            friend_id=friend_id,
+            group_id=group_id,
+            payer_id=payer_id,
+            limit=limit,
+            cursor=cursor,
+        )
+
+    def _filter_ids(self, friend_name: str = None, group_name: str = None, payer_name: str = None):
+        """Resolve expense filter names to (friend_id, group_id, payer_id)."""
+        friend_id = group_id = payer_id = None
+        if friend_name:
+            friend = self.find_friend_by_name(friend_name)
+            if not friend:
+                raise self._not_found("Friend", friend_name)
+            friend_id = friend.id
+        if group_name:
+            group = self.find_group_by_name(group_name)
+            if not group:
+                raise self._not_found("Group", group_name, kind="group")
+            group_id = group.id
+        if payer_name:
+            if payer_name.lower() in ["me", "i", "myself"]:
+                payer_id = self.get_current_user().id
+            else:
+                payer = self.find_friend_by_name(payer_name)
+                if not payer:
+                    raise self._not_found("Payer", payer_name)
+                payer_id = payer.id
+        return friend_id, group_id, payer_id
+
+    def spending_summary(self, period: str = "month", by: str = None, dated_after: str = None,
+                         dated_before: str = None, group_name: str = None, friend_name: str = None,
+                         payer_name: str = None, category: str = None, mine: bool = False, limit: int = 200):
+        """
+        Spending totals per period (and optionally per category, group, friend
+        or payer), per currency, from the local expense index. With `mine`,
+        only the current user's share counts. Returns
+        {"rows": [...], "totals": {currency: total}, "truncated": bool}.
+        """
+        self.sync_expenses()
+        friend_id, group_id, payer_id = self._filter_ids(friend_name, group_name, payer_name)
+        if self.spending is None:
+            from splitwise_mcp.analytics import SpendingCube
+            self.spending = SpendingCube(self.expense_index)
+        self.spending.refresh()
+        rows = self.spending.summarize(
+            period=period, by=by, dated_after=dated_after, dated_before=dated_before, group_id=group_id,
+            payer_id=payer_id, friend_id=friend_id, category=category,
+            me_id=self.get_current_user().id if mine else None,
+        )
+
+        totals = {}
+        for r in rows:
+            totals[r["currency"]] = round(totals.get(r["currency"], 0.0) + r["total"], 2)
+        if by in ("friend", "payer"):
+            names = self.user_names()
+            for r in rows:
+                r[by] = names.get(r[by], r[by])
+        elif by == "group":
+            names = {g.id: g.name for g in self.get_groups()}
+            for r in rows:
+                r["group"] = names.get(r["group"], r["group"]) if r["group"] else "(no group)"
+        limit = max(1, min(int(limit), 1000))
+        return {"rows": rows[:limit], "totals": totals, "truncated": len(rows) > limit}
+
+    def user_names(self) -> dict:
+        """Map of user ID -> display name for the current user and friends."""
+        names = {}
+        try:
+            me = self.get_current_user()
+            names[me.id] = "me"
+        except Exception:
+            pass
+        for f in self.get_friends():
+            names[f.id] = f.name
+        return names
+
+    # --- Change notifications ---
+
+    def _note_write(self):
+        if self.refresher is not None:
+            self.refresher.note_write()
+
+    def apply_changes(self, changes) -> int:
+        """
+        Apply Change(resource, action, id) tuples to the local caches, touching
+        only the affected entries. Returns the number applied.
+        """
+        if not self.client:
+            raise ValueError("Splitwise client not configured. Please use 'configure_splitwise' tool.")
+        # Last change per entry wins
+        latest = {}
+        for change in changes:
+            latest[(change.resource, change.id)] = change
+        for change in latest.values():
+            if change.resource == "expense":
+                if change.action == "delete":
+                    self.expense_index.remove(change.id)
+                else:
+                    # Deleted expenses come back with deleted_at set and are dropped by upsert
+                    self.expense_index.upsert([self.client.getExpense(change.id)])
+            elif change.resource == "group":
+                group = self.client.getGroup(change.id) if change.action == "upsert" else None
+                self.directory.apply("group", change.id, group)
+            elif change.resource == "friend":
+                if change.action == "delete":
+                    self.directory.apply("friend", change.id, None)
+                else:
+                    # There is no single-friend endpoint; refetch the list on next read.
+                    self.directory.invalidate()
+        return len(latest)
+
+    def poll_changes(self) -> int:
+        """
+        Cheap "what changed since last time" check via Splitwise notifications.
+        The first call only records a starting point. Returns the number of
+        changes applied.
+        """
+        if not self.client:
+            return 0
+        started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        updated_after = self.expense_index.get_meta("notifications_after")
+        changes = []
+        if updated_after:
+            for notification in self.client.getNotifications(updated_after=updated_after) or []:
+                change = change_from_notification(notification)
+                if change:
+                    changes.append(change)
+        applied = self.apply_changes(changes) if changes else 0
+        self.expense_index.set_meta("notifications_after", started)
+        return applied
+
+    def start_refresher(self, **kwargs) -> BackgroundRefresher:
+        """Start (once) the adaptive background poller for this client."""
+        if self.refresher is None:
+            self.refresher = BackgroundRefresher(self, **kwargs)
+        return self.refresher.start()
@@ -0,0 +1,222 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from splitwise_mcp.matching import NameIndex
+from splitwise_mcp.model import Group, build_directory, intern_user
+
+
+class Directory:
+    """
+    Cached friends and groups for one Splitwise account, held as model.User and
+    model.Group objects converted once when fetched.
+
+    Entries are fetched through `fetch_friends`/`fetch_groups` at most once per
+    `ttl` seconds. `version` increases whenever the fetched contents actually
+    change, so derived state (the name index, prompt context) can be rebuilt
+    only when needed. `version` is local to the process; `digest` is a hash of
+    the same contents that means the same thing on every replica and across
+    restarts (HTTP ETags use it).
+
+    With a `snapshot` (see snapshot.DirectorySnapshot), the first read is
+    served from disk and revalidated against the API in the background, and
+    every fetch is written back. With a `shared` cache (snapshot.SharedDirectoryCache),
+    fetches reuse a copy another replica stored within the TTL.
+    """
+
+    def __init__(self, fetch_friends, fetch_groups, ttl: float = None, fetch_me=None, snapshot=None, shared=None):
+        self._fetch_friends = fetch_friends
+        self._fetch_groups = fetch_groups
+        self._fetch_me = fetch_me
+        self.ttl = float(os.getenv("SPLITWISE_DIRECTORY_TTL", "300")) if ttl is None else ttl
+        self.snapshot = snapshot
+        self.shared = shared
+        self.version = 0
+        self.digest = ""
+        self._me = None
+        self._friends = None
+        self._groups = None
+        self._by_id = {}
+        self._fingerprint = None
+        self._fetched_at = 0.0
+        self._generation = 0
+        self._index = None
+        self._index_version = -1
+        self._lock = threading.RLock()
+
+    def invalidate(self):
+        """Force the next read to hit the API."""
+        with self._lock:
+            self._fetched_at = 0.0
+            self._drop_shared()
+
+    def _drop_shared(self):
+        if self.shared is not None:
+            try:
+                self.shared.delete()
+            except Exception:
+                pass
+
+    def reset(self, snapshot=None, shared=None):
+        """Drop everything cached (e.g. credentials changed) and switch snapshot/shared cache."""
+        with self._lock:
+            self.snapshot = snapshot
+            self.shared = shared
+            self._me = self._friends = self._groups = None
+            self._by_id = {}
+            self._fingerprint = None
+            self.digest = ""
+            self._fetched_at = 0.0
+            self._generation += 1
+
+    def is_stale(self) -> bool:
+        return self._friends is None or time.monotonic() - self._fetched_at >= self.ttl
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            if not force and self._friends is None and self._load_snapshot():
+                self.revalidate_async()
+                return
+            self._install(*self._fetch(use_shared=not force))
+
+    def warm(self) -> bool:
+        """Load the on-disk snapshot, if any, and revalidate it in the background."""
+        with self._lock:
+            if self._friends is not None or not self._load_snapshot():
+                return False
+        self.revalidate_async()
+        return True
+
+    def revalidate_async(self):
+        """Refetch from the API on a background thread without blocking readers."""
+        generation = self._generation
+
+        def run():
+            try:
+                data = self._fetch()
+            except Exception:
+                return  # keep serving what we have; the next TTL expiry retries
+            with self._lock:
+                if generation == self._generation:
+                    self._install(*data)
+
+        threading.Thread(target=run, name="directory-revalidate", daemon=True).start()
+
+    def _fetch(self, use_shared: bool = True):
+        if use_shared and self.shared is not None:
+            try:
+                data = self.shared.load()
+            except Exception:
+                data = None
+            if data is not None:
+                return data
+        me = self._fetch_me() if self._fetch_me else None
+        data = me, list(self._fetch_friends() or []), list(self._fetch_groups() or [])
+        self._save_shared(*data)
+        return data
+
+    def _save_shared(self, me, friends, groups):
+        if self.shared is not None:
+            try:
+                self.shared.save(me, friends, groups)
+            except Exception:
+                pass  # another replica will fetch for itself
+
+    def _install(self, me, friends, groups, save: bool = True):
+        me, friends, groups = build_directory(me, friends, groups)
+        self._me = me
+        self._friends = friends
+        self._groups = groups
+        self._by_id = {("friend", f.id): f for f in friends}
+        self._by_id.update({("group", g.id): g for g in groups})
+        self._bump_if_changed()
+        self._fetched_at = time.monotonic()
+        if save and self.snapshot is not None:
+            try:
+                self.snapshot.save(me, friends, groups)
+            except (OSError, sqlite3.Error):
+                pass  # the snapshot is only an optimisation
+
+    def _load_snapshot(self) -> bool:
+        data = self.snapshot.load() if self.snapshot is not None else None
+        if data is None:
+            return False
+        self._install(*data, save=False)
+        return True
+
+    def _bump_if_changed(self):
+        # Balances and memberships count too: HTTP ETags are built from the digest.
+        fingerprint = (
+            tuple((f.id, f.name, tuple(sorted((f.balances or {}).items()))) for f in self._friends),
+            tuple((g.id, g.name, tuple(m.id for m in g.members)) for g in self._groups),
+        )
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self.digest = hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+            self.version += 1
+
+    def apply(self, kind: str, entry_id, entry=None):
+        """
+        Replace one cached friend or group with `entry` (or drop it when
+        `entry` is None) without refetching the rest. No-op before the first
+        fetch, since there is nothing cached to patch.
+        """
+        with self._lock:
+            if self._friends is None:
+                return
+            attr = "_friends" if kind == "friend" else "_groups"
+            entries = [e for e in getattr(self, attr) if e.id != entry_id]
+            if entry is not None:
+                users = {f.id: f for f in self._friends}
+                entry = Group.from_sdk(entry, users) if kind == "group" else intern_user(entry, users)
+                entries.append(entry)
+            setattr(self, attr, entries)
+            self._by_id.pop((kind, entry_id), None)
+            if entry is not None:
+                self._by_id[(kind, entry_id)] = entry
+            self._bump_if_changed()
+            self._save_shared(self._me, self._friends, self._groups)
+
+    def me(self):
+        """The current user, when a `fetch_me` was given."""
+        self.refresh()
+        return self._me
+
+    def friends(self):
+        self.refresh()
+        return self._friends
+
+    def groups(self):
+        self.refresh()
+        return self._groups
+
+    def name_index(self) -> NameIndex:
+        """Name index over friends and groups, rebuilt when the version changes."""
+        with self._lock:
+            self.refresh()
+            if self._index_version != self.version:
+                entries = [("friend", f.id, f.name) for f in self._friends]
+                entries += [("group", g.id, g.name) for g in self._groups]
+                self._index = NameIndex(entries)
+                self._index_version = self.version
+            return self._index
+
+    def get(self, kind: str, entry_id):
+        """The cached User/Group behind a name index entry."""
+        self.refresh()
+        return self._by_id.get((kind, entry_id))
+
+    def resolve(self, name: str, kind: str):
+        """Fuzzy/phonetic best match for a name (see NameIndex.resolve)."""
+        return self.name_index().resolve(name, kind=kind)
+
+    def candidates(self, text: str, k_friends: int = 8, k_groups: int = 4):
+        """Top-k friends and groups that plausibly appear in `text`."""
+        index = self.name_index()
+        return (
+            index.search(text, k=k_friends, kind="friend"),
+            index.search(text, k=k_groups, kind="group"),
+        )
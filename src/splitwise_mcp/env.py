@@ -0,0 +1,17 @@
+_loaded = False
+
+def load_env():
+    """
+    Load variables from a local .env file, once per process.
+    Called lazily by the clients instead of at import time so that importing
+    the package has no side effects.
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
@@ -0,0 +1,424 @@
+import base64
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL DEFAULT '',
+    cost REAL NOT NULL DEFAULT 0,
+    currency TEXT,
+    date TEXT NOT NULL DEFAULT '',
+    group_id INTEGER,
+    payer_id INTEGER,
+    category TEXT,
+    updated_at TEXT,
+    payment INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date, id);
+CREATE INDEX IF NOT EXISTS idx_expenses_cost ON expenses(cost);
+CREATE INDEX IF NOT EXISTS idx_expenses_group ON expenses(group_id, date);
+CREATE INDEX IF NOT EXISTS idx_expenses_payer ON expenses(payer_id, date);
+
+CREATE TABLE IF NOT EXISTS expense_users (
+    expense_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    paid_share REAL NOT NULL DEFAULT 0,
+    owed_share REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (expense_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_expense_users_user ON expense_users(user_id, expense_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+    description, content='expenses', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS expenses_ai AFTER INSERT ON expenses BEGIN
+    INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_ad AFTER DELETE ON expenses BEGIN
+    INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_au AFTER UPDATE ON expenses BEGIN
+    INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ["id", "description", "cost", "currency", "date", "group_id", "payer_id", "category"]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def expense_to_row(expense):
+    """
+    Flatten a splitwise SDK Expense into (row, shares) tuples for the index.
+    The payer is the user with the largest paid share.
+    """
+    shares = []
+    payer_id = None
+    top_paid = 0.0
+    for u in expense.getUsers() or []:
+        paid = _to_float(u.getPaidShare())
+        owed = _to_float(u.getOwedShare())
+        shares.append((u.getId(), paid, owed))
+        if paid > top_paid:
+            top_paid = paid
+            payer_id = u.getId()
+
+    category = expense.getCategory() if hasattr(expense, "getCategory") else None
+    payment = expense.getPayment() if hasattr(expense, "getPayment") else False
+    row = {
+        "id": expense.getId(),
+        "description": expense.getDescription() or "",
+        "cost": _to_float(expense.getCost()),
+        "currency": expense.getCurrencyCode() if hasattr(expense, "getCurrencyCode") else None,
+        "date": expense.getDate() or "",
+        "group_id": expense.getGroupId() or None,
+        "payer_id": payer_id,
+        "category": category.getName() if category is not None and hasattr(category, "getName") else None,
+        "updated_at": expense.getUpdatedAt() if hasattr(expense, "getUpdatedAt") else None,
+        "payment": 1 if payment is True else 0,
+    }
+    return row, shares
+
+
+def _fts_query(text: str) -> str:
+    # Quote every token so user input can't inject FTS5 syntax, and prefix-match
+    # so "tax" finds "taxi".
+    tokens = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def encode_cursor(date: str, expense_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date}|{expense_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        date, expense_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return date, int(expense_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class ExpenseIndex:
+    """
+    Local SQLite index of expenses.
+
+    Descriptions are searchable through FTS5, and date, cost, group, payer and
+    participant columns are indexed so filtered queries never touch the API.
+    Results are ordered newest first and paginated with an opaque keyset cursor.
+
+    Every write bumps `revision`, and changes_since() tells derived views
+    (e.g. analytics.SpendingCube) which expenses to reload.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self.revision = 0
+        self._changed = {}  # expense id -> revision of its last write
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(expenses)")}
+            if "payment" not in columns:
+                # Index files written before settle-ups were flagged
+                self._conn.execute("ALTER TABLE expenses ADD COLUMN payment INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Writes ---
+
+    def claim(self, owner: str) -> bool:
+        """
+        Tie the index to one account (e.g. a credential key). Expenses and
+        sync cursors indexed for anyone else are dropped, so a new account
+        never sees the previous one's expenses and syncs from scratch.
+        Returns True if anything was dropped.
+        """
+        with self._lock:
+            previous = self.get_meta("owner")
+            if previous == owner:
+                return False
+            ids = [r["id"] for r in self._conn.execute("SELECT id FROM expenses")]
+            with self._conn:
+                self._conn.execute("DELETE FROM expense_users")
+                self._conn.execute("DELETE FROM expenses")
+                self._conn.execute("DELETE FROM meta")
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('owner', ?)", (owner,))
+            for expense_id in ids:
+                self._touch(expense_id)
+            return bool(ids) or previous is not None
+
+    def upsert(self, expenses) -> int:
+        """Insert or replace SDK Expense objects. Deleted expenses are removed."""
+        count = 0
+        with self._lock, self._conn:
+            for expense in expenses:
+                if hasattr(expense, "getDeletedAt") and expense.getDeletedAt():
+                    self._delete(expense.getId())
+                    continue
+                row, shares = expense_to_row(expense)
+                self._upsert_row(row, shares)
+                count += 1
+        return count
+
+    def upsert_rows(self, rows) -> int:
+        """Insert or replace pre-flattened (row, shares) pairs."""
+        count = 0
+        with self._lock, self._conn:
+            for row, shares in rows:
+                self._upsert_row(row, shares)
+                count += 1
+        return count
+
+    def _touch(self, expense_id):
+        self.revision += 1
+        self._changed[int(expense_id)] = self.revision
+
+    def _upsert_row(self, row, shares):
+        self._conn.execute(
+            "INSERT INTO expenses (id, description, cost, currency, date, group_id, payer_id, category, updated_at, payment) "
+            "VALUES (:id, :description, :cost, :currency, :date, :group_id, :payer_id, :category, :updated_at, :payment) "
+            "ON CONFLICT(id) DO UPDATE SET description=excluded.description, cost=excluded.cost, "
+            "currency=excluded.currency, date=excluded.date, group_id=excluded.group_id, "
+            "payer_id=excluded.payer_id, category=excluded.category, updated_at=excluded.updated_at, "
+            "payment=excluded.payment",
+            {"currency": None, "category": None, "updated_at": None, "payment": 0, **row},
+        )
+        self._touch(row["id"])
+        self._conn.execute("DELETE FROM expense_users WHERE expense_id = ?", (row["id"],))
+        self._conn.executemany(
+            "INSERT INTO expense_users (expense_id, user_id, paid_share, owed_share) VALUES (?, ?, ?, ?)",
+            [(row["id"], uid, paid, owed) for uid, paid, owed in shares],
+        )
+
+    def remove(self, expense_id) -> None:
+        with self._lock, self._conn:
+            self._delete(expense_id)
+
+    def _delete(self, expense_id):
+        self._conn.execute("DELETE FROM expense_users WHERE expense_id = ?", (int(expense_id),))
+        self._conn.execute("DELETE FROM expenses WHERE id = ?", (int(expense_id),))
+        self._touch(expense_id)
+
+    def changes_since(self, revision: int):
+        """(IDs written or deleted after `revision`, current revision)."""
+        with self._lock:
+            return [i for i, r in self._changed.items() if r > revision], self.revision
+
+    def columns(self, ids=None):
+        """
+        (rows, shares) for analytics: rows are (id, date, cost, currency,
+        group_id, payer_id, category, payment) and shares (expense_id, user_id,
+        owed_share). All expenses, or just `ids`.
+        """
+        with self._lock:
+            rows_sql = "SELECT id, date, cost, currency, group_id, payer_id, category, payment FROM expenses"
+            shares_sql = "SELECT expense_id, user_id, owed_share FROM expense_users"
+            if ids is not None:
+                ids = [(int(i),) for i in ids]
+                if not ids:
+                    return [], []
+                # A temp table rather than a huge IN list
+                with self._conn:
+                    self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_ids (id INTEGER PRIMARY KEY)")
+                    self._conn.execute("DELETE FROM wanted_ids")
+                    self._conn.executemany("INSERT OR IGNORE INTO wanted_ids VALUES (?)", ids)
+                rows_sql += " WHERE id IN (SELECT id FROM wanted_ids)"
+                shares_sql += " WHERE expense_id IN (SELECT id FROM wanted_ids)"
+            rows = [tuple(r) for r in self._conn.execute(rows_sql)]
+            shares = [tuple(r) for r in self._conn.execute(shares_sql)]
+        return rows, shares
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key: str, value) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (key, None if value is None else str(value)),
+            )
+
+    def get(self, expense_id):
+        """One expense as a row dict with `shares` [(user_id, paid, owed)], or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM expenses WHERE id = ?", (int(expense_id),)
+            ).fetchone()
+            if row is None:
+                return None
+            row = dict(row)
+            row["shares"] = [
+                (r["user_id"], r["paid_share"], r["owed_share"])
+                for r in self._conn.execute(
+                    "SELECT user_id, paid_share, owed_share FROM expense_users WHERE expense_id = ?",
+                    (row["id"],),
+                )
+            ]
+        return row
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    # --- Reads ---
+
+    def query(
+        self,
+        text: str = None,
+        dated_after: str = None,
+        dated_before: str = None,
+        min_cost: float = None,
+        max_cost: float = None,
+        friend_id: int = None,
+        group_id: int = None,
+        payer_id: int = None,
+        limit: int = 20,
+        cursor: str = None,
+    ):
+        """
+        Return (rows, next_cursor). Rows are dicts with the indexed columns plus
+        the participant user IDs. `next_cursor` is None on the last page.
+        """
+        limit = max(1, min(int(limit), 500))
+        where = []
+        params = []
+
+        if text and _fts_query(text):
+            where.append("e.id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)")
+            params.append(_fts_query(text))
+        if dated_after:
+            where.append("e.date >= ?")
+            params.append(dated_after)
+        if dated_before:
+            # A bare day is inclusive of the whole day.
+            where.append("e.date <= ?")
+            params.append(dated_before + "T23:59:59Z" if len(dated_before) == 10 else dated_before)
+        if min_cost is not None:
+            where.append("e.cost >= ?")
+            params.append(float(min_cost))
+        if max_cost is not None:
+            where.append("e.cost <= ?")
+            params.append(float(max_cost))
+        if friend_id is not None:
+            where.append("EXISTS (SELECT 1 FROM expense_users eu WHERE eu.expense_id = e.id AND eu.user_id = ?)")
+            params.append(int(friend_id))
+        if group_id is not None:
+            where.append("e.group_id = ?")
+            params.append(int(group_id))
+        if payer_id is not None:
+            where.append("e.payer_id = ?")
+            params.append(int(payer_id))
+        if cursor:
+            c_date, c_id = decode_cursor(cursor)
+            where.append("(e.date < ? OR (e.date = ? AND e.id < ?))")
+            params.extend([c_date, c_date, c_id])
+
+        sql = f"SELECT {', '.join('e.' + c for c in COLUMNS)} FROM expenses e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.date DESC, e.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if rows:
+                ids = [r["id"] for r in rows]
+                placeholders = ",".join("?" * len(ids))
+                users = {}
+                for eu in self._conn.execute(
+                    f"SELECT expense_id, user_id FROM expense_users WHERE expense_id IN ({placeholders})", ids
+                ):
+                    users.setdefault(eu["expense_id"], []).append(eu["user_id"])
+                for r in rows:
+                    r["user_ids"] = users.get(r["id"], [])
+
+        next_cursor = encode_cursor(rows[-1]["date"], rows[-1]["id"]) if has_more else None
+        return rows, next_cursor
+
+    def iter_query(self, page_size: int = 200, **filters) -> Iterator[dict]:
+        """Stream every matching row, one page at a time."""
+        cursor = filters.pop("cursor", None)
+        while True:
+            rows, cursor = self.query(limit=page_size, cursor=cursor, **filters)
+            yield from rows
+            if not cursor:
+                return
+
+
+class ExpenseSync:
+    """
+    Keeps an ExpenseIndex in step with Splitwise using `updated_after`, so only
+    changed expenses are pulled after the initial backfill.
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, index: ExpenseIndex, min_interval: float = 60.0):
+        self.index = index
+        self.min_interval = min_interval
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def sync(self, sdk, force: bool = False) -> int:
+        """Pull expenses changed since the last sync. Returns the number of rows written."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_sync and now - self._last_sync < self.min_interval:
+                return 0
+            updated_after = self.index.get_meta("updated_after")
+            started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            written = 0
+            offset = 0
+            while True:
+                page = sdk.getExpenses(offset=offset, limit=self.PAGE_SIZE, updated_after=updated_after)
+                if not page:
+                    break
+                written += self.index.upsert(page)
+                if len(page) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+            self.index.set_meta("updated_after", started)
+            self._last_sync = now
+            return written
+
+    def mark_stale(self):
+        self._last_sync = 0.0
+
+
+def format_rows(rows: List[dict], names: Optional[dict] = None) -> List[str]:
+    """Render index rows as compact one-line summaries."""
+    names = names or {}
+    lines = []
+    for r in rows:
+        payer = names.get(r["payer_id"], r["payer_id"])
+        currency = f" {r['currency']}" if r.get("currency") else ""
+        lines.append(
+            f"- {r['date'][:10]} {r['description']} {r['cost']:.2f}{currency} "
+            f"(ID: {r['id']}, paid by {payer})"
+        )
+    return lines
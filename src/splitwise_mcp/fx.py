@@ -0,0 +1,265 @@
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from array import array
+from datetime import date as _date
+
+# Currency conversion from a locally cached table of daily reference rates.
+#
+# Rates are stored against one base currency in a flat array of doubles, one
+# row per day and one column per currency, so any pair on any cached day is
+# rates[to] / rates[from] and whole columns of amounts can be converted at
+# once. The latest rates are refreshed from a RateSource when older than
+# `max_age`; past days are fetched on first use and kept.
+
+
+class RateSource:
+    """Where rates come from: `fetch(day)` -> (day actually served, {currency: units per base})."""
+
+    base = "EUR"
+
+    def fetch(self, day: str = None):
+        raise NotImplementedError
+
+
+class FrankfurterSource(RateSource):
+    """ECB reference rates from the free Frankfurter API (no key; business days only)."""
+
+    def __init__(self, url: str = None, timeout: float = 10.0):
+        self.url = (url or os.getenv("SPLITWISE_FX_URL", "https://api.frankfurter.app")).rstrip("/")
+        self.timeout = timeout
+
+    def fetch(self, day=None):
+        with urllib.request.urlopen(f"{self.url}/{day or 'latest'}?from={self.base}", timeout=self.timeout) as resp:
+            data = json.load(resp)
+        return data["date"], {self.base: 1.0, **data["rates"]}
+
+
+class FakeRateSource(RateSource):
+    """
+    Fixed rates for tests and offline use: `rates` is {currency: units per
+    base}, or {day: {currency: ...}} for rates that change over time.
+    """
+
+    def __init__(self, rates: dict, base: str = "EUR"):
+        self.base = base
+        self.by_day = rates if all(isinstance(v, dict) for v in rates.values()) else None
+        self.rates = None if self.by_day else rates
+        self.calls = 0
+
+    def fetch(self, day=None):
+        self.calls += 1
+        if self.by_day is None:
+            return day or _date.today().isoformat(), {self.base: 1.0, **self.rates}
+        days = sorted(self.by_day)
+        i = bisect.bisect_right(days, day or days[-1]) - 1
+        served = days[max(i, 0)]
+        return served, {self.base: 1.0, **self.by_day[served]}
+
+
+def _ordinal(day) -> int:
+    if isinstance(day, int):
+        return day
+    return _date.fromisoformat(str(day)[:10]).toordinal()
+
+
+class FxTable:
+    """
+    Daily rates for every currency the source knows, relative to its base.
+    Each day is fetched once and then served locally; today and later use
+    the latest rates, refreshed every `max_age` seconds.
+
+    With `path`, the table is kept in a JSON file so it survives restarts.
+    """
+
+    def __init__(self, source: RateSource = None, path: str = None, max_age: float = None):
+        self.source = source or FrankfurterSource()
+        self.base = self.source.base
+        self.path = path
+        self.max_age = max_age if max_age is not None else float(os.getenv("SPLITWISE_FX_MAX_AGE", str(6 * 3600)))
+        self.currencies = []
+        self._column = {}
+        self.days = []
+        self.rates = array("d")
+        self.aliases = {}
+        self.refreshed_at = 0.0
+        # Reentrant: lookups resolve their row and read it under one hold,
+        # and resolving can refresh or fetch a day, which locks too.
+        self._lock = threading.RLock()
+        if path:
+            self._load()
+
+    # Storage
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("base") != self.base:
+                return
+            self.currencies = data["currencies"]
+            self._column = {c: i for i, c in enumerate(self.currencies)}
+            self.days = data["days"]
+            self.rates = array("d", (math.nan if r is None else r for r in data["rates"]))
+            self.aliases = {int(k): v for k, v in data.get("aliases", {}).items()}
+            self.refreshed_at = data.get("refreshed_at", 0.0)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {
+            "base": self.base,
+            "currencies": self.currencies,
+            "days": self.days,
+            "rates": [None if math.isnan(r) else r for r in self.rates],
+            "aliases": self.aliases,
+            "refreshed_at": self.refreshed_at,
+        }
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def _add_row(self, day: str, rates: dict):
+        """Insert or replace one day's rates, widening the table for new currencies."""
+        new = [c for c in rates if c not in self._column]
+        if new:
+            width = len(self.currencies)
+            widened = array("d")
+            for row in range(len(self.days)):
+                widened.extend(self.rates[row * width:(row + 1) * width])
+                widened.extend([math.nan] * len(new))
+            self.rates = widened
+            for c in new:
+                self._column[c] = len(self.currencies)
+                self.currencies.append(c)
+        width = len(self.currencies)
+        row = [math.nan] * width
+        for c, r in rates.items():
+            row[self._column[c]] = float(r)
+        ordinal = _ordinal(day)
+        i = bisect.bisect_left(self.days, ordinal)
+        if i < len(self.days) and self.days[i] == ordinal:
+            self.rates[i * width:(i + 1) * width] = array("d", row)
+        else:
+            self.days.insert(i, ordinal)
+            self.rates[i * width:i * width] = array("d", row)
+
+    # Refresh
+
+    def refresh(self, force: bool = False) -> bool:
+        """Fetch the latest rates if the table is older than max_age. Returns True if it fetched."""
+        with self._lock:
+            if not force and self.days and time.time() - self.refreshed_at < self.max_age:
+                return False
+            day, rates = self.source.fetch()
+            self._add_row(day, rates)
+            self.refreshed_at = time.time()
+            self._save()
+            return True
+
+    def _row_for(self, day) -> int:
+        """Row index serving `day`, fetching that day from the source on first use."""
+        ordinal = _ordinal(day) if day is not None else None
+        if ordinal is None or ordinal >= _date.today().toordinal():
+            self.refresh()
+            with self._lock:
+                return len(self.days) - 1
+        with self._lock:
+            served = self.aliases.get(ordinal, ordinal)
+            i = bisect.bisect_left(self.days, served)
+            if i < len(self.days) and self.days[i] == served:
+                return i
+            # Weekends and holidays are served from the previous business day;
+            # remember that so the day is only fetched once.
+            served_day, rates = self.source.fetch(_date.fromordinal(ordinal).isoformat())
+            self._add_row(served_day, rates)
+            self.aliases[ordinal] = _ordinal(served_day)
+            self._save()
+            return bisect.bisect_left(self.days, self.aliases[ordinal])
+
+    # Lookups
+
+    def rate(self, from_currency: str, to_currency: str, day=None) -> float:
+        """Units of `to_currency` per unit of `from_currency` on `day` (default: latest)."""
+        from_currency, to_currency = from_currency.upper(), to_currency.upper()
+        if from_currency == to_currency:
+            return 1.0
+        with self._lock:
+            row = self._row_for(day)
+            width = len(self.currencies)
+            try:
+                src = self.rates[row * width + self._column[from_currency]]
+                dst = self.rates[row * width + self._column[to_currency]]
+            except KeyError as e:
+                raise ValueError(f"Unknown currency: {e.args[0]}")
+        if math.isnan(src) or math.isnan(dst):
+            self._no_rate(from_currency, to_currency, day)
+        return dst / src
+
+    def convert(self, amount: float, from_currency: str, to_currency: str, day=None) -> float:
+        return float(amount) * self.rate(from_currency, to_currency, day)
+
+    def convert_many(self, amounts, from_currencies, to_currency: str, days=None):
+        """
+        Convert a column of amounts to `to_currency`. `from_currencies` and
+        `days` may be single values or sequences the length of `amounts`.
+        Rows are fetched once per distinct day; the arithmetic runs on numpy
+        arrays when numpy is installed.
+        """
+        n = len(amounts)
+        froms = [from_currencies] * n if isinstance(from_currencies, str) else list(from_currencies)
+        days = [days] * n if days is None or isinstance(days, (str, int)) else list(days)
+        distinct = set(days)
+        for d in distinct:
+            self._row_for(d)
+
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        # Fetching a day can insert a row and shift the others, so index only
+        # once every day is in the table, and read under the same hold.
+        with self._lock:
+            rows = {d: self._row_for(d) for d in distinct}
+            width = len(self.currencies)
+            try:
+                dst_col = self._column[to_currency.upper()]
+                src_cols = [self._column[c.upper()] for c in froms]
+            except KeyError as e:
+                raise ValueError(f"Unknown currency: {e.args[0]}")
+            row_idx = [rows[d] for d in days]
+            if np is not None:
+                # The table can't be resized while numpy views it.
+                table = np.frombuffer(self.rates, dtype=np.float64).reshape(-1, width)
+                r, src = np.asarray(row_idx), np.asarray(src_cols)
+                factors = np.where(src == dst_col, 1.0, table[r, dst_col] / table[r, src])
+                del table
+            else:
+                factors = [1.0 if s == dst_col else self.rates[r * width + dst_col] / self.rates[r * width + s]
+                           for r, s in zip(row_idx, src_cols)]
+        if np is not None:
+            missing = np.flatnonzero(np.isnan(factors))
+            if missing.size:
+                self._no_rate(froms[missing[0]], to_currency, days[missing[0]])
+            return (np.asarray(amounts, dtype=np.float64) * factors).tolist()
+        converted = []
+        for a, f, d, factor in zip(amounts, froms, days, factors):
+            if math.isnan(factor):
+                self._no_rate(f, to_currency, d)
+            converted.append(float(a) * factor)
+        return converted
+
+    @staticmethod
+    def _no_rate(from_currency, to_currency, day):
+        # Same message as rate(): a currency the source didn't quote that day
+        raise ValueError(f"No {from_currency.upper()}/{to_currency.upper()} rate for {day or 'today'}.")
@@ -0,0 +1,320 @@
+import re
+from collections import defaultdict, namedtuple
+from typing import Iterable, List, Tuple
+
+# Words that never name a friend or group; skipping them keeps the candidate
+# set tight when whole utterances are used as queries.
+STOPWORDS = {
+    "a", "an", "and", "add", "all", "at", "between", "but", "by", "cost", "delete",
+    "each", "equally", "exclude", "expense", "for", "from", "group", "i", "in", "is", "it",
+    "me", "my", "of", "on", "owes", "paid", "percent", "split", "the", "to", "us",
+    "with", "we", "was", "dollars", "rupees", "bucks",
+}
+
+# Weights of the two signals in a token score. Exact token matches score 1.0.
+GRAM_WEIGHT = 0.6
+PHONETIC_WEIGHT = 0.4
+
+# A best match is "clear" when it scores at least CLEAR_SCORE and beats the
+# runner-up by CLEAR_MARGIN.
+CLEAR_SCORE = 0.5
+CLEAR_MARGIN = 0.15
+
+VOWELS = set("aeiouy")
+
+Match = namedtuple("Match", ["entry", "candidates", "clear"])
+
+def normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower()).strip()
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in normalize(text).split() if t]
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def phonetic_keys(token: str, max_len: int = 6) -> Tuple[str, str]:
+    """
+    Double Metaphone-style (primary, alternate) codes for one word.
+
+    Covers the rules that matter for personal names (silent letters, soft
+    C/G, PH/TH/SH digraphs, vowels kept only as a leading 'A'); ambiguous
+    sounds such as CH or soft G produce a different alternate code.
+    """
+    w = re.sub(r"[^a-z]", "", token.lower())
+    if not w:
+        return "", ""
+    if w[:2] in ("kn", "gn", "pn", "wr", "ps"):
+        w = w[1:]
+    if w[0] == "x":
+        w = "s" + w[1:]
+
+    primary, alternate = [], []
+
+    def add(p, a=None):
+        primary.append(p)
+        alternate.append(p if a is None else a)
+
+    i, n = 0, len(w)
+    while i < n:
+        c = w[i]
+        prev = w[i - 1] if i else ""
+        nxt = w[i + 1] if i + 1 < n else ""
+        nxt2 = w[i + 2] if i + 2 < n else ""
+        step = 1
+        if c in VOWELS:
+            if i == 0:
+                add("A")
+        elif c == nxt and c != "c":
+            pass  # doubled consonant, handled on the next letter
+        elif c == "b":
+            add("P")
+        elif c == "c":
+            if nxt == "h":
+                add("X", "K")
+                step = 2
+            elif nxt in ("i", "e", "y"):
+                add("S")
+            elif nxt in ("k", "c", "q"):
+                add("K")
+                step = 2
+            else:
+                add("K")
+        elif c == "d":
+            if nxt == "g" and nxt2 in ("i", "e", "y"):
+                add("J")
+                step = 2
+            else:
+                add("T")
+        elif c == "g":
+            if nxt == "h":
+                if i == 0:
+                    add("K")
+                step = 2
+            elif nxt == "n" and i + 2 == n:
+                pass
+            elif nxt in ("i", "e", "y"):
+                add("J", "K")
+            else:
+                add("K")
+        elif c == "h":
+            if (i == 0 or prev in VOWELS) and nxt in VOWELS:
+                add("H")
+        elif c == "j":
+            add("J", "H")
+        elif c == "k":
+            add("K")
+        elif c == "p":
+            if nxt == "h":
+                add("F")
+                step = 2
+            else:
+                add("P")
+        elif c == "q":
+            add("K")
+        elif c == "s":
+            if nxt == "h":
+                add("X")
+                step = 2
+            elif nxt == "c" and nxt2 == "h":
+                add("SK")
+                step = 3
+            elif nxt == "i" and nxt2 in ("o", "a"):
+                add("X", "S")
+            else:
+                add("S")
+        elif c == "t":
+            if nxt == "h":
+                add("0", "T")
+                step = 2
+            elif nxt == "i" and nxt2 in ("o", "a"):
+                add("X")
+            elif nxt == "c" and nxt2 == "h":
+                pass
+            else:
+                add("T")
+        elif c == "v":
+            add("F")
+        elif c == "w":
+            if nxt in VOWELS:
+                add("W", "F" if i == 0 else "W")
+        elif c == "x":
+            add("KS")
+        elif c == "z":
+            add("S", "TS")
+        else:
+            add(c.upper())
+        i += step
+
+    def collapse(parts):
+        out = []
+        for ch in "".join(parts):
+            if not out or out[-1] != ch:
+                out.append(ch)
+        return "".join(out)[:max_len]
+
+    return collapse(primary), collapse(alternate)
+
+def _edit_similarity(a: str, b: str) -> float:
+    """1 - normalised Levenshtein distance; inputs are short phonetic keys."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return 1.0 - prev[-1] / max(len(a), len(b))
+
+
+class NameIndex:
+    """
+    In-memory fuzzy and phonetic index over friend and group names.
+
+    Every name token is precomputed into a character trigram set and a pair of
+    phonetic keys, each held in an inverted index. A lookup only scores entries
+    that share a trigram or a phonetic key with the query instead of scanning
+    the whole directory.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, int, str]] = ()):
+        # entries: (kind, id, display name)
+        self.entries = []
+        self._grams = defaultdict(list)  # trigram -> [(entry_idx, token_idx)]
+        self._phones = defaultdict(list)  # phonetic key -> [(entry_idx, token_idx)]
+        self._tokens = []  # entry_idx -> [(token, trigram set, phonetic keys)]
+        self._exact = defaultdict(list)  # full name / first / last -> [entry_idx]
+        for kind, entry_id, name in entries:
+            self.add(kind, entry_id, name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, kind: str, entry_id: int, name: str):
+        idx = len(self.entries)
+        self.entries.append((kind, entry_id, name))
+        tokens = tokenize(name)
+        if tokens:
+            for key in {" ".join(tokens), tokens[0], tokens[-1]}:
+                self._exact[key].append(idx)
+        if len(tokens) > 1:
+            tokens.append("".join(tokens))
+        token_data = []
+        for t_idx, token in enumerate(tokens):
+            grams = trigrams(token)
+            keys = phonetic_keys(token)
+            token_data.append((token, grams, keys))
+            for g in grams:
+                self._grams[g].append((idx, t_idx))
+            for key in set(keys):
+                if key:
+                    self._phones[key].append((idx, t_idx))
+        self._tokens.append(token_data)
+
+    def _token_scores(self, query_token: str, kind: str = None) -> dict:
+        """Best score per entry for a single query token."""
+        q_grams = trigrams(query_token)
+        q_keys = phonetic_keys(query_token)
+        overlap = defaultdict(int)
+        for g in q_grams:
+            for key in self._grams.get(g, ()):
+                overlap[key] += 1
+        phonetic_hits = set()
+        for key in set(q_keys):
+            if key:
+                phonetic_hits.update(self._phones.get(key, ()))
+
+        # A single shared trigram (usually a word boundary like "  s") is noise
+        # for anything but very short tokens; skip those unless they sound alike.
+        min_common = 1 if len(q_grams) <= 4 else 2
+        candidates = phonetic_hits.union(key for key, common in overlap.items() if common >= min_common)
+
+        scores = {}
+        for key in candidates:
+            idx, t_idx = key
+            if kind and self.entries[idx][0] != kind:
+                continue
+            token, grams, keys = self._tokens[idx][t_idx]
+            if token == query_token:
+                score = 1.0
+            else:
+                dice = 2.0 * overlap.get(key, 0) / (len(q_grams) + len(grams))
+                if key in phonetic_hits:
+                    phon = 1.0
+                elif dice >= 0.3:
+                    phon = max(_edit_similarity(a, b) for a in q_keys for b in keys)
+                else:
+                    phon = 0.0
+                score = GRAM_WEIGHT * dice + PHONETIC_WEIGHT * phon
+            if score > scores.get(idx, 0.0):
+                scores[idx] = score
+        return scores
+
+    def _ranked(self, scores: dict, k: int, min_score: float):
+        ranked = sorted(
+            ((s, idx) for idx, s in scores.items() if s >= min_score),
+            key=lambda x: (-x[0], x[1]),
+        )[:k]
+        return [(round(s, 3),) + self.entries[idx] for s, idx in ranked]
+
+    def search(self, text: str, k: int = 5, kind: str = None, min_score: float = 0.3):
+        """
+        Top-k entries mentioned anywhere in a whole utterance.
+        Returns a list of (score, kind, id, name), best first.
+        """
+        scores = {}
+        for token in tokenize(text):
+            if token in STOPWORDS or token.isdigit():
+                continue
+            for idx, s in self._token_scores(token, kind).items():
+                if s > scores.get(idx, 0.0):
+                    scores[idx] = s
+        return self._ranked(scores, k, min_score)
+
+    def lookup(self, name: str, kind: str = None) -> List[Tuple[str, int, str]]:
+        """Entries whose full, first or last name equals `name` (case-insensitive)."""
+        return [
+            self.entries[idx]
+            for idx in self._exact.get(" ".join(tokenize(name)), ())
+            if not kind or self.entries[idx][0] == kind
+        ]
+
+    def match(self, name: str, k: int = 5, kind: str = None, min_score: float = 0.3):
+        """
+        Top-k entries for a single name. Every query token has to match for a
+        high score, so "Sumeet Singh" prefers Sumeet Singh over Sumeet Rao.
+        Returns a list of (score, kind, id, name), best first.
+        """
+        tokens = tokenize(name)
+        if not tokens:
+            return []
+        totals = defaultdict(float)
+        for token in tokens:
+            for idx, s in self._token_scores(token, kind).items():
+                totals[idx] += s
+        scores = {idx: total / len(tokens) for idx, total in totals.items()}
+        if len(tokens) > 1:
+            for idx, s in self._token_scores("".join(tokens), kind).items():
+                if s > scores.get(idx, 0.0):
+                    scores[idx] = s
+        for entry_idx in self._exact.get(" ".join(tokens), ()):
+            if not kind or self.entries[entry_idx][0] == kind:
+                scores[entry_idx] = 1.0
+        return self._ranked(scores, k, min_score)
+
+    def resolve(self, name: str, kind: str = None, k: int = 3) -> Match:
+        """
+        Best match for `name`, with `clear` set when one candidate wins by a
+        wide enough margin to offer it without asking the model.
+        """
+        candidates = self.match(name, k=k, kind=kind)
+        if not candidates:
+            return Match(None, [], False)
+        top = candidates[0]
+        runner_up = candidates[1][0] if len(candidates) > 1 else 0.0
+        clear = top[0] >= CLEAR_SCORE and top[0] - runner_up >= CLEAR_MARGIN
+        return Match(top, candidates, clear)
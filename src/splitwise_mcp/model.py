@@ -0,0 +1,137 @@
+# Lean in-memory model for cached Splitwise data. SDK objects carry every
+# field the API returns (balances, pictures, registration data...); these keep
+# only what the client uses and are built once, where data comes off the wire.
+# The get*() methods mirror the SDK so existing callers keep working, but
+# internal code reads the attributes directly.
+
+
+class User:
+    """
+    A Splitwise user (the current user, a friend or a group member).
+    `balances` is {currency: amount} with the current user, for friends only.
+    """
+
+    __slots__ = ("id", "first_name", "last_name", "email", "balances")
+
+    def __init__(self, id, first_name=None, last_name=None, email=None, balances=None):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.balances = balances or {}
+
+    @property
+    def name(self) -> str:
+        return f"{self.first_name or ''} {self.last_name or ''}".strip()
+
+    @classmethod
+    def from_sdk(cls, user):
+        if isinstance(user, cls):
+            return user
+        email = user.getEmail() if hasattr(user, "getEmail") else None
+        return cls(user.getId(), user.getFirstName(), user.getLastName(), email)
+
+    def __repr__(self):
+        return f"User({self.id!r}, {self.name!r})"
+
+    def getId(self):
+        return self.id
+
+    def getFirstName(self):
+        return self.first_name
+
+    def getLastName(self):
+        return self.last_name
+
+    def getEmail(self):
+        return self.email
+
+
+def sdk_balances(friend) -> dict:
+    """{currency: amount} of the non-zero balances on an SDK Friend."""
+    balances = {}
+    for b in (friend.getBalances() if hasattr(friend, "getBalances") else None) or []:
+        try:
+            amount = float(b.getAmount())
+        except (TypeError, ValueError):
+            continue
+        if amount:
+            balances[b.getCurrencyCode()] = amount
+    return balances
+
+
+class Group:
+    """A Splitwise group. `members` are shared User instances, not copies."""
+
+    __slots__ = ("id", "name", "members")
+
+    def __init__(self, id, name, members=()):
+        self.id = id
+        self.name = name
+        self.members = tuple(members)
+
+    @classmethod
+    def from_sdk(cls, group, users: dict = None):
+        if isinstance(group, cls):
+            return group
+        users = users if users is not None else {}
+        members = [intern_user(m, users) for m in (group.getMembers() or [])]
+        return cls(group.getId(), group.getName(), members)
+
+    def __repr__(self):
+        return f"Group({self.id!r}, {self.name!r}, {len(self.members)} members)"
+
+    def getId(self):
+        return self.id
+
+    def getName(self):
+        return self.name
+
+    def getMembers(self):
+        return list(self.members)
+
+
+def intern_user(user, users: dict) -> User:
+    """Convert an SDK user, reusing the User already built for the same ID."""
+    existing = users.get(user.getId() if not isinstance(user, User) else user.id)
+    if existing is not None:
+        return existing
+    converted = User.from_sdk(user)
+    users[converted.id] = converted
+    return converted
+
+
+def build_directory(me, friends, groups):
+    """(me, friends, groups) from SDK objects, sharing one User per user ID."""
+    users = {}
+    me = intern_user(me, users) if me is not None else None
+    converted = []
+    for f in friends:
+        user = intern_user(f, users)
+        if not isinstance(f, User):
+            user.balances = sdk_balances(f)
+        converted.append(user)
+    groups = [Group.from_sdk(g, users) for g in groups]
+    return me, converted, groups
+
+
+def directory_to_dict(me, friends, groups) -> dict:
+    """JSON-ready form of a directory; group members are stored by ID."""
+    users = {}
+    for u in ([me] if me is not None else []) + list(friends) + [m for g in groups for m in g.members]:
+        users.setdefault(u.id, [u.id, u.first_name, u.last_name, u.email, u.balances])
+    return {
+        "me": me.id if me is not None else None,
+        "users": list(users.values()),
+        "friends": [f.id for f in friends],
+        "groups": [[g.id, g.name, [m.id for m in g.members]] for g in groups],
+    }
+
+
+def directory_from_dict(data: dict):
+    """Inverse of directory_to_dict: (me, friends, groups)."""
+    users = {row[0]: User(*row) for row in data["users"]}
+    me = users.get(data["me"])
+    friends = [users[i] for i in data["friends"] if i in users]
+    groups = [Group(gid, name, [users[i] for i in member_ids if i in users]) for gid, name, member_ids in data["groups"]]
+    return me, friends, groups
@@ -0,0 +1,231 @@
+import base64
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from splitwise_mcp.profiling import tool_scope
+from splitwise_mcp.resilience import deadline_scope, stats as upstream_stats
+
+
+class PipelineSaturated(Exception):
+    """Raised by submit() when the pipeline is full. Callers should retry later."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Voice pipeline is busy. Retry after {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One command moving through the pipeline. Wait on `future` for the result."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, payload, deadline: float, on_event=None, tool: str = None):
+        self.id = next(self._ids)
+        self.tool = tool
+        self.payload = payload
+        self.deadline = deadline
+        self.on_event = on_event
+        self.future = Future()
+        self.transcript = None
+        self.cancelled = threading.Event()
+        self.submitted_at = time.monotonic()
+
+    def cancel(self):
+        """Stop the job at the next stage boundary."""
+        self.cancelled.set()
+        if not self.future.done():
+            self.future.set_exception(JobCancelled(f"Job {self.id} cancelled"))
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def result(self, timeout: float = None):
+        return self.future.result(timeout=timeout)
+
+
+class Stage:
+    """A fixed number of worker threads draining a bounded queue."""
+
+    def __init__(self, name: str, fn, workers: int, capacity: int, next_stage=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=capacity)
+        self.next_stage = next_stage
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"pipeline-{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, job: Job):
+        self.queue.put_nowait(job)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            if job.future.done() or job.cancelled.is_set():
+                continue
+            if job.remaining() <= 0:
+                job.future.set_exception(DeadlineExceeded(f"Deadline exceeded before {self.name}"))
+                continue
+            with self._lock:
+                self.busy += 1
+            try:
+                with tool_scope(job.tool or f"pipeline-{self.name}"), deadline_scope(job.deadline):
+                    job.payload = self.fn(job)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self.busy -= 1
+            if job.future.done():
+                continue
+            if self.next_stage is None or job.payload is None:
+                job.future.set_result(job.payload)
+                continue
+            try:
+                self.next_stage.put(job)
+            except queue.Full:
+                job.future.set_exception(PipelineSaturated(5.0))
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        self._threads = []
+
+
+class VoicePipeline:
+    """
+    Job-based pipeline for voice and text commands: decode -> transcribe -> agent.
+
+    Each stage has its own worker threads and queue. The total number of
+    admitted jobs is capped by `max_pending`; beyond that submit() raises
+    PipelineSaturated instead of piling up threads and buffers. The agent stage
+    defaults to one worker because the agent keeps per-conversation state.
+    Every job carries a deadline checked at each stage boundary, which also
+    bounds the upstream calls made inside a stage, and can be cancelled.
+    """
+
+    def __init__(
+        self,
+        get_transcriber,
+        get_agent,
+        transcribe_workers: int = None,
+        agent_workers: int = None,
+        max_pending: int = None,
+        timeout: float = None,
+    ):
+        self.get_transcriber = get_transcriber
+        self.get_agent = get_agent
+        self.transcribe_workers = transcribe_workers or int(os.getenv("SPLITWISE_VOICE_WORKERS", "4"))
+        self.agent_workers = agent_workers or int(os.getenv("SPLITWISE_AGENT_WORKERS", "1"))
+        self.max_pending = max_pending or int(os.getenv("SPLITWISE_PIPELINE_MAX_PENDING", "32"))
+        self.timeout = timeout or float(os.getenv("SPLITWISE_COMMAND_TIMEOUT", "60"))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._started = False
+        self._lock = threading.Lock()
+        self._avg_seconds = 5.0
+
+        # Queues are sized above max_pending so cancelled jobs still sitting in
+        # a queue cannot make a hand-off between stages fail.
+        capacity = 2 * self.max_pending
+        self.agent_stage = Stage("agent", self._run_agent, self.agent_workers, capacity)
+        self.transcribe_stage = Stage("transcribe", self._transcribe, self.transcribe_workers, capacity, self.agent_stage)
+        self.decode_stage = Stage("decode", self._decode, 1, capacity, self.transcribe_stage)
+
+    # --- Stages ---
+
+    @staticmethod
+    def _decode(job):
+        return base64.b64decode(job.payload)
+
+    def _transcribe(self, job):
+        transcript = self.get_transcriber().transcribe_bytes(job.payload)
+        if not transcript or not transcript.strip():
+            # Short-circuit: nothing for the agent to do.
+            return None
+        job.transcript = transcript
+        if job.on_event:
+            job.on_event("transcript", transcript)
+        return transcript
+
+    def _run_agent(self, job):
+        agent = self.get_agent()
+        if job.on_event:
+            return agent.process_and_execute_stream(job.payload, job.on_event)
+        return agent.process_and_execute(job.payload)
+
+    # --- Submission ---
+
+    def _ensure_started(self):
+        with self._lock:
+            if not self._started:
+                for stage in (self.decode_stage, self.transcribe_stage, self.agent_stage):
+                    stage.start()
+                self._started = True
+
+    def _admit(self, payload, stage, timeout, on_event, tool=None):
+        if not self._slots.acquire(blocking=False):
+            raise PipelineSaturated(self.retry_after())
+        self._ensure_started()
+        job = Job(payload, time.monotonic() + (timeout or self.timeout), on_event, tool)
+        job.future.add_done_callback(lambda f: self._release(job))
+        try:
+            stage.put(job)
+        except queue.Full:
+            job.future.set_exception(PipelineSaturated(self.retry_after()))
+            raise job.future.exception()
+        return job
+
+    def _release(self, job):
+        elapsed = time.monotonic() - job.submitted_at
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        self._slots.release()
+
+    def submit_audio(self, audio_base64: str, timeout: float = None, on_event=None) -> Job:
+        """Queue a base64 audio command. Raises PipelineSaturated when full."""
+        return self._admit(audio_base64, self.decode_stage, timeout, on_event, "voice_command")
+
+    def submit_text(self, text: str, timeout: float = None, on_event=None) -> Job:
+        """Queue a text command straight into the agent stage."""
+        return self._admit(text, self.agent_stage, timeout, on_event, "text_command")
+
+    def retry_after(self) -> float:
+        """Rough time until a slot frees up, for Retry-After hints."""
+        return max(1.0, self._avg_seconds * self.max_pending / max(1, self.agent_workers + self.transcribe_workers))
+
+    def stats(self) -> dict:
+        return {
+            "max_pending": self.max_pending,
+            "stages": {
+                s.name: {"queued": s.queue.qsize(), "busy": s.busy, "workers": s.workers}
+                for s in (self.decode_stage, self.transcribe_stage, self.agent_stage)
+            },
+            "upstreams": upstream_stats(),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            for stage in (self.decode_stage, self.transcribe_stage, self.agent_stage):
+                stage.stop()
+            self._started = False
@@ -0,0 +1,288 @@
+import asyncio
+import functools
+import hmac
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+
+# Live diagnostics for the HTTP servers: a sampling CPU profiler that returns
+# collapsed stacks (the input format of flamegraph.pl, speedscope and
+# inferno) and tracemalloc snapshots that can be diffed. Work done inside
+# tool_scope() is attributed to that tool: samples are prefixed with the tool
+# name and tracked memory growth is summed per tool.
+#
+# Attribution is by thread. Async tools share the event loop thread, so
+# overlapping async calls can be attributed to whichever entered last.
+
+_thread_tools = {}
+
+
+@contextmanager
+def tool_scope(name: str):
+    """Attribute CPU samples and memory growth on this thread to tool `name`."""
+    ident = threading.get_ident()
+    previous = _thread_tools.get(ident)
+    _thread_tools[ident] = name
+    before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    try:
+        yield
+    finally:
+        if before is not None and tracemalloc.is_tracing():
+            memory.account(name, tracemalloc.get_traced_memory()[0] - before)
+        if previous is None:
+            _thread_tools.pop(ident, None)
+        else:
+            _thread_tools[ident] = previous
+
+
+def profiled(name: str = None):
+    """Decorator running a sync or async function inside tool_scope(name)."""
+
+    def decorate(fn):
+        label = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with tool_scope(label):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with tool_scope(label):
+                    return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack each `interval` seconds from a background
+    thread (sys._current_frames), so the profiled code runs unmodified.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                prefix = [f"thread:{names.get(ident, ident)}"]
+                tool = _thread_tools.get(ident)
+                if tool:
+                    prefix.insert(0, f"tool:{tool}")
+                self.samples[";".join(prefix + stack)] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """'frame;frame;frame count' lines, most frequent first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class MemoryTracker:
+    """tracemalloc snapshots by name, diffs between them and per-tool growth."""
+
+    def __init__(self):
+        self.snapshots = {}
+        self.by_tool = Counter()
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 25):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.snapshots.clear()
+        self.by_tool.clear()
+        self.calls.clear()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.snapshots.clear()
+
+    def account(self, tool: str, delta: int):
+        with self._lock:
+            self.by_tool[tool] += delta
+            self.calls[tool] += 1
+
+    def snapshot(self, name: str) -> dict:
+        if not tracemalloc.is_tracing():
+            raise ValueError("Allocation tracking is not started.")
+        snap = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        self.snapshots[name] = snap
+        current, peak = tracemalloc.get_traced_memory()
+        return {"name": name, "traced_bytes": current, "peak_bytes": peak}
+
+    def diff(self, first: str, second: str, limit: int = 20, group_by: str = "lineno") -> dict:
+        try:
+            old, new = self.snapshots[first], self.snapshots[second]
+        except KeyError as e:
+            raise ValueError(f"Unknown snapshot: {e.args[0]}")
+        stats = new.compare_to(old, group_by)
+        return {
+            "from": first,
+            "to": second,
+            "size_diff_bytes": sum(s.size_diff for s in stats),
+            "top": [
+                {
+                    "where": [f"{f.filename}:{f.lineno}" for f in s.traceback][-5:],
+                    "size_diff_bytes": s.size_diff,
+                    "count_diff": s.count_diff,
+                    "size_bytes": s.size,
+                }
+                for s in stats[:limit]
+            ],
+            "by_tool": self.tools(),
+        }
+
+    def tools(self) -> dict:
+        with self._lock:
+            return {
+                tool: {"calls": self.calls[tool], "net_bytes": net}
+                for tool, net in self.by_tool.most_common()
+            }
+
+
+memory = MemoryTracker()
+
+
+class ProfilingMiddleware:
+    """
+    Admin-only ASGI endpoints under `prefix` (default /admin), enabled when
+    SPLITWISE_ADMIN_TOKEN is set and authenticated with
+    `Authorization: Bearer <token>`:
+
+        POST /admin/profile?seconds=10&interval_ms=5   collapsed CPU stacks (text)
+        POST /admin/memory/start?frames=25             start tracemalloc
+        POST /admin/memory/snapshot?name=before        take a named snapshot
+        GET  /admin/memory/diff?from=before&to=after   top growth + per-tool totals
+        POST /admin/memory/stop                        stop tracemalloc
+    """
+
+    MAX_SECONDS = 120
+    MIN_INTERVAL_MS = 1.0
+    METHODS = {"/profile": "POST", "/memory/start": "POST", "/memory/snapshot": "POST",
+               "/memory/diff": "GET", "/memory/stop": "POST"}
+
+    def __init__(self, app, token: str = None, prefix: str = "/admin"):
+        self.app = app
+        self.token = token if token is not None else os.getenv("SPLITWISE_ADMIN_TOKEN")
+        self.prefix = prefix
+        self._profiling = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if not self.token or not path.startswith(self.prefix + "/"):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        # As bytes: compare_digest rejects str with non-ASCII characters
+        supplied = headers.get(b"authorization", b"")
+        if not hmac.compare_digest(supplied, f"Bearer {self.token}".encode()):
+            return await _respond(send, 401, {"detail": "Invalid admin token."})
+
+        query = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        action = path[len(self.prefix):]
+        method = self.METHODS.get(action)
+        if method is None:
+            return await _respond(send, 404, {"detail": "Not found"})
+        if scope.get("method", "GET") != method:
+            return await _respond(send, 405, {"detail": f"Use {method}."})
+        try:
+            if action == "/profile":
+                return await self._profile(send, query)
+            if action == "/memory/start":
+                memory.start(int(query.get("frames", 25)))
+                return await _respond(send, 200, {"status": "tracking"})
+            if action == "/memory/snapshot":
+                snap = await asyncio.to_thread(memory.snapshot, query.get("name") or f"s{len(memory.snapshots) + 1}")
+                return await _respond(send, 200, snap)
+            if action == "/memory/diff":
+                diff = await asyncio.to_thread(
+                    memory.diff, query["from"], query["to"], int(query.get("limit", 20)),
+                    query.get("group_by", "lineno"),
+                )
+                return await _respond(send, 200, diff)
+            if action == "/memory/stop":
+                memory.stop()
+                return await _respond(send, 200, {"status": "stopped"})
+        except (KeyError, ValueError) as e:
+            return await _respond(send, 400, {"detail": f"Bad request: {e}"})
+
+    async def _profile(self, send, query):
+        seconds = min(max(float(query.get("seconds", 10)), 0.0), self.MAX_SECONDS)
+        # A zero interval would busy-loop the sampler and hold the GIL
+        interval = max(float(query.get("interval_ms", 5)), self.MIN_INTERVAL_MS) / 1000
+        if self._profiling.locked():
+            return await _respond(send, 409, {"detail": "A profile is already running."})
+        async with self._profiling:
+            profiler = SamplingProfiler(interval).start()
+            started = time.monotonic()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+        body = profiler.collapsed().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(profiler.sample_count).encode()),
+                (b"x-profile-seconds", f"{time.monotonic() - started:.2f}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def _respond(send, status: int, body: dict):
+    payload = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+    })
+    await send({"type": "http.response.body", "body": payload})
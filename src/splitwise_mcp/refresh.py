@@ -0,0 +1,198 @@
+import hmac
+import itertools
+import os
+import threading
+import time
+from collections import namedtuple
+
+# One change to apply locally: resource is "expense", "group" or "friend";
+# action is "upsert" or "delete".
+Change = namedtuple("Change", "resource action id")
+
+# Splitwise notification types (GET /get_notifications) -> local change.
+NOTIFICATION_CHANGES = {
+    0: ("expense", "upsert"),   # expense_added
+    1: ("expense", "upsert"),   # expense_updated
+    2: ("expense", "delete"),   # expense_deleted
+    3: ("expense", "upsert"),   # comment_added
+    4: ("group", "upsert"),     # added_to_group
+    5: ("group", "delete"),     # removed_from_group
+    6: ("group", "delete"),     # group_deleted
+    7: ("group", "upsert"),     # group_settings_changed
+    8: ("friend", "upsert"),    # added_as_friend
+    9: ("friend", "delete"),    # removed_as_friend
+    12: ("group", "upsert"),    # group_undeleted
+    13: ("expense", "upsert"),  # expense_undeleted
+}
+
+RESOURCES = ("expense", "group", "friend")
+ACTIONS = ("upsert", "delete")
+
+# Notification source types -> resource. Friends show up as "User" sources.
+SOURCE_TYPES = {"expense": "expense", "group": "group", "user": "friend", "friend": "friend"}
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+def _change(notification_type, source_type, source_id):
+    mapped = NOTIFICATION_CHANGES.get(notification_type)
+    if not mapped or source_id is None:
+        return None
+    resource, action = mapped
+    source = SOURCE_TYPES.get((source_type or "").lower(), resource)
+    if source != resource:
+        # The notification is about something else (e.g. an expense in a
+        # group); re-fetch whatever its source is.
+        resource, action = source, "upsert"
+    return Change(resource, action, _to_int(source_id))
+
+def change_from_notification(notification):
+    """Map a Splitwise SDK notification to a Change, or None if irrelevant."""
+    source = notification.getSource()
+    if source is None:
+        return None
+    return _change(notification.getType(), source.getType(), source.getId())
+
+def parse_webhook(payload: dict):
+    """
+    Changes from a webhook body. Accepts either explicit changes
+    ({"changes": [{"resource": "expense", "action": "delete", "id": 1}]}) or
+    Splitwise-shaped notifications ({"notifications": [{"type": 2,
+    "source": {"type": "Expense", "id": 1}}]}). Raises ValueError on bad input.
+    """
+    changes = []
+    for item in payload.get("changes") or []:
+        resource, action = item.get("resource"), item.get("action", "upsert")
+        if resource not in RESOURCES or action not in ACTIONS or item.get("id") is None:
+            raise ValueError(f"Invalid change: {item}")
+        changes.append(Change(resource, action, _to_int(item["id"])))
+    for item in payload.get("notifications") or []:
+        source = item.get("source") or {}
+        change = _change(item.get("type"), source.get("type"), source.get("id"))
+        if change:
+            changes.append(change)
+    return changes
+
+def verify_secret(provided: str, expected: str = None) -> bool:
+    """Constant-time check of the webhook shared secret (SPLITWISE_WEBHOOK_SECRET)."""
+    expected = expected if expected is not None else os.getenv("SPLITWISE_WEBHOOK_SECRET")
+    if not expected:
+        return False
+    # As bytes: compare_digest rejects str with non-ASCII characters
+    return hmac.compare_digest((provided or "").encode(), expected.encode())
+
+
+class BackgroundRefresher:
+    """
+    Polls Splitwise notifications ("what changed since X") and applies only the
+    affected entries to the client's caches.
+
+    The interval adapts: it drops to `min_interval` after a local write or
+    when changes arrive, then doubles on every quiet poll up to
+    `max_interval`. Webhook deliveries can skip the wait via `poke()`.
+    """
+
+    def __init__(self, client, min_interval: float = None, max_interval: float = None):
+        self.client = client
+        self.min_interval = min_interval or float(os.getenv("SPLITWISE_REFRESH_MIN_INTERVAL", "5"))
+        self.max_interval = max_interval or float(os.getenv("SPLITWISE_REFRESH_MAX_INTERVAL", "300"))
+        self.interval = self.max_interval
+        self.polls = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def note_write(self):
+        """A local write happened: poll fast for a while to pick up fallout."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def poke(self):
+        """Poll now (e.g. a webhook said something changed)."""
+        self._wake.set()
+
+    def poll_once(self) -> int:
+        """One cheap changed-since check. Returns the number of changes applied."""
+        self.polls += 1
+        applied = self.client.poll_changes()
+        if applied:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+        return applied
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.poll_once()
+            except Exception:
+                # Transient API errors: back off as if nothing changed.
+                self.interval = min(self.max_interval, self.interval * 2)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="splitwise-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class WebhookSimulator:
+    """
+    Local stand-in for a change-notification sender, for tests and demos.
+
+    `post` is any callable taking (path, json=..., headers=...) such as a
+    FastAPI TestClient's `post`. Each helper sends one Splitwise-shaped
+    notification to the webhook endpoint and returns the response.
+    """
+
+    PATH = "/webhooks/splitwise"
+
+    def __init__(self, post, secret: str = None):
+        self.post = post
+        self.secret = secret if secret is not None else os.getenv("SPLITWISE_WEBHOOK_SECRET", "")
+        self._ids = itertools.count(1)
+
+    def send(self, notification_type: int, source_type: str, source_id):
+        payload = {"notifications": [{
+            "id": next(self._ids),
+            "type": notification_type,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "source": {"type": source_type, "id": source_id},
+        }]}
+        return self.post(self.PATH, json=payload, headers={"X-Webhook-Secret": self.secret})
+
+    def expense_added(self, expense_id):
+        return self.send(0, "Expense", expense_id)
+
+    def expense_updated(self, expense_id):
+        return self.send(1, "Expense", expense_id)
+
+    def expense_deleted(self, expense_id):
+        return self.send(2, "Expense", expense_id)
+
+    def group_updated(self, group_id):
+        return self.send(7, "Group", group_id)
+
+    def group_deleted(self, group_id):
+        return self.send(6, "Group", group_id)
+
+    def friend_added(self, user_id):
+        return self.send(8, "User", user_id)
+
+    def friend_removed(self, user_id):
+        return self.send(9, "User", user_id)
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import base64
+import gzip
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+from splitwise_mcp.capture import body_digest, patch_http, sanitize_url, unpatch_http, _request_body
+
+# Re-drives a capture (see splitwise_mcp.capture) against the tools in this
+# process. Upstream HTTP calls are answered from the capture instead of the
+# network, optionally after the recorded upstream latency, so production
+# traffic and its latency profile can be reproduced offline. Calls start at
+# their recorded offsets divided by `speed` (0 = as fast as possible), with
+# at most `concurrency` in flight.
+
+
+def load(path: str):
+    """(tool calls, http exchanges) from a capture file, in recorded order."""
+    opener = gzip.open if path.endswith(".gz") else open
+    calls, exchanges = [], []
+    with opener(path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A capture cut off mid-write ends with a partial line.
+                continue
+            if record.get("t") == "tool":
+                calls.append(record)
+            elif record.get("t") == "http":
+                exchanges.append(record)
+    calls.sort(key=lambda r: r["at"])
+    exchanges.sort(key=lambda r: r["at"])
+    return calls, exchanges
+
+
+def _path_key(method: str, url: str):
+    parts = urlsplit(url)
+    return method.upper(), parts.netloc, parts.path
+
+
+class UpstreamStub:
+    """
+    Serves recorded responses. A request takes the next unused exchange with
+    the same method, URL and body hash, else the next with the same method
+    and path; once a path's exchanges are used up the last one is repeated.
+    Unmatched requests get a 502.
+    """
+
+    def __init__(self, exchanges, speed: float = 1.0, latency: bool = True):
+        self.speed = speed
+        self.latency = latency
+        self._exact = defaultdict(deque)
+        self._by_path = defaultdict(deque)
+        self._last = {}
+        for record in exchanges:
+            self._exact[(record["method"], record["url"], record["req"])].append(record)
+            self._by_path[_path_key(record["method"], record["url"])].append(record)
+        self._used = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _next(self, queue):
+        while queue and id(queue[0]) in self._used:
+            queue.popleft()
+        return queue.popleft() if queue else None
+
+    def match(self, method: str, url, body):
+        url = sanitize_url(str(url))
+        path_key = _path_key(method, url)
+        with self._lock:
+            record = self._next(self._exact.get((method.upper(), url, body_digest(body)), deque()))
+            if record is None:
+                record = self._next(self._by_path.get(path_key, deque()))
+            if record is None:
+                record = self._last.get(path_key)
+            if record is None:
+                self.misses += 1
+                return None
+            self._used.add(id(record))
+            self._last[path_key] = record
+            self.hits += 1
+            return record
+
+    def delay(self, record) -> float:
+        if record is None or not self.latency or not self.speed:
+            return 0.0
+        return record.get("ms", 0) / 1000 / self.speed
+
+    def send(self, original, client, request, **kwargs):
+        record = self.match(request.method, request.url, _request_body(request))
+        time.sleep(self.delay(record))
+        return _response(client, request, record)
+
+    async def send_async(self, original, client, request, **kwargs):
+        record = self.match(request.method, request.url, _request_body(request))
+        await asyncio.sleep(self.delay(record))
+        return _response(client, request, record)
+
+    def __enter__(self):
+        patch_http(self.send, self.send_async)
+        return self
+
+    def __exit__(self, *exc):
+        unpatch_http()
+
+
+def _response(client, request, record):
+    if record is None:
+        status, content_type, content = 502, "application/json", b'{"error": "Not in capture"}'
+    else:
+        status, content_type = record["status"], record.get("ct") or ""
+        content = base64.b64decode(record["body"]) if record.get("b64") else record["body"].encode("utf-8")
+    headers = {"content-type": content_type} if content_type else {}
+
+    if type(client).__module__.startswith("httpx"):
+        import httpx
+        return httpx.Response(status, headers=headers, content=content, request=request)
+
+    from requests.models import Response
+    from requests.structures import CaseInsensitiveDict
+    response = Response()
+    response.status_code = status
+    response._content = content
+    response.headers = CaseInsensitiveDict(headers)
+    response.url = request.url
+    response.request = request
+    response.encoding = "utf-8"
+    return response
+
+
+def _restore_args(arguments: dict) -> dict:
+    restored = {}
+    for name, value in arguments.items():
+        if isinstance(value, dict) and "$audio" in value:
+            # Silence of about the recorded size; the transcript comes from the capture.
+            value = base64.b64encode(bytes(value["$audio"] * 3 // 4)).decode("ascii")
+        restored[name] = value
+    return restored
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+def _server_tools():
+    from splitwise_mcp import server
+    return server
+
+
+class Replayer:
+    """
+    Replays the tool calls in `path`. `tools` maps tool names to callables
+    (default: the MCP tools in splitwise_mcp.server).
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, concurrency: int = 8, tools: dict = None,
+                 upstream_latency: bool = True):
+        self.calls, exchanges = load(path)
+        self.speed = speed
+        self.concurrency = max(1, concurrency)
+        self.tools = tools
+        self.upstream = UpstreamStub(exchanges, speed, upstream_latency)
+
+    def _tool(self, name: str):
+        if self.tools is not None:
+            return self.tools.get(name)
+        return getattr(_server_tools(), name, None)
+
+    async def _call(self, call: dict, slots: asyncio.Semaphore, lag: float) -> dict:
+        fn = self._tool(call["name"])
+        started = time.monotonic()
+        ok = False
+        try:
+            if fn is None:
+                raise LookupError(f"Unknown tool: {call['name']}")
+            arguments = _restore_args(call.get("args") or {})
+            if inspect.iscoroutinefunction(fn):
+                result = await fn(**arguments)
+            else:
+                result = await asyncio.to_thread(fn, **arguments)
+            ok = not (isinstance(result, str) and result.startswith("Error"))
+        except Exception:
+            ok = False
+        finally:
+            slots.release()
+        return {
+            "name": call["name"], "ms": (time.monotonic() - started) * 1000, "ok": ok,
+            "recorded_ms": call.get("ms", 0), "recorded_ok": call.get("ok", True), "lag_ms": lag * 1000,
+        }
+
+    async def run(self) -> dict:
+        """Replay every call and return a latency report."""
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        with self.upstream:
+            start = time.monotonic()
+            for call in self.calls:
+                due = start + call["at"] / self.speed if self.speed else start
+                if due > time.monotonic():
+                    await asyncio.sleep(due - time.monotonic())
+                await slots.acquire()
+                tasks.append(asyncio.ensure_future(self._call(call, slots, max(0.0, time.monotonic() - due))))
+            results = await asyncio.gather(*tasks)
+            wall = time.monotonic() - start
+        return self.report(results, wall)
+
+    def report(self, results, wall: float) -> dict:
+        by_tool = defaultdict(list)
+        for r in results:
+            by_tool[r["name"]].append(r)
+        recorded_wall = (self.calls[-1]["at"] + self.calls[-1].get("ms", 0) / 1000) if self.calls else 0.0
+        return {
+            "calls": len(results),
+            "errors": sum(not r["ok"] for r in results),
+            "outcome_changed": sum(r["ok"] != r["recorded_ok"] for r in results),
+            "wall_s": round(wall, 3),
+            "recorded_wall_s": round(recorded_wall, 3),
+            "max_lag_ms": round(max((r["lag_ms"] for r in results), default=0.0), 2),
+            "upstream": {"hits": self.upstream.hits, "misses": self.upstream.misses},
+            "tools": {
+                name: {
+                    "calls": len(rs),
+                    "errors": sum(not r["ok"] for r in rs),
+                    "p50_ms": _percentile([r["ms"] for r in rs], 0.5),
+                    "p95_ms": _percentile([r["ms"] for r in rs], 0.95),
+                    "max_ms": _percentile([r["ms"] for r in rs], 1.0),
+                    "recorded_p50_ms": _percentile([r["recorded_ms"] for r in rs], 0.5),
+                    "recorded_p95_ms": _percentile([r["recorded_ms"] for r in rs], 0.95),
+                }
+                for name, rs in sorted(by_tool.items())
+            },
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a SPLITWISE_CAPTURE log against the MCP tools.")
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale; 10 = ten times faster, 0 = no pacing")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-upstream-latency", action="store_true", help="Answer upstream calls immediately")
+    args = parser.parse_args(argv)
+
+    # Upstreams are served from the capture, so any credentials will do.
+    for name in ("SPLITWISE_API_KEY", "GEMINI_API_KEY", "DEEPGRAM_API_KEY"):
+        os.environ.setdefault(name, "replay")
+    os.environ.pop("SPLITWISE_CAPTURE", None)
+
+    replayer = Replayer(args.capture, args.speed, args.concurrency, upstream_latency=not args.no_upstream_latency)
+    print(json.dumps(asyncio.run(replayer.run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
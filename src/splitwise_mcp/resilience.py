@@ -0,0 +1,328 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+# Deadlines, hedging and circuit breakers for slow upstreams (Deepgram,
+# Gemini).
+#
+# A command's deadline is set for the thread handling it (deadline_scope) and
+# every upstream call made there gets at most the time that is left, capped by
+# the upstream's own timeout. Idempotent upstreams can be hedged: when the
+# first attempt is slower than the recent p95, a duplicate is started and the
+# first answer wins. Repeated failures open the upstream's circuit, and calls
+# then fail fast with a message the user can act on until a trial call
+# succeeds.
+#
+# Python can't interrupt a blocked SDK call, so a call that runs out of time
+# is abandoned: it finishes in the background on the upstream pool and its
+# result is dropped.
+
+_local = threading.local()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SPLITWISE_UPSTREAM_THREADS", "32")),
+                               thread_name_prefix="upstream")
+_DONE = object()
+
+
+@contextmanager
+def deadline_scope(deadline: float):
+    """Bound upstream calls made on this thread by `deadline` (time.monotonic())."""
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def remaining():
+    """Seconds left before this thread's deadline, or None if it has none."""
+    deadline = getattr(_local, "deadline", None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call failed fast. The message is meant for the end user."""
+
+    def __init__(self, upstream: str, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class LatencyWindow:
+    """The last `size` latencies of an upstream, for percentile estimates."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        """The q-th quantile, or None until there are `min_samples` samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures. After `reset_after` seconds
+    one trial call is let through (half-open); its outcome closes the circuit
+    or opens it again.
+    """
+
+    def __init__(self, failures: int = 5, reset_after: float = 30.0, clock=time.monotonic):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._trial or self.clock() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.clock() - self.opened_at < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+    def abandon(self):
+        """A call ended without telling us anything about the upstream; free the trial slot."""
+        with self._lock:
+            self._trial = False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_after - (self.clock() - self.opened_at))
+
+
+class Upstream:
+    """
+    Calls to one upstream service under a deadline, with optional hedging and
+    a circuit breaker. `label` names the service in user-facing messages.
+    """
+
+    def __init__(self, name: str, timeout: float = 30.0, hedge: bool = False, label: str = None,
+                 breaker: CircuitBreaker = None, hedge_after: float = 2.0, min_hedge_delay: float = 0.05):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.label = label or name
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyWindow()
+        self.hedge_after = hedge_after
+        self.min_hedge_delay = min_hedge_delay
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def budget(self) -> float:
+        left = remaining()
+        return self.timeout if left is None else min(self.timeout, left)
+
+    def hedge_delay(self) -> float:
+        """Start a duplicate once the first attempt is slower than the recent p95."""
+        p95 = self.latency.percentile(0.95)
+        return self.hedge_after if p95 is None else max(self.min_hedge_delay, p95)
+
+    def _admit(self) -> float:
+        if not self.breaker.allow():
+            self.rejected += 1
+            retry = self.breaker.retry_after()
+            raise CircuitOpen(
+                self.name, f"{self.label} is unavailable right now. Please try again in {retry:.0f}s.", retry
+            )
+        budget = self.budget()
+        if budget <= 0:
+            raise UpstreamTimeout(self.name, f"{self.label} was not reached before the deadline. Please try again.")
+        self.calls += 1
+        return budget
+
+    def _timed_out(self, budget: float):
+        self.timeouts += 1
+        if budget >= self.timeout:
+            self.latency.add(budget)
+            self.breaker.failure()
+        else:
+            # The caller's deadline ran out first, which says nothing about
+            # the upstream: don't count it against the breaker or the p95
+            self.breaker.abandon()
+        return UpstreamTimeout(self.name, f"{self.label} did not respond within {budget:.0f}s. Please try again.")
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) within the budget. Errors from fn are re-raised as-is."""
+        budget = self._admit()
+        started = time.monotonic()
+        end = started + budget
+        attempts = [_executor.submit(fn, *args, **kwargs)]
+        if self.hedge:
+            done, _ = wait(attempts, timeout=min(self.hedge_delay(), budget))
+            if not done and time.monotonic() < end:
+                self.hedged += 1
+                attempts.append(_executor.submit(fn, *args, **kwargs))
+
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for attempt in done:
+                if attempt.exception() is None:
+                    self.latency.add(time.monotonic() - started)
+                    self.breaker.success()
+                    if attempt is not attempts[0]:
+                        self.hedge_wins += 1
+                    return attempt.result()
+                error = error or attempt.exception()
+        if error is not None and not pending:
+            self.breaker.failure()
+            raise error
+        raise self._timed_out(budget)
+
+    def stream(self, make_iter):
+        """
+        Yield from the iterator returned by make_iter(), with the whole stream
+        bounded by the budget. Streams are not hedged. A consumer that stops
+        early counts as neither a success nor a failure.
+        """
+        budget = self._admit()
+        started = time.monotonic()
+        end = started + budget
+        iterator = None
+        pending = None
+
+        def step():
+            nonlocal iterator
+            if iterator is None:
+                iterator = iter(make_iter())
+            return next(iterator, _DONE)
+
+        def close(_=None):
+            try:
+                getattr(iterator, "close", lambda: None)()
+            except Exception:
+                pass
+
+        try:
+            while True:
+                left = end - time.monotonic()
+                if left <= 0:
+                    raise self._timed_out(budget)
+                pending = _executor.submit(step)
+                try:
+                    chunk = pending.result(timeout=left)
+                except FutureTimeout:
+                    raise self._timed_out(budget)
+                except Exception:
+                    self.breaker.failure()
+                    raise
+                if chunk is _DONE:
+                    break
+                yield chunk
+            self.latency.add(time.monotonic() - started)
+            self.breaker.success()
+        except GeneratorExit:
+            self.breaker.abandon()
+            raise
+        finally:
+            # An abandoned read may still be running; close once it returns.
+            if pending is not None:
+                pending.add_done_callback(close)
+            else:
+                close()
+
+    def stats(self) -> dict:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+        }
+
+
+# name -> (default timeout in seconds, hedged by default, label). Only
+# idempotent calls may be hedged: a Gemini chat turn appends to the
+# conversation, so it is never sent twice.
+UPSTREAMS = {
+    "deepgram": (15.0, True, "Speech recognition"),
+    "gemini": (30.0, False, "The assistant"),
+}
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str) -> Upstream:
+    """
+    Process-wide Upstream for `name`. SPLITWISE_<NAME>_TIMEOUT and
+    SPLITWISE_<NAME>_HEDGE override the defaults; SPLITWISE_BREAKER_FAILURES
+    and SPLITWISE_BREAKER_RESET tune the breakers.
+    """
+    with _upstreams_lock:
+        if name not in _upstreams:
+            timeout, hedge, label = UPSTREAMS.get(name, (30.0, False, name))
+            prefix = f"SPLITWISE_{name.upper()}_"
+            _upstreams[name] = Upstream(
+                name,
+                timeout=float(os.getenv(prefix + "TIMEOUT", str(timeout))),
+                hedge=os.getenv(prefix + "HEDGE", "1" if hedge else "0").lower() in ("1", "true", "yes"),
+                label=label,
+                breaker=CircuitBreaker(
+                    int(os.getenv("SPLITWISE_BREAKER_FAILURES", "5")),
+                    float(os.getenv("SPLITWISE_BREAKER_RESET", "30")),
+                ),
+            )
+        return _upstreams[name]
+
+
+def stats() -> dict:
+    with _upstreams_lock:
+        return {name: upstream.stats() for name, upstream in _upstreams.items()}
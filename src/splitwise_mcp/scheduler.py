@@ -0,0 +1,412 @@
+import calendar
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recurring (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    description TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    every TEXT NOT NULL,
+    next_run TEXT NOT NULL,
+    group_name TEXT,
+    friend_names TEXT NOT NULL DEFAULT '[]',
+    split_map TEXT,
+    payer_name TEXT,
+    exclude_names TEXT,
+    anchor_day INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    last_run TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_recurring_due ON recurring(active, next_run);
+
+CREATE TABLE IF NOT EXISTS settlements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payer_name TEXT NOT NULL,
+    recipient_name TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    group_name TEXT,
+    run_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    expense_id INTEGER,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_settlements_due ON settlements(status, run_at);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+INTERVALS = ("daily", "weekly", "monthly")
+
+# Held in the schedule DB for the length of a pass, so processes sharing the
+# DB (supervisor workers, replicas, an old worker still draining) never run
+# overlapping passes.
+LEASE = "scheduler"
+
+# Stop retrying a settlement, or one occurrence of a recurring expense,
+# after this many failed attempts.
+MAX_ATTEMPTS = 3
+
+def _tag(kind: str, item_id, date: str = None) -> str:
+    """Notes on a scheduled write, so a retry can tell whether it already went through."""
+    return f"Scheduled by splitwise-mcp [{kind} #{item_id}" + (f" on {date[:10]}]" if date else "]")
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+def _parse(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date: {value}. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS.")
+
+def advance(dt: datetime, every: str, anchor_day: int = None) -> datetime:
+    """
+    The next occurrence after `dt`. Monthly runs fall on `anchor_day` (the
+    start date's day, default dt.day), clamped to month end, so Jan 31 goes
+    to Feb 29 and back to Mar 31.
+    """
+    if every == "daily":
+        return dt + timedelta(days=1)
+    if every == "weekly":
+        return dt + timedelta(weeks=1)
+    year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    day = min(anchor_day or dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+def parse_window(spec: str):
+    """'01:00-05:00' -> ((1, 0), (5, 0)); None/empty means any time."""
+    if not spec:
+        return None
+    try:
+        start, end = spec.split("-")
+        return tuple(tuple(int(x) for x in part.strip().split(":")) for part in (start, end))
+    except ValueError:
+        raise ValueError(f"Invalid window: {spec}. Use HH:MM-HH:MM.")
+
+def in_window(window, now: datetime) -> bool:
+    if window is None:
+        return True
+    start, end = window
+    current = (now.hour, now.minute)
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end  # wraps midnight
+
+
+class _LeaseLost(Exception):
+    """The pass outlived its lease and another process took it over."""
+
+
+class ScheduleStore:
+    """SQLite-backed recurring expense templates and pending settlements."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(recurring)")}
+            if "anchor_day" not in columns:
+                # Schedules written before monthly runs kept their start day
+                self._conn.execute("ALTER TABLE recurring ADD COLUMN anchor_day INTEGER")
+            if "attempts" not in columns:
+                self._conn.execute("ALTER TABLE recurring ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def add_recurring(self, description, amount, every, next_run, group_name=None, friend_names=None,
+                      split_map=None, payer_name=None, exclude_names=None) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO recurring (description, amount, every, next_run, group_name, friend_names, "
+                "split_map, payer_name, exclude_names, anchor_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    description, str(amount), every, next_run, group_name, json.dumps(friend_names or []),
+                    json.dumps(split_map) if split_map else None, payer_name,
+                    json.dumps(exclude_names) if exclude_names else None, _parse(next_run).day,
+                ),
+            )
+            return cur.lastrowid
+
+    def add_settlement(self, payer_name, recipient_name, amount, run_at, group_name=None) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO settlements (payer_name, recipient_name, amount, group_name, run_at) VALUES (?, ?, ?, ?, ?)",
+                (payer_name, recipient_name, str(amount), group_name, run_at),
+            )
+            return cur.lastrowid
+
+    def due_recurring(self, now: str, limit: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM recurring WHERE active = 1 AND next_run <= ? ORDER BY next_run, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [self._recurring(r) for r in rows]
+
+    def due_settlements(self, now: str, limit: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM settlements WHERE status = 'pending' AND run_at <= ? ORDER BY run_at, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def _recurring(row) -> dict:
+        item = dict(row)
+        item["friend_names"] = json.loads(item["friend_names"] or "[]")
+        item["split_map"] = json.loads(item["split_map"]) if item["split_map"] else None
+        item["exclude_names"] = json.loads(item["exclude_names"]) if item["exclude_names"] else None
+        return item
+
+    def update_recurring(self, item_id, **fields):
+        self._update("recurring", item_id, fields)
+
+    def update_settlement(self, item_id, **fields):
+        self._update("settlements", item_id, fields)
+
+    def _update(self, table, item_id, fields):
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*fields.values(), item_id))
+
+    def cancel(self, kind: str, item_id) -> bool:
+        with self._lock, self._conn:
+            if kind == "recurring":
+                cur = self._conn.execute("UPDATE recurring SET active = 0 WHERE id = ? AND active = 1", (item_id,))
+            else:
+                cur = self._conn.execute(
+                    "UPDATE settlements SET status = 'cancelled' WHERE id = ? AND status = 'pending'", (item_id,)
+                )
+            return cur.rowcount > 0
+
+    def acquire_lease(self, name: str, owner: str, ttl: float, now: float = None) -> bool:
+        """Take or renew lease `name` for `ttl` seconds. False while another owner holds it."""
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, 0)", (name, owner))
+            cur = self._conn.execute(
+                "UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (owner = ? OR expires_at <= ?)",
+                (owner, now + ttl, name, owner, now),
+            )
+            return cur.rowcount > 0
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def list(self):
+        """(active recurring templates, pending settlements)."""
+        with self._lock:
+            recurring = self._conn.execute("SELECT * FROM recurring WHERE active = 1 ORDER BY next_run, id").fetchall()
+            settlements = self._conn.execute(
+                "SELECT * FROM settlements WHERE status = 'pending' ORDER BY run_at, id"
+            ).fetchall()
+        return [self._recurring(r) for r in recurring], [dict(r) for r in settlements]
+
+
+class Scheduler:
+    """
+    Runs recurring expenses and queued settle-ups in batches.
+
+    A background worker wakes every `poll_interval` seconds and, inside the
+    optional off-peak `window` ("01:00-05:00", local time), drains up to
+    `batch_size` due items per pass, spacing Splitwise writes to at most
+    `rate_per_minute`. Next-run times live in the store, so occurrences missed
+    while the process was down are caught up (each dated on its own day) on
+    the next pass, up to `max_catch_up` per template.
+
+    Each pass holds the LEASE row in the schedule DB (renewed before every
+    write, expiring after `lease_ttl` seconds if the holder dies); a pass
+    that can't get it is deferred and returns with "deferred" set.
+
+    A failed write is retried on later passes, up to MAX_ATTEMPTS; a
+    recurring occurrence then is skipped, a settlement marked failed. Writes
+    are tagged in their notes, and a retry first looks the tag up, since an
+    error (a timeout, say) doesn't mean Splitwise didn't create the expense.
+    """
+
+    def __init__(self, client, store: ScheduleStore = None, batch_size: int = None, rate_per_minute: float = None,
+                 window: str = None, poll_interval: float = None, max_catch_up: int = None,
+                 lease_ttl: float = None):
+        self.client = client
+        self.store = store or ScheduleStore(os.getenv("SPLITWISE_SCHEDULE_DB", ":memory:"))
+        self.batch_size = batch_size or int(os.getenv("SPLITWISE_SCHEDULER_BATCH", "100"))
+        self.rate_per_minute = rate_per_minute or float(os.getenv("SPLITWISE_SCHEDULER_RATE", "30"))
+        self.window = parse_window(window if window is not None else os.getenv("SPLITWISE_SCHEDULER_WINDOW"))
+        self.poll_interval = poll_interval or float(os.getenv("SPLITWISE_SCHEDULER_POLL", "60"))
+        self.max_catch_up = max_catch_up or int(os.getenv("SPLITWISE_SCHEDULER_MAX_CATCH_UP", "12"))
+        self.lease_ttl = lease_ttl or float(os.getenv("SPLITWISE_SCHEDULER_LEASE", "120"))
+        self.owner = uuid.uuid4().hex
+        self._last_write = 0.0
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._sleep = time.sleep
+
+    # --- Scheduling ---
+
+    def add_recurring(self, description: str, amount: str, every: str = "monthly", start: str = None,
+                      group_name: str = None, friend_names=None, split_map: dict = None,
+                      payer_name: str = None, exclude_names=None) -> int:
+        if every not in INTERVALS:
+            raise ValueError(f"Invalid interval '{every}'. Choose one of: {', '.join(INTERVALS)}")
+        float(amount)  # validate early rather than at 3am
+        if not group_name and not friend_names:
+            raise ValueError("A recurring expense needs a group_name or friend_names.")
+        next_run = _fmt(_parse(start)) if start else _fmt(datetime.now())
+        return self.store.add_recurring(description, amount, every, next_run, group_name, friend_names,
+                                        split_map, payer_name, exclude_names)
+
+    def add_settlement(self, payer_name: str, recipient_name: str, amount: str, group_name: str = None,
+                       run_at: str = None) -> int:
+        float(amount)
+        run_at = _fmt(_parse(run_at)) if run_at else _fmt(datetime.now())
+        return self.store.add_settlement(payer_name, recipient_name, amount, run_at, group_name)
+
+    # --- Execution ---
+
+    def _throttle(self):
+        gap = 60.0 / self.rate_per_minute
+        wait = self._last_write + gap - time.monotonic()
+        if wait > 0:
+            self._sleep(wait)
+        self._last_write = time.monotonic()
+        if not self.store.acquire_lease(LEASE, self.owner, self.lease_ttl):
+            raise _LeaseLost()
+
+    def run_due(self, now: datetime = None) -> dict:
+        """
+        One batched pass over everything due at `now`. Returns counts of
+        created expenses, payments and failures.
+        """
+        now = now or datetime.now()
+        stamp = _fmt(now)
+        summary = {"expenses": 0, "payments": 0, "failed": 0}
+        with self._run_lock:
+            if not self.store.acquire_lease(LEASE, self.owner, self.lease_ttl):
+                summary["deferred"] = True  # another process is mid-pass
+                return summary
+            try:
+                budget = self.batch_size
+                for item in self.store.due_recurring(stamp, budget):
+                    budget -= self._run_recurring(item, now, budget, summary)
+                    if budget <= 0:
+                        return summary
+                for item in self.store.due_settlements(stamp, budget):
+                    self._run_settlement(item, summary)
+            except _LeaseLost:
+                summary["deferred"] = True
+            finally:
+                self.store.release_lease(LEASE, self.owner)
+        return summary
+
+    def _run_recurring(self, item, now: datetime, budget: int, summary: dict) -> int:
+        """Create every missed occurrence of one template (bounded). Returns writes used."""
+        next_run = _parse(item["next_run"])
+        attempts = item["attempts"]
+        used = 0
+        while next_run <= now and used < min(budget, self.max_catch_up):
+            self._throttle()
+            used += 1
+            date = _fmt(next_run)
+            tag = _tag("recurring", item["id"], date)
+            try:
+                existing = None
+                if attempts:
+                    existing = self.client.find_tagged_expense(
+                        tag, _fmt(next_run - timedelta(days=1)), _fmt(next_run + timedelta(days=1))
+                    )
+                if existing is None:
+                    self.client.add_expense(
+                        item["amount"], item["description"], item["friend_names"],
+                        split_map=item["split_map"], group_name=item["group_name"],
+                        payer_name=item["payer_name"], exclude_names=item["exclude_names"],
+                        date=date, details=tag,
+                    )
+            except Exception as e:
+                summary["failed"] += 1
+                attempts += 1
+                if attempts < MAX_ATTEMPTS:
+                    # Leave next_run where it is so the occurrence is retried next pass.
+                    self.store.update_recurring(item["id"], attempts=attempts, last_error=str(e))
+                else:
+                    # Give up on this occurrence; the following ones still run.
+                    self.store.update_recurring(
+                        item["id"], next_run=_fmt(advance(next_run, item["every"], item["anchor_day"])),
+                        attempts=0, last_error=f"Skipped {date[:10]} after {attempts} attempts: {e}",
+                    )
+                return used
+            summary["expenses"] += 1
+            attempts = 0
+            next_run = advance(next_run, item["every"], item["anchor_day"])
+            self.store.update_recurring(item["id"], next_run=_fmt(next_run), last_run=_fmt(now), attempts=0,
+                                        last_error=None)
+        if next_run <= now and used >= self.max_catch_up:
+            # Too far behind: skip ahead instead of flooding the account.
+            while next_run <= now:
+                next_run = advance(next_run, item["every"], item["anchor_day"])
+            self.store.update_recurring(item["id"], next_run=_fmt(next_run))
+        return used
+
+    def _run_settlement(self, item, summary: dict):
+        self._throttle()
+        tag = _tag("settlement", item["id"])
+        try:
+            expense = None
+            if item["attempts"]:
+                since = _parse(item["run_at"]) - timedelta(days=1)
+                expense = self.client.find_tagged_expense(tag, _fmt(since))
+            if expense is None:
+                expense = self.client.record_payment(
+                    item["payer_name"], item["recipient_name"], item["amount"], group_name=item["group_name"],
+                    details=tag,
+                )
+        except Exception as e:
+            attempts = item["attempts"] + 1
+            status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+            self.store.update_settlement(item["id"], attempts=attempts, status=status, last_error=str(e))
+            summary["failed"] += 1
+            return
+        self.store.update_settlement(item["id"], status="done", attempts=item["attempts"] + 1,
+                                     expense_id=expense.getId(), last_error=None)
+        summary["payments"] += 1
+
+    # --- Worker ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = datetime.now()
+            if in_window(self.window, now) and self.client.client:
+                try:
+                    self.run_due(now)
+                except Exception:
+                    pass  # store/API hiccup; try again next poll
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="splitwise-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
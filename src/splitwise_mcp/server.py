@@ -1,40 +1,162 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from splitwise_mcp.admission import admitted
 from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.expense_index import format_rows
+from splitwise_mcp.capture import recorded, start_from_env
+from splitwise_mcp.profiling import profiled
+from splitwise_mcp.resilience import UpstreamUnavailable
+from splitwise_mcp.state import SessionStore, get_backend
+import asyncio
+import json
 import logging
-import base64
+import os
+import threading
+
+logger = logging.getLogger(__name__)
 
 # Initialize FastMCP
 mcp = FastMCP("splitwise")
 
-# Global client (for direct Splitwise tools)
-client = SplitwiseClient()
+# Lazy-initialized client (for direct Splitwise tools). Nothing heavy runs at
+# import time so stdio hosts get a fast handshake.
+client = None
 
 # Lazy-initialized agent (for voice/text command tools)
 _agent = None
 _transcriber = None
+_pipeline = None
+_scheduler = None
+# Getters can race with the warm-up threads; one lock per component so they still warm in parallel
+_init_locks = {name: threading.RLock() for name in ("client", "agent", "transcriber", "pipeline", "scheduler")}
+
+# Credentials shared with other replicas (SPLITWISE_STATE_URL); in-process otherwise
+_sessions = SessionStore(get_backend())
+
+# Traffic capture for offline replay (SPLITWISE_CAPTURE=path; off by default)
+start_from_env()
+
+def _get_client():
+    """Lazy-initialize the Splitwise client."""
+    global client
+    created = False
+    if client is None:
+        with _init_locks["client"]:
+            if client is None:
+                fresh = SplitwiseClient()
+                if os.getenv("SPLITWISE_BACKGROUND_REFRESH", "0").lower() in ("1", "true", "yes"):
+                    fresh.start_refresher()
+                client = fresh
+                created = True
+    if created and os.getenv("SPLITWISE_SCHEDULE_DB") and os.getenv("SPLITWISE_WORKER_ID", "0") == "0":
+        # Persisted schedules: start the worker so missed runs catch up. The
+        # lease in the schedule DB keeps processes sharing it from running
+        # overlapping passes; this check only spares the other supervisor
+        # workers an idle thread.
+        try:
+            _get_scheduler()
+        except Exception:
+            # The schedule tools report it; the other tools still work
+            logger.exception("Could not start the scheduler")
+    if _sessions.backend.shared:
+        # Pick up credentials configured on another replica
+        _sessions.sync(client)
+    return client
+
+def _remember_credentials(**credentials):
+    _sessions.save(_sessions.DEFAULT, {k: v for k, v in credentials.items() if v}, client=client)
+
+def _get_scheduler():
+    """Lazy-initialize the recurring expense / settle-up scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        # Outside the scheduler lock: creating the client may start the
+        # scheduler itself, and the two locks must never nest.
+        splitwise = _get_client()
+        with _init_locks["scheduler"]:
+            if _scheduler is None:
+                from splitwise_mcp.scheduler import Scheduler
+                _scheduler = Scheduler(splitwise).start()
+    return _scheduler
 
 def _get_agent():
-    """Lazy-initialize the Gemini agent."""
+    """Lazy-initialize the intent agent (Gemini unless SPLITWISE_LLM_BACKEND says otherwise)."""
     global _agent
-    if _agent is None:
-        from splitwise_mcp.agent.client import GeminiSplitwiseAgent
-        _agent = GeminiSplitwiseAgent()
+    with _init_locks["agent"]:
+        if _agent is None:
+            from splitwise_mcp.agent.backends import create_agent
+            _agent = create_agent()
     return _agent
 
 def _get_transcriber():
-    """Lazy-initialize the Deepgram transcriber."""
+    """Lazy-initialize the transcriber (Deepgram unless SPLITWISE_STT_BACKEND says otherwise)."""
     global _transcriber
-    if _transcriber is None:
-        from splitwise_mcp.agent.audio import AudioTranscriber
-        _transcriber = AudioTranscriber()
+    with _init_locks["transcriber"]:
+        if _transcriber is None:
+            from splitwise_mcp.agent.backends import create_transcriber
+            _transcriber = create_transcriber()
     return _transcriber
 
+def _streaming_enabled() -> bool:
+    return os.getenv("SPLITWISE_STREAMING", "1").lower() not in ("0", "false", "no")
+
+def _get_pipeline():
+    """Lazy-initialize the bounded voice/text command pipeline."""
+    global _pipeline
+    with _init_locks["pipeline"]:
+        if _pipeline is None:
+            from splitwise_mcp.pipeline import VoicePipeline
+            _pipeline = VoicePipeline(_get_transcriber, _get_agent)
+    return _pipeline
+
+def warm_steps() -> dict:
+    """Warm-up steps for the lazily created components (see warmup.py)."""
+    return {
+        "splitwise": lambda: _get_client().warm(),
+        "agent": lambda: _get_agent().warm(),
+        "transcriber": lambda: _get_transcriber().warm(),
+        "pipeline": _get_pipeline,
+    }
+
+async def _await_job(submit, payload, ctx: Context = None):
+    """
+    Submit a command to the pipeline and wait for it without holding a worker
+    thread. In streaming mode, the transcript, partial text and detected tool
+    calls are forwarded to the client as progress notifications. If the caller
+    goes away or the deadline passes, the job is cancelled.
+    """
+    on_event = None
+    if ctx is not None and _streaming_enabled():
+        loop = asyncio.get_running_loop()
+        step = 0
+
+        def on_event(kind, payload):
+            nonlocal step
+            step += 1
+            if kind == "transcript":
+                message = f"Transcribed: \"{payload}\""
+            elif kind == "text":
+                message = payload
+            else:
+                message = f"Running {payload}..."
+            asyncio.run_coroutine_threadsafe(ctx.report_progress(step, None, message), loop)
+
+    job = submit(payload, on_event=on_event)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(job.future), timeout=max(0.0, job.remaining()))
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        job.cancel()
+        raise
+    return job, result
+
 # =============================================================================
 # Voice Agent Tools (Full Pipeline)
 # =============================================================================
 
 @mcp.tool()
-def voice_command(audio_base64: str) -> str:
+@recorded()
+@admitted()
+@profiled()
+async def voice_command(audio_base64: str, ctx: Context = None) -> str:
     """
     Process a voice command for Splitwise.
     
@@ -48,27 +170,23 @@ def voice_command(audio_base64: str) -> str:
         The result of the voice command (e.g., confirmation, clarification request, or error).
     """
     try:
-        # Decode audio
-        audio_bytes = base64.b64decode(audio_base64)
-        
-        # Transcribe with Deepgram
-        transcriber = _get_transcriber()
-        transcript = transcriber.transcribe_bytes(audio_bytes)
-        
-        if not transcript or not transcript.strip():
+        job, result = await _await_job(_get_pipeline().submit_audio, audio_base64, ctx)
+        if job.transcript is None:
             return "Could not transcribe audio. Please try again with clearer audio."
-        
-        # Process with Gemini agent
-        agent = _get_agent()
-        result = agent.process_and_execute(transcript)
-        
-        return f"Transcribed: \"{transcript}\"\n\nResult: {result}"
-        
+        return f"Transcribed: \"{job.transcript}\"\n\nResult: {result}"
+    except asyncio.TimeoutError:
+        return "Voice command error: timed out. Please try again."
+    except UpstreamUnavailable as e:
+        # Slow or failing upstream: a reply the user can act on, not a stack trace
+        return str(e)
     except Exception as e:
         return f"Voice command error: {e}"
 
 @mcp.tool()
-def text_command(text: str) -> str:
+@recorded()
+@admitted()
+@profiled()
+async def text_command(text: str, ctx: Context = None) -> str:
     """
     Process a text command for Splitwise.
     
@@ -82,9 +200,12 @@ def text_command(text: str) -> str:
         The result of the command (e.g., confirmation, clarification request, or error).
     """
     try:
-        agent = _get_agent()
-        result = agent.process_and_execute(text)
+        _, result = await _await_job(_get_pipeline().submit_text, text, ctx)
         return result
+    except asyncio.TimeoutError:
+        return "Text command error: timed out. Please try again."
+    except UpstreamUnavailable as e:
+        return str(e)
     except Exception as e:
         return f"Text command error: {e}"
 
@@ -98,12 +219,13 @@ def configure_splitwise(consumer_key: str = None, consumer_secret: str = None, a
     Configure the Splitwise client with API credentials.
     You must provide either (consumer_key AND consumer_secret) OR api_key.
     """
+    client = _get_client()
     try:
         client.configure(consumer_key, consumer_secret, api_key)
         # Verify it works by getting current user
         user = client.get_current_user()
-        name = f"{user.getFirstName()} {user.getLastName()}".strip()
-        return f"Successfully configured Splitwise for user: {name}"
+        _remember_credentials(consumer_key=consumer_key, consumer_secret=consumer_secret, api_key=api_key)
+        return f"Successfully configured Splitwise for user: {user.name}"
     except Exception as e:
         return f"Configuration failed: {e}. Please check your keys."
 
@@ -113,42 +235,80 @@ def login_with_token(access_token: str) -> str:
     Log in using an existing OAuth2 Access Token.
     Useful for integrations where authentication is handled externally (e.g. ChatGPT).
     """
+    client = _get_client()
     try:
         client.configure(access_token=access_token)
         # Verify
         user = client.get_current_user()
-        name = f"{user.getFirstName()} {user.getLastName()}".strip()
-        return f"Successfully logged in as: {name}"
+        _remember_credentials(access_token=access_token)
+        return f"Successfully logged in as: {user.name}"
     except Exception as e:
         return f"Login failed: {e}. Token might be invalid."
 
 
 @mcp.tool()
-def list_friends() -> str:
+@recorded()
+def list_friends(
+    prefix: str = None,
+    has_balance: bool = None,
+    group_name: str = None,
+    limit: int = 50,
+    cursor: str = None
+) -> str:
     """
-    List all friends of the current user on Splitwise.
-    Returns a formatted string list of friends.
+    List friends as compact JSON, ordered by name and paginated: pass the
+    returned next_cursor to get the next page.
+
+    Args:
+        prefix: Only friends whose first, last or full name starts with this.
+        has_balance: True for friends you have a non-zero balance with, False for settled ones.
+        group_name: Only friends in this group.
+        limit: Page size (max 500).
+        cursor: next_cursor from the previous page.
     """
+    client = _get_client()
     try:
         # Client check is handled inside client.get_friends()
-        friends = client.get_friends()
-        
-        if not friends:
-            return "No friends found."
-        
-        output = ["Current Friends:"]
-        for f in friends:
-            name = f"{f.getFirstName() or ''} {f.getLastName() or ''}".strip()
-            output.append(f"- {name} (ID: {f.getId()})")
-        
-        return "\n".join(output)
-        
+        items, next_cursor = client.list_friends(
+            prefix=prefix, has_balance=has_balance, group_name=group_name, limit=limit, cursor=cursor
+        )
+        return _json_page("friends", items, next_cursor)
     except ValueError as e:
-         return f"Configuration Error: {e}"
+         return f"Error validation: {e}"
     except Exception as e:
         return f"Error listing friends: {e}"
 
 @mcp.tool()
+@recorded()
+def list_groups(member_name: str = None, prefix: str = None, limit: int = 50, cursor: str = None) -> str:
+    """
+    List groups as compact JSON (id, name, member count), ordered by name and
+    paginated: pass the returned next_cursor to get the next page.
+
+    Args:
+        member_name: Only groups this friend belongs to.
+        prefix: Only groups whose name starts with this.
+        limit: Page size (max 500).
+        cursor: next_cursor from the previous page.
+    """
+    client = _get_client()
+    try:
+        items, next_cursor = client.list_groups(prefix=prefix, member_name=member_name, limit=limit, cursor=cursor)
+        return _json_page("groups", items, next_cursor)
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error listing groups: {e}"
+
+def _json_page(key: str, items, next_cursor) -> str:
+    page = {key: items}
+    if next_cursor:
+        page["next_cursor"] = next_cursor
+    return json.dumps(page, separators=(",", ":"))
+
+@mcp.tool()
+@recorded()
+@profiled()
 def add_expense(
     amount: str, 
     description: str, 
@@ -156,7 +316,9 @@ def add_expense(
     split_map: dict = None, 
     group_name: str = None, 
     payer_name: str = None, 
-    exclude_names: list[str] = None
+    exclude_names: list[str] = None,
+    currency: str = None,
+    convert_to: str = None
 ) -> str:
     """
     Add an expense to Splitwise, supporting unequal splits, groups, and precise control.
@@ -170,7 +332,10 @@ def add_expense(
         group_name: Optional group to add expense to.
         payer_name: Optional name of who paid. Defaults to 'me'.
         exclude_names: Optional list of names to exclude from a group split.
+        currency: Optional currency code of the amount (e.g. "EUR"). Defaults to the account currency.
+        convert_to: Optional currency to record the expense in, converting from `currency` at the day's rate.
     """
+    client = _get_client()
     if not client.client:
         return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
 
@@ -182,10 +347,13 @@ def add_expense(
             split_map=split_map, 
             group_name=group_name, 
             payer_name=payer_name, 
-            exclude_names=exclude_names
+            exclude_names=exclude_names,
+            currency=currency,
+            convert_to=convert_to
         )
         if expense:
-            return f"Successfully added expense '{description}' for {amount}. (ID: {expense.getId()})"
+            in_currency = f" {currency.upper()}" if currency else ""
+            return f"Successfully added expense '{description}' for {amount}{in_currency}. (ID: {expense.getId()})"
         else:
             errors = client.client.getErrors() 
             return f"Failed to add expense. Errors: {errors}"
@@ -196,10 +364,54 @@ def add_expense(
         return f"Error adding expense: {e}"
 
 @mcp.tool()
+@recorded()
+@profiled()
+def update_expense(
+    expense_id: str,
+    amount: str = None,
+    description: str = None,
+    split_map: dict = None,
+    payer_name: str = None,
+    friend_names: list[str] = None,
+    date: str = None
+) -> str:
+    """
+    Correct an existing expense in place instead of deleting and re-adding it.
+    Only the fields you pass are changed; the expense keeps its ID and history.
+
+    Args:
+        expense_id: ID of the expense to change.
+        amount: New total. Without split_map the existing proportions are kept.
+        description: New description.
+        split_map: New unequal split, as in add_expense. Example: {'me': '40%', 'Alice': '60%'}
+        payer_name: New payer ('me' for yourself).
+        friend_names: New participants (besides you), split equally unless split_map is given.
+        date: New date (ISO 8601).
+    """
+    client = _get_client()
+    if not client.client:
+        return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
+
+    try:
+        expense, changed = client.update_expense(
+            expense_id, amount=amount, description=description, split_map=split_map,
+            payer_name=payer_name, friend_names=friend_names, date=date
+        )
+        if not changed:
+            return f"Expense {expense_id} already matches; nothing to update."
+        return f"Successfully updated expense {expense_id} ({', '.join(changed)})."
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error updating expense: {e}"
+
+@mcp.tool()
+@recorded()
 def delete_expense(expense_id: str) -> str:
     """
     Delete an expense by its ID.
     """
+    client = _get_client()
     if not client.client:
         return "Error: Splitwise client not configured."
     
@@ -209,7 +421,278 @@ def delete_expense(expense_id: str) -> str:
     except Exception as e:
         return f"Error deleting expense: {e}"
 
+def _format_expense_page(rows, next_cursor) -> str:
+    if not rows:
+        return "No expenses found."
+    output = ["Expenses:"]
+    output.extend(format_rows(rows, _get_client().user_names()))
+    if next_cursor:
+        output.append(f"More results available. Pass cursor='{next_cursor}' to continue.")
+    return "\n".join(output)
+
+@mcp.tool()
+@recorded()
+@profiled()
+def search_expenses(
+    query: str,
+    dated_after: str = None,
+    dated_before: str = None,
+    min_cost: float = None,
+    max_cost: float = None,
+    friend_name: str = None,
+    group_name: str = None,
+    payer_name: str = None,
+    limit: int = 20,
+    cursor: str = None
+) -> str:
+    """
+    Full-text search over expense descriptions, newest first.
+    Use this to find an expense ID before deleting it (e.g. "the cab expense from Tuesday").
+    
+    Args:
+        query: Words to look for in the description (prefix matched, e.g. "cab").
+        dated_after: Optional ISO date (YYYY-MM-DD) lower bound, inclusive.
+        dated_before: Optional ISO date (YYYY-MM-DD) upper bound, inclusive.
+        min_cost: Optional minimum total cost.
+        max_cost: Optional maximum total cost.
+        friend_name: Optional friend who is part of the expense.
+        group_name: Optional group the expense belongs to.
+        payer_name: Optional name of who paid ('me' for yourself).
+        limit: Page size (max 500).
+        cursor: Cursor from a previous call to fetch the next page.
+    """
+    client = _get_client()
+    if not client.client:
+        return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
+    try:
+        rows, next_cursor = client.search_expenses(
+            query,
+            dated_after=dated_after,
+            dated_before=dated_before,
+            min_cost=min_cost,
+            max_cost=max_cost,
+            friend_name=friend_name,
+            group_name=group_name,
+            payer_name=payer_name,
+            limit=limit,
+            cursor=cursor
+        )
+        return _format_expense_page(rows, next_cursor)
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error searching expenses: {e}"
+
+@mcp.tool()
+@recorded()
+def list_expenses(
+    dated_after: str = None,
+    dated_before: str = None,
+    min_cost: float = None,
+    max_cost: float = None,
+    friend_name: str = None,
+    group_name: str = None,
+    payer_name: str = None,
+    limit: int = 20,
+    cursor: str = None
+) -> str:
+    """
+    List expenses newest first, optionally filtered by date range, cost range,
+    friend, group or payer. Results are paginated; pass the returned cursor to continue.
+    """
+    client = _get_client()
+    if not client.client:
+        return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
+    try:
+        rows, next_cursor = client.search_expenses(
+            None,
+            dated_after=dated_after,
+            dated_before=dated_before,
+            min_cost=min_cost,
+            max_cost=max_cost,
+            friend_name=friend_name,
+            group_name=group_name,
+            payer_name=payer_name,
+            limit=limit,
+            cursor=cursor
+        )
+        return _format_expense_page(rows, next_cursor)
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error listing expenses: {e}"
+
+@mcp.tool()
+@recorded()
+@profiled()
+def spending_summary(
+    period: str = "month",
+    by: str = None,
+    dated_after: str = None,
+    dated_before: str = None,
+    group_name: str = None,
+    friend_name: str = None,
+    payer_name: str = None,
+    category: str = None,
+    mine: bool = False,
+    limit: int = 200
+) -> str:
+    """
+    Spending totals as compact JSON, e.g. "how much did we spend on food in
+    the Apartment group this quarter". Totals are per currency; settle-up
+    payments are not counted.
+
+    Args:
+        period: "day", "week", "month", "quarter" or "year"; None for one total.
+        by: Optional breakdown: "category", "group", "friend" (each person's share) or "payer".
+        dated_after: Optional ISO date (YYYY-MM-DD) lower bound, inclusive.
+        dated_before: Optional ISO date (YYYY-MM-DD) upper bound, inclusive.
+        group_name: Only expenses in this group.
+        friend_name: Only expenses this friend is part of.
+        payer_name: Only expenses paid by this person ('me' for yourself).
+        category: Only this Splitwise category (e.g. "Dining out", "Groceries").
+        mine: Count only your own share instead of the full cost.
+        limit: Maximum rows returned.
+    """
+    client = _get_client()
+    if not client.client:
+        return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
+    try:
+        summary = client.spending_summary(
+            period=period, by=by, dated_after=dated_after, dated_before=dated_before,
+            group_name=group_name, friend_name=friend_name, payer_name=payer_name,
+            category=category, mine=mine, limit=limit
+        )
+        return json.dumps(summary, separators=(",", ":"))
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error summarising spending: {e}"
+
+# =============================================================================
+# Scheduled Writes (Recurring Expenses & Settle-ups)
+# =============================================================================
+
+@mcp.tool()
+def schedule_recurring_expense(
+    amount: str,
+    description: str,
+    every: str = "monthly",
+    start: str = None,
+    group_name: str = None,
+    friend_names: list[str] = None,
+    split_map: dict = None,
+    payer_name: str = None,
+    exclude_names: list[str] = None
+) -> str:
+    """
+    Add an expense automatically every day, week or month (e.g. rent, utilities).
+    Runs are batched in the background; occurrences missed while the server was
+    down are caught up.
+
+    Args:
+        amount: The total cost.
+        description: A brief description (e.g. "Rent").
+        every: "daily", "weekly" or "monthly".
+        start: First run date (YYYY-MM-DD). Defaults to now.
+        group_name, friend_names, split_map, payer_name, exclude_names: As in add_expense.
+    """
+    try:
+        item_id = _get_scheduler().add_recurring(
+            description, amount, every=every, start=start, group_name=group_name,
+            friend_names=friend_names, split_map=split_map, payer_name=payer_name,
+            exclude_names=exclude_names
+        )
+        return f"Scheduled '{description}' for {amount} {every} (schedule ID: {item_id})."
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error scheduling expense: {e}"
+
+@mcp.tool()
+def schedule_settlement(payer_name: str, recipient_name: str, amount: str, group_name: str = None, run_at: str = None) -> str:
+    """
+    Queue a settle-up payment ("I paid Alice back 40"). Queued payments are
+    recorded in the next batch; use run_scheduled to record them right away.
+
+    Args:
+        payer_name: Who paid ('me' for yourself).
+        recipient_name: Who received the money ('me' for yourself).
+        amount: Amount paid.
+        group_name: Optional group the debt belongs to.
+        run_at: Optional date/time (YYYY-MM-DD[THH:MM]) to record it. Defaults to the next batch.
+    """
+    try:
+        item_id = _get_scheduler().add_settlement(payer_name, recipient_name, amount, group_name=group_name, run_at=run_at)
+        return f"Queued payment of {amount} from {payer_name} to {recipient_name} (settlement ID: {item_id})."
+    except ValueError as e:
+        return f"Error validation: {e}"
+    except Exception as e:
+        return f"Error queueing settlement: {e}"
+
+@mcp.tool()
+def list_scheduled() -> str:
+    """List active recurring expenses and pending settle-ups."""
+    try:
+        recurring, settlements = _get_scheduler().store.list()
+    except Exception as e:
+        return f"Error listing scheduled items: {e}"
+    if not recurring and not settlements:
+        return "Nothing scheduled."
+    output = []
+    if recurring:
+        output.append("Recurring expenses:")
+        for r in recurring:
+            where = f" in {r['group_name']}" if r["group_name"] else f" with {', '.join(r['friend_names'])}"
+            error = f" [last error: {r['last_error']}]" if r["last_error"] else ""
+            output.append(f"- #{r['id']} {r['description']} {r['amount']}{where}, {r['every']}, next {r['next_run'][:10]}{error}")
+    if settlements:
+        output.append("Pending settle-ups:")
+        for s in settlements:
+            output.append(f"- #{s['id']} {s['payer_name']} -> {s['recipient_name']} {s['amount']}, at {s['run_at'][:16]}")
+    return "\n".join(output)
+
+@mcp.tool()
+def cancel_scheduled(kind: str, item_id: int) -> str:
+    """
+    Cancel a scheduled item.
+
+    Args:
+        kind: "recurring" or "settlement".
+        item_id: The schedule or settlement ID.
+    """
+    if kind not in ("recurring", "settlement"):
+        return "Error validation: kind must be 'recurring' or 'settlement'."
+    try:
+        cancelled = _get_scheduler().store.cancel(kind, item_id)
+    except Exception as e:
+        return f"Error cancelling {kind}: {e}"
+    if cancelled:
+        return f"Cancelled {kind} #{item_id}."
+    return f"No active {kind} with ID {item_id}."
+
+@mcp.tool()
+@admitted()
+async def run_scheduled() -> str:
+    """Run everything that is due now in one batch, ignoring the off-peak window."""
+    client = _get_client()
+    if not client.client:
+        return "Error: Splitwise client not configured. Use 'configure_splitwise' first."
+    try:
+        summary = await asyncio.to_thread(_get_scheduler().run_due)
+        if summary.get("deferred") and not any(summary[k] for k in ("expenses", "payments", "failed")):
+            return "Another process is running the schedule right now; try again shortly."
+        return (f"Created {summary['expenses']} expense(s) and {summary['payments']} payment(s)"
+                f"; {summary['failed']} failed.")
+    except Exception as e:
+        return f"Error running scheduled items: {e}"
+
 def main():
+    if os.getenv("SPLITWISE_WARMUP"):
+        # stdio has no probes and stays lazy unless asked; warming in the
+        # background still spares the first command the cold start.
+        from splitwise_mcp.warmup import from_env
+        from_env(warm_steps()).start()
     mcp.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from splitwise_mcp.model import Group, User, build_directory, directory_from_dict, directory_to_dict
+
+# Bump when the table layout changes; older snapshots are ignored.
+SNAPSHOT_FORMAT = 2
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE users (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, balances TEXT, is_me INTEGER NOT NULL DEFAULT 0, is_friend INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE groups (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE memberships (group_id INTEGER NOT NULL, user_id INTEGER NOT NULL, PRIMARY KEY (group_id, user_id));
+"""
+
+
+def credential_key(*secrets) -> str:
+    """Stable, non-reversible key for a set of credentials."""
+    material = "\0".join(s or "" for s in secrets)
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+class DirectorySnapshot:
+    """
+    On-disk copy of one account's directory (current user, friends, groups and
+    memberships) in a small SQLite file, one per credential.
+
+    Saves write a fresh file and atomically replace the old one, so readers in
+    other processes never see a half-written snapshot.
+    """
+
+    def __init__(self, directory: str, key: str):
+        self.path = os.path.join(directory, f"directory-{key}.sqlite")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self):
+        """(me, friends, groups) or None when there is no usable snapshot."""
+        if not self.exists():
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        except sqlite3.Error:
+            return None
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("format") != str(SNAPSHOT_FORMAT):
+                return None
+            users = {}
+            me = None
+            friends = []
+            for uid, first, last, email, balances, is_me, is_friend in conn.execute(
+                "SELECT id, first_name, last_name, email, balances, is_me, is_friend FROM users ORDER BY rowid"
+            ):
+                user = User(uid, first, last, email, json.loads(balances) if balances else None)
+                users[uid] = user
+                if is_me:
+                    me = user
+                if is_friend:
+                    friends.append(user)
+            members = {}
+            for group_id, user_id in conn.execute("SELECT group_id, user_id FROM memberships ORDER BY rowid"):
+                if user_id in users:
+                    members.setdefault(group_id, []).append(users[user_id])
+            groups = [
+                Group(gid, name, members.get(gid, ()))
+                for gid, name in conn.execute("SELECT id, name FROM groups ORDER BY rowid")
+            ]
+            return me, friends, groups
+        except (sqlite3.Error, ValueError):
+            return None
+        finally:
+            conn.close()
+
+    def save(self, me, friends, groups) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            with conn:
+                conn.executescript(SCHEMA)
+                conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                    ("format", str(SNAPSHOT_FORMAT)),
+                    ("saved_at", str(time.time())),
+                ])
+                me, friends, groups = build_directory(me, friends, groups)
+                users = {}
+                if me is not None:
+                    users[me.id] = [me, 1, 0]
+                for f in friends:
+                    users.setdefault(f.id, [f, 0, 0])[2] = 1
+                for g in groups:
+                    for m in g.members:
+                        users.setdefault(m.id, [m, 0, 0])
+                conn.executemany(
+                    "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (uid, u.first_name, u.last_name, u.email, json.dumps(u.balances) if u.balances else None,
+                         is_me, is_friend)
+                        for uid, (u, is_me, is_friend) in users.items()
+                    ],
+                )
+                conn.executemany("INSERT INTO groups VALUES (?, ?)", [(g.id, g.name) for g in groups])
+                conn.executemany(
+                    "INSERT OR IGNORE INTO memberships VALUES (?, ?)",
+                    [(g.id, m.id) for g in groups for m in g.members],
+                )
+            conn.close()
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self) -> None:
+        if self.exists():
+            os.remove(self.path)
+
+
+class SharedDirectoryCache:
+    """
+    Directory copy in a shared state backend (see state.py), so replicas of
+    the server reuse one fetch instead of each calling the API. Same
+    load/save interface as DirectorySnapshot; entries expire after `ttl`.
+    """
+
+    def __init__(self, backend, key: str, ttl: float):
+        self.backend = backend
+        self.key = f"directory:{key}"
+        self.ttl = ttl
+
+    def load(self):
+        raw = self.backend.get(self.key)
+        if not raw:
+            return None
+        try:
+            return directory_from_dict(json.loads(raw))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, me, friends, groups) -> None:
+        me, friends, groups = build_directory(me, friends, groups)
+        self.backend.set(self.key, json.dumps(directory_to_dict(me, friends, groups)), ttl=self.ttl)
+
+    def delete(self) -> None:
+        self.backend.delete(self.key)
@@ -1,4 +1,11 @@
-from splitwise_mcp.server import mcp
+from splitwise_mcp.admission import AdmissionMiddleware
+from splitwise_mcp.profiling import ProfilingMiddleware
+from splitwise_mcp.server import mcp, warm_steps
+from splitwise_mcp.warmup import HealthMiddleware, from_env
 
-# Expose the ASGI app for uvicorn
-app = mcp.sse_app
+# Expose the ASGI app for uvicorn, behind per-tenant admission control. The
+# admin profiling endpoints and the /healthz and /readyz probes sit outside it
+# so they still answer under load. Components are warmed in the background
+# from import on (SPLITWISE_WARMUP); /readyz passes once they are hot.
+warmup = from_env(warm_steps()).start()
+app = HealthMiddleware(ProfilingMiddleware(AdmissionMiddleware(mcp.sse_app(), stream_paths=("/sse",))), warmup)
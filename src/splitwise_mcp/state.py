@@ -0,0 +1,361 @@
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlparse
+
+# Shared state for running several server replicas: sessions (credentials),
+# directory caches, the idempotency journal and rate-limit windows live in a
+# backend every replica can reach. MemoryBackend keeps today's single-process
+# behaviour; RedisBackend speaks the Redis protocol (RESP) to Redis, Valkey,
+# KeyDB or the LocalRespServer stand-in below.
+
+
+class StateBackend:
+    """Minimal key/value interface the shared-state users need."""
+
+    shared = False
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float = None, nx: bool = False) -> bool:
+        """Store `value`; with nx=True only if the key is absent. Returns whether it was set."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        """Atomically add `amount`; `ttl` applies when the key is created."""
+        raise NotImplementedError
+
+
+class MemoryBackend(StateBackend):
+    """In-process backend. State is shared only within one process."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        with self._lock:
+            if nx and self._live(key):
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            item = self._live(key)
+            if item is None:
+                value, expires = 0, (time.monotonic() + ttl if ttl else None)
+            else:
+                value, expires = int(item[0]), item[1]
+            value += amount
+            self._data[key] = (str(value), expires)
+            return value
+
+
+class RespError(Exception):
+    pass
+
+
+def encode_command(*args) -> bytes:
+    out = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+def read_reply(stream):
+    """Read one RESP2 reply from a buffered binary stream."""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        count = int(rest)
+        return None if count < 0 else [read_reply(stream) for _ in range(count)]
+    raise RespError(f"Unexpected reply: {line!r}")
+
+
+class RedisBackend(StateBackend):
+    """
+    Redis-protocol backend over a plain socket (one connection per thread),
+    so no client library is needed. URL: redis://[:password@]host:port/db
+    """
+
+    shared = True
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        stream = sock.makefile("rb")
+        self._local.conn = (sock, stream)
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+        return self._local.conn
+
+    def _send(self, *args):
+        sock, stream = self._local.conn
+        sock.sendall(encode_command(*args))
+        return read_reply(stream)
+
+    def execute(self, *args):
+        """Run one command, reconnecting once if the connection dropped."""
+        for attempt in (0, 1):
+            if getattr(self._local, "conn", None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (ConnectionError, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn:
+            sock, stream = conn
+            stream.close()
+            sock.close()
+        self._local.conn = None
+
+    def get(self, key):
+        return self.execute("GET", key)
+
+    def set(self, key, value, ttl=None, nx=False):
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        if nx:
+            args.append("NX")
+        return self.execute(*args) == "OK"
+
+    def delete(self, key):
+        self.execute("DEL", key)
+
+    def incr(self, key, amount=1, ttl=None):
+        value = self.execute("INCRBY", key, amount)
+        if ttl and value == amount:
+            self.execute("PEXPIRE", key, int(ttl * 1000))
+        return value
+
+
+class LocalRespServer:
+    """
+    A tiny RESP server backed by MemoryBackend: enough of GET/SET/DEL/INCRBY/
+    PEXPIRE/PING to stand in for Redis in tests and single-node setups.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        backend = self.backend = MemoryBackend()
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        args = read_reply(self.rfile)
+                    except (ConnectionError, RespError):
+                        return
+                    self.wfile.write(_dispatch(backend, args or []))
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self.url = "redis://%s:%d/0" % self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="resp-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    data = str(value).encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+def _dispatch(backend: MemoryBackend, args) -> bytes:
+    if not args:
+        return b"-ERR empty command\r\n"
+    cmd = args[0].upper()
+    try:
+        if cmd == "PING":
+            return b"+PONG\r\n"
+        if cmd in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if cmd == "GET":
+            return _bulk(backend.get(args[1]))
+        if cmd == "SET":
+            key, value, opts = args[1], args[2], [a.upper() for a in args[3:]]
+            ttl = int(args[3 + opts.index("PX") + 1]) / 1000 if "PX" in opts else None
+            return b"+OK\r\n" if backend.set(key, value, ttl=ttl, nx="NX" in opts) else b"$-1\r\n"
+        if cmd == "DEL":
+            backend.delete(args[1])
+            return b":1\r\n"
+        if cmd == "INCRBY":
+            return b":%d\r\n" % backend.incr(args[1], int(args[2]))
+        if cmd == "PEXPIRE":
+            with backend._lock:
+                item = backend._live(args[1])
+                if item is None:
+                    return b":0\r\n"
+                backend._data[args[1]] = (item[0], time.monotonic() + int(args[2]) / 1000)
+            return b":1\r\n"
+    except (IndexError, ValueError) as e:
+        return b"-ERR %s\r\n" % str(e).encode()
+    return b"-ERR unknown command '%s'\r\n" % cmd.encode()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> StateBackend:
+    """Process-wide backend from SPLITWISE_STATE_URL (redis://...; default: in-process)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            url = os.getenv("SPLITWISE_STATE_URL")
+            _backend = RedisBackend(url) if url else MemoryBackend()
+        return _backend
+
+
+class SessionStore:
+    """
+    Credentials per session, so any replica can serve a session configured on
+    another. Values are stored as-is: protect the backend like a secret store.
+
+    A process holds one SplitwiseClient, i.e. serves one Splitwise account,
+    so the servers use a single session (DEFAULT): the store carries that
+    account's credentials to every replica, it is not a per-tenant login.
+    The agent's chat history is not shared and stays per process.
+    """
+
+    PREFIX = "session:"
+    DEFAULT = "default"
+
+    def __init__(self, backend: StateBackend, ttl: float = None):
+        self.backend = backend
+        self.ttl = ttl or float(os.getenv("SPLITWISE_SESSION_TTL", str(30 * 24 * 3600)))
+
+    def save(self, session_id: str, credentials: dict, client=None) -> None:
+        """
+        Store credentials; pass the `client` that already uses them to skip
+        its own resync. Like SplitwiseClient.configure, fields that are empty
+        or not given keep their stored value.
+        """
+        merged = dict(self.load(session_id) or {})
+        merged.update({k: v for k, v in credentials.items() if v})
+        self.backend.set(self.PREFIX + session_id, json.dumps(merged), ttl=self.ttl)
+        if client is not None:
+            client._session_fingerprint = _fingerprint(merged)
+
+    def load(self, session_id: str):
+        raw = self.backend.get(self.PREFIX + session_id)
+        return json.loads(raw) if raw else None
+
+    def sync(self, client, session_id: str = DEFAULT) -> bool:
+        """
+        Reconfigure `client` if the session's credentials changed on another
+        replica. Returns True if it did.
+        """
+        credentials = self.load(session_id)
+        if not credentials:
+            return False
+        fingerprint = _fingerprint(credentials)
+        if getattr(client, "_session_fingerprint", None) == fingerprint:
+            return False
+        client.configure(**credentials)
+        client._session_fingerprint = fingerprint
+        return True
+
+
+def _fingerprint(credentials: dict) -> str:
+    return hashlib.sha256(json.dumps(credentials, sort_keys=True).encode()).hexdigest()
+
+
+class IdempotencyJournal:
+    """
+    Remembers the outcome of writes by idempotency key, so a retried request
+    (possibly landing on another replica) does not create a second expense.
+    """
+
+    PREFIX = "idem:"
+    PENDING = "__pending__"
+
+    def __init__(self, backend: StateBackend, ttl: float = 24 * 3600):
+        self.backend = backend
+        self.ttl = ttl
+
+    def claim(self, key: str, lease: float = 60.0) -> bool:
+        """Reserve `key` for this caller. False if it is taken or already done."""
+        return self.backend.set(self.PREFIX + key, self.PENDING, ttl=lease, nx=True)
+
+    def result(self, key: str):
+        """(done, result): done is False while pending or unknown."""
+        raw = self.backend.get(self.PREFIX + key)
+        if raw is None or raw == self.PENDING:
+            return False, None
+        return True, json.loads(raw)
+
+    def record(self, key: str, result) -> None:
+        self.backend.set(self.PREFIX + key, json.dumps(result), ttl=self.ttl)
+
+    def release(self, key: str) -> None:
+        """Give up a claim (the write failed) so it can be retried."""
+        self.backend.delete(self.PREFIX + key)
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs
+from splitwise_mcp.admission import tenant_of
+
+# Multi-process serving for the SSE app (or any ASGI app).
+#
+# The supervisor spawns one uvicorn worker per core, each listening on its own
+# unix socket, and proxies the public port to them. Tenants are routed by
+# consistent hashing, so each tenant's caches, agent session and admission
+# quotas live on one warm worker and nothing needs to be shared between them.
+# SSE message posts follow the worker that holds their stream. On SIGHUP a
+# new generation of workers is started; once they pass /readyz (warmed up,
+# see warmup.py) the old one is drained and stopped.
+
+logger = logging.getLogger(__name__)
+
+MAX_HEAD_BYTES = 64 * 1024
+_SESSION_ID = re.compile(rb"session_id=([0-9a-fA-F]+)")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual nodes per slot."""
+
+    def __init__(self, slots, replicas: int = 64):
+        points = sorted((_hash(f"{slot}#{i}"), slot) for slot in slots for i in range(replicas))
+        self._keys = [p[0] for p in points]
+        self._slots = [p[1] for p in points]
+
+    def lookup(self, key: str):
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._slots[i]
+
+
+def parse_head(head: bytes):
+    """(method, target, [(name, value)]) from a raw HTTP/1.x request head."""
+    lines = head.rstrip(b"\r\n").split(b"\r\n")
+    method, target, _ = lines[0].split(b" ", 2)
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        headers.append((name.strip().lower(), value.strip()))
+    return method.decode("latin-1"), target.decode("latin-1"), headers
+
+
+def rewrite_head(head: bytes, extra) -> bytes:
+    """
+    Force one request per upstream connection (so every request is routed on
+    its own) and set `extra` headers, replacing any the client sent.
+    """
+    lines = head.rstrip(b"\r\n").split(b"\r\n")
+    dropped = (b"connection:", b"keep-alive:") + tuple(name.lower() + b":" for name, _ in extra)
+    kept = [lines[0]] + [l for l in lines[1:] if not l.lower().startswith(dropped)]
+    kept += [b"%s: %s" % (name, value) for name, value in extra]
+    kept.append(b"Connection: close")
+    return b"\r\n".join(kept) + b"\r\n\r\n"
+
+
+class Worker:
+    def __init__(self, slot: int, generation: int, socket_path: str, process):
+        self.slot = slot
+        self.generation = generation
+        self.socket_path = socket_path
+        self.process = process
+        self.active = 0
+        self.draining = False
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+
+class Supervisor:
+    """
+    Runs `workers` copies of the ASGI `app` and proxies `host:port` to them.
+
+    `drain_timeout` bounds how long a replaced worker may keep serving its
+    open connections (SSE streams included) before it is stopped.
+    """
+
+    def __init__(self, app: str = "splitwise_mcp.sse:app", host: str = "0.0.0.0", port: int = 8000,
+                 workers: int = None, drain_timeout: float = None, worker_args=()):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.size = workers or int(os.getenv("SPLITWISE_WORKERS", "0")) or os.cpu_count() or 1
+        self.drain_timeout = drain_timeout or float(os.getenv("SPLITWISE_DRAIN_TIMEOUT", "30"))
+        self.ready_timeout = float(os.getenv("SPLITWISE_READY_TIMEOUT", "90"))
+        self.worker_args = list(worker_args)
+        self.ring = HashRing(range(self.size))
+        self.workers = {}
+        self.sessions = {}
+        self.generation = 0
+        self._socket_dir = None
+        self._server = None
+        self._stopping = False
+
+    # Workers
+
+    def _spawn(self, slot: int, generation: int) -> Worker:
+        path = os.path.join(self._socket_dir, f"worker-{slot}-{generation}.sock")
+        if os.path.exists(path):
+            os.remove(path)
+        trusted = ",".join(filter(None, [os.getenv("SPLITWISE_TRUSTED_PROXIES"), "unix"]))
+        env = dict(os.environ, SPLITWISE_WORKER_ID=str(slot), SPLITWISE_TRUSTED_PROXIES=trusted)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.app, "--uds", path, *self.worker_args], env=env
+        )
+        return Worker(slot, generation, path, process)
+
+    async def _wait_ready(self, worker: Worker, timeout: float = None) -> bool:
+        """
+        Wait until the worker's GET /readyz stops answering 503, so traffic
+        only moves to it once it has warmed up. Apps without the probe count
+        as ready when they accept connections.
+        """
+        timeout = timeout or self.ready_timeout
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and worker.alive():
+            try:
+                reader, writer = await asyncio.open_unix_connection(worker.socket_path)
+            except OSError:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                writer.write(b"GET /readyz HTTP/1.1\r\nHost: worker\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                status_line = await asyncio.wait_for(reader.readline(), timeout=max(0.1, deadline - time.monotonic()))
+            except (OSError, asyncio.TimeoutError):
+                status_line = b""
+            finally:
+                writer.close()
+            parts = status_line.split()
+            if len(parts) >= 2 and parts[1] != b"503":
+                return True
+            await asyncio.sleep(0.2)
+        return False
+
+    async def _start_generation(self) -> dict:
+        self.generation += 1
+        fresh = {slot: self._spawn(slot, self.generation) for slot in range(self.size)}
+        ready = await asyncio.gather(*(self._wait_ready(w) for w in fresh.values()))
+        if not all(ready):
+            for worker in fresh.values():
+                self._stop_worker(worker)
+            raise RuntimeError("Workers failed to start")
+        return fresh
+
+    def _stop_worker(self, worker: Worker, grace: float = 5.0):
+        if worker.alive():
+            worker.process.terminate()
+            try:
+                worker.process.wait(grace)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+        if os.path.exists(worker.socket_path):
+            os.remove(worker.socket_path)
+
+    async def _drain(self, worker: Worker):
+        """Stop routing new requests to `worker`, let open ones finish, then stop it."""
+        worker.draining = True
+        deadline = time.monotonic() + self.drain_timeout
+        while worker.active and time.monotonic() < deadline and worker.alive():
+            await asyncio.sleep(0.2)
+        await asyncio.to_thread(self._stop_worker, worker)
+        logger.info("Worker %s (generation %s) drained", worker.slot, worker.generation)
+
+    async def reload(self):
+        """Replace every worker with a fresh one; old ones drain in the background."""
+        fresh = await self._start_generation()
+        old, self.workers = self.workers, fresh
+        await asyncio.gather(*(self._drain(w) for w in old.values()))
+
+    async def _monitor(self):
+        """Restart workers that exited on their own."""
+        while not self._stopping:
+            await asyncio.sleep(1.0)
+            for slot, worker in list(self.workers.items()):
+                if not worker.alive() and not self._stopping:
+                    logger.warning("Worker %s exited with %s; restarting", slot, worker.process.returncode)
+                    replacement = self._spawn(slot, worker.generation)
+                    if await self._wait_ready(replacement):
+                        self.workers[slot] = replacement
+                    else:
+                        await asyncio.to_thread(self._stop_worker, replacement)
+
+    # Routing
+
+    def route(self, tenant: str, target: str):
+        """Worker for a request: the SSE session's owner if known, else the tenant's slot."""
+        query = target.partition("?")[2]
+        session_id = (parse_qs(query).get("session_id") or [None])[0]
+        worker = self.sessions.get(session_id) if session_id else None
+        if worker is not None and worker.alive():
+            return worker
+        return self.workers.get(self.ring.lookup(tenant))
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=30)
+            if len(head) > MAX_HEAD_BYTES:
+                raise ValueError("Request head too large")
+            method, target, headers = parse_head(head)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            writer.close()
+            return
+
+        peer = writer.get_extra_info("peername")
+        tenant = tenant_of({"headers": headers, "client": peer if isinstance(peer, tuple) else None})
+        worker = self.route(tenant, target)
+        if worker is None:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        # Workers trust these because they only come over the unix socket
+        extra = [(b"X-Tenant-ID", tenant.encode("latin-1"))]
+        if isinstance(peer, tuple):
+            extra.append((b"X-Forwarded-For", peer[0].encode()))
+        worker.active += 1
+        session_id = None
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_unix_connection(worker.socket_path)
+            upstream_writer.write(rewrite_head(head, extra))
+
+            async def to_upstream():
+                while data := await reader.read(65536):
+                    upstream_writer.write(data)
+                    await upstream_writer.drain()
+
+            async def to_client():
+                nonlocal session_id
+                sniffed = b""
+                while data := await upstream_reader.read(65536):
+                    if session_id is None and len(sniffed) < 8192:
+                        sniffed += data
+                        match = _SESSION_ID.search(sniffed)
+                        if match:
+                            session_id = match.group(1).decode()
+                            self.sessions[session_id] = worker
+                    writer.write(data)
+                    await writer.drain()
+
+            upload = asyncio.ensure_future(to_upstream())
+            try:
+                await to_client()
+            finally:
+                upload.cancel()
+                upstream_writer.close()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            worker.active -= 1
+            if session_id is not None:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    # Lifecycle
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self._socket_dir = tempfile.mkdtemp(prefix="splitwise-workers-")
+        self.workers = await self._start_generation()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("Serving %s on %s:%s with %d workers", self.app, self.host, self.port, self.size)
+
+        stop = asyncio.Event()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        monitor = asyncio.ensure_future(self._monitor())
+        try:
+            await stop.wait()
+        finally:
+            self._stopping = True
+            monitor.cancel()
+            self._server.close()
+            await asyncio.gather(*(self._drain(w) for w in self.workers.values()))
+            if not os.listdir(self._socket_dir):
+                os.rmdir(self._socket_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Splitwise MCP SSE app with one worker per core.")
+    parser.add_argument("app", nargs="?", default="splitwise_mcp.sse:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="Default: SPLITWISE_WORKERS or CPU count")
+    parser.add_argument("--drain-timeout", type=float, default=None)
+    args, worker_args = parser.parse_known_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    supervisor = Supervisor(args.app, args.host, args.port, args.workers, args.drain_timeout, worker_args)
+    asyncio.run(supervisor.serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# Warm-up and health probes for the HTTP servers.
+#
+# Commands lazy-load their components (Splitwise client and directory, the
+# intent agent, the transcriber, the voice pipeline), so without a warm-up
+# the first command after a deploy pays for client construction, the
+# friends/groups fetch and the TLS handshakes. Warmup runs those steps in
+# parallel at startup. /readyz answers 503 until they are done, so a rolling
+# deploy only sends traffic to a hot process; /healthz only says the process
+# is up.
+#
+# SPLITWISE_WARMUP picks the steps:
+#   auto (default)  every step; one that fails (e.g. no GEMINI_API_KEY)
+#                   doesn't hold readiness back, it stays lazy
+#   a,b,...         only these steps; each is retried until it succeeds and
+#                   the process isn't ready before they all have
+#   off             nothing; ready at once
+# Steps that are not required stop holding readiness back after
+# SPLITWISE_WARMUP_TIMEOUT seconds (default 60).
+
+logger = logging.getLogger(__name__)
+
+STEPS = ("splitwise", "agent", "transcriber", "pipeline")
+
+
+def selected_steps(value: str = None):
+    """(steps to run, steps readiness waits for) from a SPLITWISE_WARMUP value."""
+    value = (value if value is not None else os.getenv("SPLITWISE_WARMUP", "auto")).strip().lower()
+    if value in ("", "auto"):
+        return list(STEPS), []
+    if value in ("0", "off", "false", "no"):
+        return [], []
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown warm-up step(s) {', '.join(unknown)}. Choose from: {', '.join(STEPS)}")
+    return names, names
+
+
+def from_env(available: dict):
+    """Warmup over the `available` step functions selected by SPLITWISE_WARMUP."""
+    names, required = selected_steps()
+    return Warmup({name: available[name] for name in names}, required,
+                  timeout=float(os.getenv("SPLITWISE_WARMUP_TIMEOUT", "60")))
+
+
+class Warmup:
+    """
+    Runs named warm-up steps in parallel, one thread each. A required step
+    that fails is retried with backoff (up to `retry_max` seconds apart);
+    the rest run once, and stop holding readiness back after `timeout`
+    seconds.
+    """
+
+    def __init__(self, steps: dict, required=(), timeout: float = 60.0, retry_max: float = 30.0):
+        self.steps = steps
+        self.required = set(required)
+        self.timeout = timeout
+        self.retry_max = retry_max
+        self.state = {name: {"state": "pending", "attempts": 0, "ms": None, "error": None} for name in steps}
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for name, fn in self.steps.items():
+            threading.Thread(target=self._run, args=(name, fn), name=f"warmup-{name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, name, fn):
+        delay = 1.0
+        while not self._stop.is_set():
+            with self._lock:
+                entry = self.state[name]
+                entry["state"] = "running"
+                entry["attempts"] += 1
+            started = time.monotonic()
+            try:
+                fn()
+            except Exception as e:
+                with self._lock:
+                    entry.update(state="failed", error=str(e), ms=round((time.monotonic() - started) * 1000))
+                logger.warning("Warm-up step %s failed: %s", name, e)
+                if name not in self.required:
+                    return
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+            with self._lock:
+                entry.update(state="ok", error=None, ms=round((time.monotonic() - started) * 1000))
+            logger.info("Warm-up step %s done in %sms", name, entry["ms"])
+            return
+
+    @property
+    def ready(self) -> bool:
+        if self.started_at is None:
+            return not self.steps
+        overdue = time.monotonic() - self.started_at > self.timeout
+        with self._lock:
+            for name, entry in self.state.items():
+                if name in self.required:
+                    if entry["state"] != "ok":
+                        return False
+                elif entry["state"] in ("pending", "running") and not overdue:
+                    return False
+            return True
+
+    def status(self) -> dict:
+        ready = self.ready
+        with self._lock:
+            return {"ready": ready, "steps": {name: dict(entry) for name, entry in self.state.items()}}
+
+
+class HealthMiddleware:
+    """
+    ASGI probes in front of `app`: GET /healthz (the process is up) and
+    GET /readyz (200 once `warmup` is ready, 503 with its status before).
+    Meant to sit outside admission control, so probes are never shed.
+    """
+
+    def __init__(self, app, warmup: Warmup = None, health_path: str = "/healthz", ready_path: str = "/readyz"):
+        self.app = app
+        self.warmup = warmup
+        self.health_path = health_path
+        self.ready_path = ready_path
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if path == self.health_path:
+            return await _respond(send, 200, {"status": "ok"})
+        if path == self.ready_path:
+            if self.warmup is None:
+                return await _respond(send, 200, {"ready": True, "steps": {}})
+            status = self.warmup.status()
+            return await _respond(send, 200 if status["ready"] else 503, status)
+        return await self.app(scope, receive, send)
+
+
+async def _respond(send, status: int, payload: dict):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"cache-control", b"no-store"),
+                    (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -1,14 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
+from splitwise_mcp.admission import AdmissionMiddleware
 from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.profiling import ProfilingMiddleware, profiled
+from splitwise_mcp.refresh import parse_webhook, verify_secret
+from splitwise_mcp.resilience import UpstreamUnavailable
+from splitwise_mcp.state import IdempotencyJournal, SessionStore, get_backend
+from splitwise_mcp.warmup import HealthMiddleware, from_env
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
 import os
+import threading
 
-app = FastAPI(title="Splitwise ChatGPT Connector", description="API to manage Splitwise expenses via ChatGPT")
+# HTTP connector (e.g. ChatGPT actions) with the same operations as the MCP
+# tools. Routes are async; blocking client calls run in the thread pool.
+# Friend and group listings are rendered once per directory digest and
+# served with an ETag, so a polling client's If-None-Match gets a 304.
+
+@asynccontextmanager
+async def lifespan(app):
+    if _refresh_enabled():
+        client.start_refresher()
+    # Build the OpenAPI schema now rather than on the first /docs request
+    app.openapi()
+    warmup.start()
+    try:
+        yield
+    finally:
+        warmup.stop()
+        if client.refresher is not None:
+            client.refresher.stop()
+        if _pipeline is not None:
+            _pipeline.shutdown()
+
+app = FastAPI(title="Splitwise ChatGPT Connector", description="API to manage Splitwise expenses via ChatGPT",
+              lifespan=lifespan)
+
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("SPLITWISE_GZIP_MIN_BYTES", "1000")))
+# Per-tenant rate/concurrency quotas with fair queueing (see admission.py)
+app.add_middleware(AdmissionMiddleware, stream_paths=())
+# Added last so it wraps admission: admin endpoints answer even when shedding load
+app.add_middleware(ProfilingMiddleware)
+# /healthz and /readyz, outermost so probes are never queued or shed. The
+# warm-up starts with the app (SPLITWISE_WARMUP, see warmup.py).
+warmup = from_env({
+    "splitwise": lambda: client.warm(),
+    "agent": lambda: _get_agent().warm(),
+    "transcriber": lambda: _get_transcriber().warm(),
+    "pipeline": lambda: _get_pipeline(),
+})
+app.add_middleware(HealthMiddleware, warmup=warmup)
 
 # Global client
 client = SplitwiseClient()
 
+# Shared with other replicas when SPLITWISE_STATE_URL is set
+sessions = SessionStore(get_backend())
+journal = IdempotencyJournal(get_backend())
+
+# Lazy-initialized, as in the MCP server
+_agent = None
+_transcriber = None
+_pipeline = None
+_scheduler = None
+_init_locks = {name: threading.Lock() for name in ("agent", "transcriber", "pipeline", "scheduler")}
+
+CACHE_CONTROL = f"private, max-age={int(os.getenv('SPLITWISE_WEB_MAX_AGE', '0'))}, must-revalidate"
+MAX_CACHED_PAGES = 256
+_pages = OrderedDict()  # (path, directory digest, query) -> (etag, body)
+_pages_lock = threading.Lock()
+
+@app.middleware("http")
+async def sync_session(request: Request, call_next):
+    """Pick up credentials configured on another replica before serving."""
+    if sessions.backend.shared:
+        await run_in_threadpool(sessions.sync, client)
+    return await call_next(request)
+
 class ConfigureRequest(BaseModel):
     consumer_key: Optional[str] = None
     consumer_secret: Optional[str] = None
@@ -20,55 +94,371 @@ class LoginTokenRequest(BaseModel):
 class AddExpenseRequest(BaseModel):
     amount: str
     description: str
-    friend_names: List[str]
+    friend_names: List[str] = []
+    split_map: Optional[Dict[str, str]] = None
+    group_name: Optional[str] = None
+    payer_name: Optional[str] = None
+    exclude_names: Optional[List[str]] = None
+    currency: Optional[str] = None
+    convert_to: Optional[str] = None
 
-@app.get("/list_friends")
-def list_friends():
-    """List all friends."""
+class UpdateExpenseRequest(BaseModel):
+    amount: Optional[str] = None
+    description: Optional[str] = None
+    split_map: Optional[dict] = None
+    payer_name: Optional[str] = None
+    friend_names: Optional[List[str]] = None
+    date: Optional[str] = None
+
+class TextCommandRequest(BaseModel):
+    text: str
+
+class VoiceCommandRequest(BaseModel):
+    audio_base64: str
+
+class RecurringExpenseRequest(BaseModel):
+    amount: str
+    description: str
+    every: str = "monthly"
+    start: Optional[str] = None
+    group_name: Optional[str] = None
+    friend_names: Optional[List[str]] = None
+    split_map: Optional[Dict[str, str]] = None
+    payer_name: Optional[str] = None
+    exclude_names: Optional[List[str]] = None
+
+class SettlementRequest(BaseModel):
+    payer_name: str
+    recipient_name: str
+    amount: str
+    group_name: Optional[str] = None
+    run_at: Optional[str] = None
+
+class WebhookRequest(BaseModel):
+    changes: Optional[List[dict]] = None
+    notifications: Optional[List[dict]] = None
+
+def _refresh_enabled() -> bool:
+    return os.getenv("SPLITWISE_BACKGROUND_REFRESH", "0").lower() in ("1", "true", "yes")
+
+def _require_client():
     if not client.client:
         raise HTTPException(status_code=401, detail="Not configured. Please call /configure or /login_with_token first.")
-    
+
+async def _call(fn, *args, **kwargs):
+    """Run a blocking client call off the event loop, mapping errors to HTTP statuses."""
     try:
-        friends = client.get_friends()
-        output = []
-        for f in friends:
-             output.append({
-                 "id": f.getId(),
-                 "name": f"{f.getFirstName() or ''} {f.getLastName() or ''}".strip()
-             })
-        return {"friends": output}
+        return await run_in_threadpool(fn, *args, **kwargs)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UpstreamUnavailable as e:
+        headers = {"Retry-After": str(max(1, int(e.retry_after)))} if e.retry_after else None
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _get_agent():
+    global _agent
+    with _init_locks["agent"]:
+        if _agent is None:
+            from splitwise_mcp.agent.backends import create_agent
+            _agent = create_agent(splitwise=client)
+    return _agent
+
+def _get_transcriber():
+    global _transcriber
+    with _init_locks["transcriber"]:
+        if _transcriber is None:
+            from splitwise_mcp.agent.backends import create_transcriber
+            _transcriber = create_transcriber()
+    return _transcriber
+
+def _get_pipeline():
+    global _pipeline
+    with _init_locks["pipeline"]:
+        if _pipeline is None:
+            from splitwise_mcp.pipeline import VoicePipeline
+            _pipeline = VoicePipeline(_get_transcriber, _get_agent)
+    return _pipeline
+
+def _get_scheduler():
+    global _scheduler
+    with _init_locks["scheduler"]:
+        if _scheduler is None:
+            from splitwise_mcp.scheduler import Scheduler
+            _scheduler = Scheduler(client).start()
+        return _scheduler
+
+# Conditional reads
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def _json(body: bytes, etag: str) -> Response:
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+async def _directory_page(request: Request, render):
+    """
+    Serve a listing derived only from the directory. The ETag hashes the
+    directory contents and the query, so a match is answered without
+    rendering anything and means the same on every replica and after a
+    restart; rendered bodies are kept per directory digest.
+    """
+    _require_client()
+    await _call(client.directory.refresh)
+    contents = client.directory.digest
+    query = tuple(sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(repr((contents, request.url.path, query)).encode()).hexdigest()[:20]
+    etag = f'W/"d-{digest}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+
+    key = (request.url.path, contents, query)
+    with _pages_lock:
+        cached = _pages.get(key)
+        if cached is not None:
+            _pages.move_to_end(key)
+    if cached is None:
+        body = json.dumps(await _call(render), separators=(",", ":")).encode()
+        cached = (etag, body)
+        with _pages_lock:
+            _pages[key] = cached
+            while len(_pages) > MAX_CACHED_PAGES:
+                _pages.popitem(last=False)
+    return _json(cached[1], etag)
+
+def _hashed_json(request: Request, payload) -> Response:
+    """JSON with a content-hash ETag, for reads not derived from the directory alone."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    etag = f'W/"h{hashlib.sha1(body).hexdigest()[:16]}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    return _json(body, etag)
+
+# Directory reads
+
+@app.get("/list_friends")
+async def list_friends(request: Request, prefix: Optional[str] = None, has_balance: Optional[bool] = None,
+                       group_name: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
+    """List friends, one page at a time; pass next_cursor back as `cursor`."""
+    def render():
+        friends, next_cursor = client.list_friends(
+            prefix=prefix, has_balance=has_balance, group_name=group_name, limit=limit, cursor=cursor
+        )
+        return {"friends": friends, "next_cursor": next_cursor}
+    return await _directory_page(request, render)
+
+@app.get("/list_groups")
+async def list_groups(request: Request, prefix: Optional[str] = None, member_name: Optional[str] = None,
+                      limit: int = 50, cursor: Optional[str] = None):
+    """List groups with member counts, one page at a time."""
+    def render():
+        groups, next_cursor = client.list_groups(prefix=prefix, member_name=member_name, limit=limit, cursor=cursor)
+        return {"groups": groups, "next_cursor": next_cursor}
+    return await _directory_page(request, render)
+
+# Expenses
+
 @app.post("/add_expense")
-def add_expense(req: AddExpenseRequest):
-    """Add an expense."""
-    if not client.client:
-        raise HTTPException(status_code=401, detail="Not configured.")
-        
+@profiled("add_expense")
+async def add_expense(req: AddExpenseRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Add an expense, with the same options as the MCP tool (split_map, group,
+    payer, exclusions, currency). Retries with the same Idempotency-Key
+    return the first result.
+    """
+    _require_client()
+
+    if idempotency_key:
+        done, result = await run_in_threadpool(journal.result, idempotency_key)
+        if done:
+            return result
+        if not await run_in_threadpool(journal.claim, idempotency_key):
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress.")
+
     try:
-        expense = client.add_expense(req.amount, req.description, req.friend_names)
-        if expense:
-            return {"status": "success", "id": expense.getId(), "message": f"Added {req.amount} for {req.description}"}
-        else:
-             raise HTTPException(status_code=400, detail="Failed to add expense")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        expense = await _call(
+            client.add_expense, req.amount, req.description, req.friend_names,
+            split_map=req.split_map, group_name=req.group_name, payer_name=req.payer_name,
+            exclude_names=req.exclude_names, currency=req.currency, convert_to=req.convert_to
+        )
+        if not expense:
+            raise HTTPException(status_code=400, detail=f"Failed to add expense: {client.client.getErrors()}")
+        result = {"status": "success", "id": expense.getId(), "message": f"Added {req.amount} for {req.description}"}
+        if idempotency_key:
+            await run_in_threadpool(journal.record, idempotency_key, result)
+        return result
+    except HTTPException:
+        if idempotency_key:
+            await run_in_threadpool(journal.release, idempotency_key)
+        raise
+
+@app.post("/expenses/{expense_id}")
+@profiled("update_expense")
+async def update_expense(expense_id: str, req: UpdateExpenseRequest):
+    """Correct an expense in place; only changed fields are sent to Splitwise."""
+    _require_client()
+    expense, changed = await _call(
+        client.update_expense, expense_id, amount=req.amount, description=req.description,
+        split_map=req.split_map, payer_name=req.payer_name, friend_names=req.friend_names, date=req.date
+    )
+    return {"status": "success", "id": expense.getId() if expense else int(expense_id), "changed": changed}
+
+@app.delete("/expenses/{expense_id}")
+async def delete_expense(expense_id: str):
+    _require_client()
+    await _call(client.delete_expense, expense_id)
+    return {"status": "success", "id": int(expense_id)}
+
+@app.get("/expenses")
+async def list_expenses(request: Request, query: Optional[str] = None, dated_after: Optional[str] = None,
+                        dated_before: Optional[str] = None, min_cost: Optional[float] = None,
+                        max_cost: Optional[float] = None, friend_name: Optional[str] = None,
+                        group_name: Optional[str] = None, payer_name: Optional[str] = None,
+                        limit: int = 20, cursor: Optional[str] = None):
+    """List expenses newest first; `query` searches descriptions. Paginated like the MCP tools."""
+    _require_client()
+    rows, next_cursor = await _call(
+        client.search_expenses, query, dated_after=dated_after, dated_before=dated_before,
+        min_cost=min_cost, max_cost=max_cost, friend_name=friend_name, group_name=group_name,
+        payer_name=payer_name, limit=limit, cursor=cursor
+    )
+    return _hashed_json(request, {"expenses": rows, "next_cursor": next_cursor})
+
+@app.get("/spending_summary")
+@profiled("spending_summary")
+async def spending_summary(request: Request, period: Optional[str] = "month", by: Optional[str] = None,
+                           dated_after: Optional[str] = None, dated_before: Optional[str] = None,
+                           group_name: Optional[str] = None, friend_name: Optional[str] = None,
+                           payer_name: Optional[str] = None, category: Optional[str] = None,
+                           mine: bool = False, limit: int = 200):
+    """Spending totals per period, optionally broken down by category, group, friend or payer."""
+    _require_client()
+    summary = await _call(
+        client.spending_summary, period=period, by=by, dated_after=dated_after, dated_before=dated_before,
+        group_name=group_name, friend_name=friend_name, payer_name=payer_name, category=category,
+        mine=mine, limit=limit
+    )
+    return _hashed_json(request, summary)
+
+# Natural-language commands
+
+async def _run_job(submit, payload):
+    from splitwise_mcp.pipeline import DeadlineExceeded, PipelineSaturated
+    try:
+        job = submit(payload)
+    except PipelineSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(job.future), timeout=max(0.0, job.remaining()))
+    except (asyncio.CancelledError, asyncio.TimeoutError, DeadlineExceeded):
+        job.cancel()
+        raise HTTPException(status_code=504, detail="Command timed out. Please try again.")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job, result
+
+@app.post("/text_command")
+@profiled("text_command")
+async def text_command(req: TextCommandRequest):
+    """Interpret and execute a natural-language command (e.g. "split 50 with Sumeet for dinner")."""
+    _require_client()
+    _, result = await _run_job(_get_pipeline().submit_text, req.text)
+    return {"reply": result}
+
+@app.post("/voice_command")
+@profiled("voice_command")
+async def voice_command(req: VoiceCommandRequest):
+    """Transcribe base64 audio (WAV or MP3) and execute the command in it."""
+    _require_client()
+    job, result = await _run_job(_get_pipeline().submit_audio, req.audio_base64)
+    if job.transcript is None:
+        raise HTTPException(status_code=422, detail="Could not transcribe audio. Please try again with clearer audio.")
+    return {"transcript": job.transcript, "reply": result}
+
+# Scheduled writes
+
+@app.post("/scheduled/recurring")
+async def schedule_recurring_expense(req: RecurringExpenseRequest):
+    item_id = await _call(
+        _get_scheduler().add_recurring, req.description, req.amount, every=req.every, start=req.start,
+        group_name=req.group_name, friend_names=req.friend_names, split_map=req.split_map,
+        payer_name=req.payer_name, exclude_names=req.exclude_names
+    )
+    return {"status": "success", "id": item_id}
+
+@app.post("/scheduled/settlements")
+async def schedule_settlement(req: SettlementRequest):
+    item_id = await _call(
+        _get_scheduler().add_settlement, req.payer_name, req.recipient_name, req.amount,
+        group_name=req.group_name, run_at=req.run_at
+    )
+    return {"status": "success", "id": item_id}
+
+@app.get("/scheduled")
+async def list_scheduled(request: Request):
+    recurring, settlements = await _call(_get_scheduler().store.list)
+    return _hashed_json(request, {"recurring": recurring, "settlements": settlements})
+
+@app.delete("/scheduled/{kind}/{item_id}")
+async def cancel_scheduled(kind: str, item_id: int):
+    if kind not in ("recurring", "settlement"):
+        raise HTTPException(status_code=400, detail="kind must be 'recurring' or 'settlement'.")
+    if not await _call(_get_scheduler().store.cancel, kind, item_id):
+        raise HTTPException(status_code=404, detail=f"No active {kind} with ID {item_id}.")
+    return {"status": "success"}
+
+@app.post("/scheduled/run")
+async def run_scheduled():
+    _require_client()
+    return await _call(_get_scheduler().run_due)
+
+# Credentials
 
 @app.post("/configure")
-def configure(req: ConfigureRequest):
+async def configure(req: ConfigureRequest):
     """Set API Keys manually."""
     try:
-        client.configure(req.consumer_key, req.consumer_secret, req.api_key)
+        await run_in_threadpool(client.configure, req.consumer_key, req.consumer_secret, req.api_key)
+        credentials = {"consumer_key": req.consumer_key, "consumer_secret": req.consumer_secret, "api_key": req.api_key}
+        await run_in_threadpool(sessions.save, sessions.DEFAULT,
+                                {k: v for k, v in credentials.items() if v is not None}, client=client)
         return {"status": "success", "message": "Configured successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/login_with_token")
-def login_with_token(req: LoginTokenRequest):
+async def login_with_token(req: LoginTokenRequest):
     """Log in with OAuth2 token."""
     try:
-        client.configure(access_token=req.access_token)
+        await run_in_threadpool(client.configure, access_token=req.access_token)
+        await run_in_threadpool(sessions.save, sessions.DEFAULT, {"access_token": req.access_token}, client=client)
         return {"status": "success", "message": "Logged in successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/webhooks/splitwise")
+async def splitwise_webhook(req: WebhookRequest, x_webhook_secret: Optional[str] = Header(None)):
+    """Ingest change notifications and update only the affected cache entries."""
+    if not verify_secret(x_webhook_secret):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret.")
+    if not client.client:
+        raise HTTPException(status_code=401, detail="Not configured.")
+
+    try:
+        changes = parse_webhook({"changes": req.changes, "notifications": req.notifications})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    applied = await _call(client.apply_changes, changes)
+    return {"status": "success", "applied": applied}
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import unittest
+from splitwise_mcp.admission import AdmissionController, AdmissionMiddleware, Rejected, admitted, tenant_of
+
+def scope(tenant, path="/add_expense"):
+    return {"type": "http", "path": path, "headers": [(b"x-tenant-id", tenant.encode())], "client": ("10.0.0.1", 5000)}
+
+async def call(app, s):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(s, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+class TestAdmission(unittest.TestCase):
+    def test_tenant_key(self):
+        self.assertEqual(tenant_of(scope("acme"), trusted_proxies="10.0.0.0/8"), "acme")
+        self.assertEqual(tenant_of({"headers": [], "client": ("1.2.3.4", 1)}), "ip:1.2.3.4")
+        self.assertTrue(tenant_of({"headers": [(b"authorization", b"Bearer x")]}).startswith("auth:"))
+
+    def test_tenant_header_needs_a_trusted_proxy(self):
+        # A direct caller can't pick its tenant (and a fresh quota) by header
+        self.assertEqual(tenant_of(scope("acme"), trusted_proxies=""), "ip:10.0.0.1")
+        self.assertEqual(tenant_of(scope("acme"), trusted_proxies="192.168.0.0/16"), "ip:10.0.0.1")
+        forwarded = {"headers": [(b"x-forwarded-for", b"spoofed, 8.8.8.8")], "client": None}
+        self.assertEqual(tenant_of(forwarded, trusted_proxies="unix"), "ip:8.8.8.8")
+        self.assertEqual(tenant_of(forwarded, trusted_proxies=""), "anonymous")
+
+    def test_metrics_need_the_admin_token(self):
+        async def app(s, receive, send):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def run():
+            path = "/admission/metrics"
+            closed = AdmissionMiddleware(app, AdmissionController(), admin_token="")
+            self.assertEqual((await call(closed, scope("acme", path=path)))[0], 404)
+            guarded = AdmissionMiddleware(app, AdmissionController(), admin_token="s3cret")
+            self.assertEqual((await call(guarded, scope("acme", path=path)))[0], 401)
+            garbled = scope("acme", path=path)
+            garbled["headers"].append((b"authorization", "Bearer s3cr\u00e9t".encode("latin-1")))
+            self.assertEqual((await call(guarded, garbled))[0], 401)
+            authed = scope("acme", path=path)
+            authed["headers"].append((b"authorization", b"Bearer s3cret"))
+            self.assertEqual((await call(guarded, authed))[0], 200)
+
+        asyncio.run(run())
+
+    def test_rate_limit_returns_retry_after(self):
+        now = [0.0]
+        controller = AdmissionController(tenant_rate=1, tenant_burst=2, clock=lambda: now[0])
+
+        async def run():
+            for _ in range(2):
+                controller.release(await controller.acquire("noisy"), 0.01)
+            with self.assertRaises(Rejected) as ctx:
+                await controller.acquire("noisy")
+            self.assertEqual(ctx.exception.status, 429)
+            self.assertGreater(ctx.exception.retry_after, 0)
+            # Another tenant is unaffected
+            controller.release(await controller.acquire("quiet"), 0.01)
+
+        asyncio.run(run())
+
+    def test_fair_queueing_across_tenants(self):
+        controller = AdmissionController(max_concurrent=1, tenant_concurrency=1, tenant_rate=1000,
+                                         tenant_burst=1000, tenant_queue=100, queue_timeout=5)
+        order = []
+
+        async def request(tenant):
+            state = await controller.acquire(tenant)
+            order.append(tenant)
+            await asyncio.sleep(0)
+            controller.release(state, 0.001)
+
+        async def run():
+            # A noisy tenant queues many requests before a quiet one arrives
+            tasks = [asyncio.create_task(request("noisy")) for _ in range(6)]
+            await asyncio.sleep(0)
+            tasks += [asyncio.create_task(request("quiet")) for _ in range(2)]
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        # The quiet tenant is interleaved rather than waiting behind all six
+        self.assertLess(order.index("quiet"), 4)
+        self.assertEqual(order.count("quiet"), 2)
+
+    def test_queue_overflow_sheds_with_503(self):
+        controller = AdmissionController(max_concurrent=1, tenant_concurrency=1, tenant_rate=1000,
+                                         tenant_burst=1000, tenant_queue=1, queue_timeout=5)
+        gates = []
+
+        async def slow_app(s, receive, send):
+            await gates[0].wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        app = AdmissionMiddleware(slow_app, controller, admin_token="s3cret", trusted_proxies="10.0.0.0/8")
+
+        async def run():
+            gates.append(asyncio.Event())
+            first = asyncio.create_task(call(app, scope("noisy")))
+            second = asyncio.create_task(call(app, scope("noisy")))
+            await asyncio.sleep(0.01)
+            status, headers, _ = await call(app, scope("noisy"))
+            self.assertEqual(status, 503)
+            self.assertIn(b"retry-after", headers)
+            gates[0].set()
+            self.assertEqual((await first)[0], 200)
+            self.assertEqual((await second)[0], 200)
+
+            metrics_request = scope("noisy", path="/admission/metrics")
+            metrics_request["headers"].append((b"authorization", b"Bearer s3cret"))
+            status, _, body = await call(app, metrics_request)
+            metrics = json.loads(body)
+            self.assertEqual(metrics["tenants"]["noisy"]["rejected"]["queue"], 1)
+            self.assertEqual(metrics["inflight"], 0)
+
+        asyncio.run(run())
+
+    def test_tools_on_a_stream_hold_slots_while_they_run(self):
+        # On SSE the POST carrying a tool call is answered before the tool
+        # runs, so the tool itself has to take the slot.
+        controller = AdmissionController(max_concurrent=10, tenant_concurrency=1, tenant_rate=1000,
+                                         tenant_burst=1000, tenant_queue=1, queue_timeout=5)
+        running, peak = [0], [0]
+
+        @admitted()
+        async def tool(n):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return n
+
+        results = []
+
+        async def sse_app(s, receive, send):
+            results.extend(await asyncio.gather(tool(1), tool(2), tool(3)))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        app = AdmissionMiddleware(sse_app, controller, trusted_proxies="10.0.0.0/8")
+        asyncio.run(call(app, scope("acme", path="/sse")))
+        self.assertEqual(peak[0], 1)
+        # One runs, one queues, the third is shed
+        self.assertEqual(results[:2], [1, 2])
+        self.assertIn("Server busy", results[2])
+        self.assertEqual(controller.metrics()["inflight"], 0)
+        # Outside a stream (stdio) tools just run
+        self.assertEqual(asyncio.run(tool(4)), 4)
+
+if __name__ == '__main__':
+    unittest.main()
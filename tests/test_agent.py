@@ -0,0 +1,155 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.agent.client import GeminiSplitwiseAgent
+from splitwise_mcp.resilience import UpstreamTimeout, deadline_scope
+
+def make_friend(fid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = fid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    return f
+
+def make_response(*parts):
+    response = MagicMock()
+    response.candidates[0].content.parts = list(parts)
+    return response
+
+def call_part(name, **args):
+    part = MagicMock()
+    part.text = None
+    part.function_call.name = name
+    part.function_call.args = args
+    return part
+
+def text_part(text):
+    part = MagicMock()
+    part.text = text
+    part.function_call = None
+    return part
+
+class TestAgentTurns(unittest.TestCase):
+    def setUp(self):
+        self.env = patch.dict('os.environ', {'GEMINI_API_KEY': 'fake', 'SPLITWISE_API_KEY': 'fake_key'})
+        self.env.start()
+        self.genai = patch('splitwise_mcp.agent.client.genai')
+        self.genai.start()
+        self.splitwise = patch('splitwise_mcp.client.Splitwise')
+        MockSplitwise = self.splitwise.start()
+
+        sdk = MockSplitwise.return_value
+        sdk.getFriends.return_value = [make_friend(101, "Sumeet", "Singh"), make_friend(102, "Mridul", "Kumar")]
+        sdk.getGroups.return_value = []
+        me = MagicMock()
+        me.getId.return_value = 999
+        sdk.getCurrentUser.return_value = me
+        created = MagicMock()
+        created.getId.return_value = 4242
+        sdk.createExpense.return_value = (created, None)
+        self.sdk = sdk
+
+        self.agent = GeminiSplitwiseAgent()
+        self.chat = self.agent.chat
+
+    def tearDown(self):
+        self.splitwise.stop()
+        self.genai.stop()
+        self.env.stop()
+
+    def test_read_only_tool_answered_without_second_model_call(self):
+        self.chat.send_message.return_value = make_response(call_part("_list_friends_impl"))
+        result = self.agent.process_input("who are my friends?")
+        self.assertEqual(result["type"], "text")
+        self.assertIn("Sumeet Singh", result["content"])
+        self.assertEqual(self.chat.send_message.call_count, 1)
+
+    def test_write_confirmation_rendered_locally(self):
+        self.chat.send_message.return_value = make_response(
+            call_part("_add_expense_impl", amount="50", description="Dinner", friend_names=["Sumeet"])
+        )
+        reply = self.agent.process_and_execute("split 50 with sumeet for dinner")
+        self.assertIn("Added 'Dinner'", reply)
+        self.assertIn("4242", reply)
+        self.assertEqual(self.chat.send_message.call_count, 1)
+
+        # The owed function response rides along with the next message.
+        self.chat.send_message.return_value = make_response(text_part("Hi!"))
+        self.agent.process_input("thanks")
+        sent = self.chat.send_message.call_args.args[0]
+        self.assertEqual(len(sent), 2)
+
+    def test_parallel_function_calls(self):
+        self.chat.send_message.return_value = make_response(
+            call_part("_add_expense_impl", amount="20", description="Cab", friend_names=["Sumeet"]),
+            call_part("_add_expense_impl", amount="30", description="Lunch", friend_names=["Mridul"]),
+        )
+        result = self.agent.process_input("cab 20 with sumeet and lunch 30 with mridul")
+        self.assertEqual(len(result["calls"]), 2)
+        self.agent.execute_tools_and_reply(result["calls"])
+        self.assertEqual(self.sdk.createExpense.call_count, 2)
+        self.assertEqual(self.chat.send_message.call_count, 1)
+
+    def test_near_miss_name_confirmed_locally(self):
+        self.chat.send_message.return_value = make_response(
+            call_part("_add_expense_impl", amount="50", description="Dinner", friend_names=["Humeet"])
+        )
+        result = self.agent.process_input("split 50 with humeet")
+        self.assertEqual(result["type"], "text")
+        self.assertIn("Sumeet Singh", result["content"])
+
+        result = self.agent.process_input("yes")
+        self.assertEqual(result["type"], "confirmation_required")
+        self.assertEqual(result["tool_args"]["friend_names"], ["Sumeet Singh"])
+        self.assertEqual(self.chat.send_message.call_count, 1)
+
+    def test_streaming_reports_events_and_executes_call(self):
+        self.chat.send_message_stream.return_value = iter([
+            make_response(text_part("Adding ")),
+            make_response(call_part("_add_expense_impl", amount="50", description="Dinner", friend_names=["Sumeet"])),
+            make_response(text_part("done.")),
+        ])
+        events = []
+        reply = self.agent.process_and_execute_stream("split 50 with sumeet", lambda kind, payload: events.append((kind, payload)))
+        self.assertEqual(events, [("text", "Adding "), ("tool", "add_expense"), ("text", "done.")])
+        self.assertIn("Added 'Dinner'", reply)
+        self.sdk.createExpense.assert_called_once()
+        self.chat.send_message.assert_not_called()
+
+    def test_streamed_writes_run_in_order_after_the_stream(self):
+        def stream():
+            yield make_response(call_part("_add_expense_impl", amount="20", description="Cab", friend_names=["Sumeet"]))
+            self.assertFalse(self.sdk.createExpense.called)
+            yield make_response(call_part("_add_expense_impl", amount="30", description="Lunch", friend_names=["Mridul"]))
+
+        self.chat.send_message_stream.return_value = stream()
+        self.agent.process_and_execute_stream("cab 20 with sumeet and lunch 30 with mridul")
+        descriptions = [c.args[0].getDescription() for c in self.sdk.createExpense.call_args_list]
+        self.assertEqual(descriptions, ["Cab", "Lunch"])
+
+    def test_streamed_clarification_holds_back_every_write(self):
+        self.chat.send_message_stream.return_value = iter([
+            make_response(call_part("_add_expense_impl", amount="20", description="Cab", friend_names=["Sumeet"])),
+            make_response(call_part("_add_expense_impl", amount="30", description="Lunch", friend_names=["Humeet"])),
+        ])
+        reply = self.agent.process_and_execute_stream("cab 20 with sumeet and lunch 30 with humeet")
+        self.assertIn("Sumeet Singh", reply)
+        self.sdk.createExpense.assert_not_called()
+
+    def test_timed_out_turn_is_rolled_back(self):
+        before = [MagicMock(name="earlier turn")]
+        self.chat.get_history.return_value = before
+        self.agent._defer_response("_list_friends_impl", "Sumeet Singh")
+
+        def slow_turn(message):
+            time.sleep(0.5)
+            before.append(message)  # what the SDK does once the reply lands
+
+        self.chat.send_message.side_effect = slow_turn
+        with deadline_scope(time.monotonic() + 0.05), self.assertRaises(UpstreamTimeout):
+            self.agent._send("split 50 with sumeet")
+        self.assertEqual(self.agent.client.chats.create.call_args.kwargs["history"], before[:1])
+        self.assertEqual(len(self.agent._pending_responses), 1)
+
+if __name__ == '__main__':
+    unittest.main()
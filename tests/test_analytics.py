@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.analytics import SpendingCube
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.expense_index import ExpenseIndex
+
+def make_expense(expense_id, cost, date, payer=999, others=(101,), group_id=None, category=None,
+                 currency="USD", payment=False):
+    users = []
+    for uid in (payer,) + tuple(others):
+        u = MagicMock()
+        u.getId.return_value = uid
+        u.getPaidShare.return_value = str(cost) if uid == payer else "0.00"
+        u.getOwedShare.return_value = str(cost / (len(others) + 1))
+        users.append(u)
+    e = MagicMock()
+    e.getId.return_value = expense_id
+    e.getDescription.return_value = f"Expense {expense_id}"
+    e.getCost.return_value = str(cost)
+    e.getCurrencyCode.return_value = currency
+    e.getDate.return_value = date
+    e.getGroupId.return_value = group_id
+    e.getUsers.return_value = users
+    if category:
+        c = MagicMock()
+        c.getName.return_value = category
+        e.getCategory.return_value = c
+    else:
+        e.getCategory.return_value = None
+    e.getPayment.return_value = payment
+    e.getUpdatedAt.return_value = date
+    e.getDeletedAt.return_value = None
+    return e
+
+def make_friend(uid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = uid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    f.getEmail.return_value = None
+    f.getBalances.return_value = []
+    return f
+
+class TestSpendingCube(unittest.TestCase):
+    def setUp(self):
+        self.index = ExpenseIndex()
+        self.index.upsert([
+            make_expense(1, 30.0, "2024-01-05T09:00:00Z", category="Dining out"),
+            make_expense(2, 90.0, "2024-01-20T20:00:00Z", others=(102,), category="Groceries"),
+            make_expense(3, 1200.0, "2024-02-01T00:00:00Z", payer=101, others=(999,), group_id=500, category="Rent"),
+            make_expense(4, 20.0, "2024-04-02T12:00:00Z", category="Dining out", currency="EUR"),
+            make_expense(5, 50.0, "2024-02-10T00:00:00Z", payer=101, others=(999,), payment=True),
+        ])
+        self.cube = SpendingCube(self.index)
+        self.cube.refresh()
+
+    def test_totals_per_period_and_currency(self):
+        rows = self.cube.summarize(period="month")
+        self.assertEqual(
+            [(r["period"], r["currency"], r["total"], r["count"]) for r in rows],
+            [("2024-01", "USD", 120.0, 2), ("2024-02", "USD", 1200.0, 1), ("2024-04", "EUR", 20.0, 1)],
+        )
+        self.assertEqual([r["period"] for r in self.cube.summarize(period="quarter")], ["2024-Q1", "2024-Q2"])
+        self.assertEqual([r["period"] for r in self.cube.summarize(period="week")][:1], ["2024-01-01"])
+        self.assertEqual(self.cube.summarize(period=None, dated_before="2024-01-31")[0]["total"], 120.0)
+
+    def test_breakdowns_and_filters(self):
+        rows = self.cube.summarize(period="year", by="category", dated_after="2024-01-01", dated_before="2024-03-31")
+        self.assertEqual([(r["category"], r["total"]) for r in rows],
+                         [("Rent", 1200.0), ("Groceries", 90.0), ("Dining out", 30.0)])
+        self.assertEqual(self.cube.summarize(period=None, category="dining OUT")[0]["total"], 30.0)
+        self.assertEqual(self.cube.summarize(period=None, group_id=500)[0]["total"], 1200.0)
+        self.assertEqual(self.cube.summarize(period=None, friend_id=102)[0]["total"], 90.0)
+
+        by_friend = self.cube.summarize(period=None, by="friend", dated_before="2024-01-31")
+        self.assertEqual({(r["friend"], r["total"]) for r in by_friend}, {(999, 60.0), (101, 15.0), (102, 45.0)})
+        mine = self.cube.summarize(period=None, me_id=999, dated_before="2024-02-28")
+        self.assertEqual(mine[0]["total"], 660.0)
+
+    def test_payments_are_not_spending(self):
+        totals = sum(r["total"] for r in self.cube.summarize(period=None, by="payer"))
+        self.assertEqual(totals, 1340.0)
+
+    def test_incremental_refresh(self):
+        self.assertFalse(self.cube.refresh())
+        self.index.upsert([make_expense(2, 10.0, "2024-01-20T20:00:00Z", category="Groceries"),
+                           make_expense(6, 5.0, "2024-01-21T08:00:00Z", category="Groceries")])
+        self.index.remove(3)
+        self.assertTrue(self.cube.refresh())
+        self.assertEqual(len(self.cube), 4)
+        rows = self.cube.summarize(period="month", by="category", dated_before="2024-02-28")
+        self.assertEqual([(r["category"], r["total"], r["count"]) for r in rows],
+                         [("Dining out", 30.0, 1), ("Groceries", 15.0, 2)])
+        self.assertEqual(self.cube.summarize(period=None, friend_id=102), [])
+
+    def test_rejects_unknown_period(self):
+        with self.assertRaises(ValueError):
+            self.cube.summarize(period="fortnight")
+
+class TestClientSpendingSummary(unittest.TestCase):
+    @patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'})
+    @patch('splitwise_mcp.client.Splitwise')
+    def test_names_and_totals(self, mock_splitwise):
+        client = SplitwiseClient()
+        sdk = client.client
+        sdk.getCurrentUser.return_value = make_friend(999, "Me")
+        sdk.getFriends.return_value = [make_friend(101, "Alice"), make_friend(102, "Bob")]
+        sdk.getGroups.return_value = []
+        sdk.getExpenses.return_value = [
+            make_expense(1, 30.0, "2024-01-05T09:00:00Z"),
+            make_expense(2, 90.0, "2024-01-20T20:00:00Z", payer=101, others=(102,)),
+        ]
+
+        summary = client.spending_summary(period=None, by="payer")
+        self.assertEqual([(r["payer"], r["total"]) for r in summary["rows"]], [("Alice", 90.0), ("me", 30.0)])
+        self.assertEqual(summary["totals"], {"USD": 120.0})
+        self.assertFalse(summary["truncated"])
+
+        summary = client.spending_summary(period="month", friend_name="Bob", limit=1)
+        self.assertEqual(summary["rows"][0]["total"], 90.0)
+        with self.assertRaises(ValueError):
+            client.spending_summary(friend_name="Zed")
+
+if __name__ == '__main__':
+    unittest.main()
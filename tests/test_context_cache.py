@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.agent.client import GeminiSplitwiseAgent
+from splitwise_mcp.agent.context_cache import ContextCache, LocalCacheBackend
+
+def make_friend(fid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = fid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    f.getBalances.return_value = []
+    return f
+
+class TestContextCache(unittest.TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.backend = LocalCacheBackend()
+        self.cache = ContextCache(self.backend, "model", ttl=100, min_chars=10, clock=lambda: self.now[0])
+        self.builds = 0
+        self.prefix = "rules and roster"
+
+    def build(self):
+        self.builds += 1
+        return self.prefix, ["tools"]
+
+    def test_handle_reused_until_prefix_changes(self):
+        first = self.cache.handle(1, self.build)
+        self.assertIn(first, self.backend.entries)
+        self.assertEqual(self.cache.handle(1, self.build), first)
+        self.assertEqual(self.builds, 1)
+
+        # New directory version, same prefix (e.g. only balances changed)
+        self.assertEqual(self.cache.handle(2, self.build), first)
+        self.assertEqual(self.cache.creates, 1)
+
+        self.prefix = "rules and a renamed roster"
+        second = self.cache.handle(3, self.build)
+        self.assertNotEqual(second, first)
+        self.assertEqual(list(self.backend.entries), [second])
+
+    def test_renewed_before_expiry(self):
+        first = self.cache.handle(1, self.build)
+        self.now[0] = 95.0
+        second = self.cache.handle(1, self.build)
+        self.assertNotEqual(second, first)
+        self.assertEqual(self.cache.creates, 2)
+
+    def test_short_or_rejected_prefix_stays_inline(self):
+        self.prefix = "short"
+        self.assertIsNone(self.cache.handle(1, self.build))
+        self.assertEqual(self.backend.entries, {})
+
+        self.prefix = "long enough but rejected"
+        self.backend.create = MagicMock(side_effect=RuntimeError("below minimum token count"))
+        self.assertIsNone(self.cache.handle(2, self.build))
+        self.assertIsNone(self.cache.handle(2, self.build))
+        self.assertEqual((self.cache.failures, self.backend.create.call_count), (1, 1))
+
+class TestAgentPrefix(unittest.TestCase):
+    def setUp(self):
+        env = patch.dict('os.environ', {'GEMINI_API_KEY': 'fake', 'SPLITWISE_API_KEY': 'fake_key'})
+        env.start()
+        self.addCleanup(env.stop)
+        genai = patch('splitwise_mcp.agent.client.genai')
+        self.genai = genai.start()
+        self.addCleanup(genai.stop)
+        splitwise = patch('splitwise_mcp.client.Splitwise')
+        self.sdk = splitwise.start().return_value
+        self.addCleanup(splitwise.stop)
+        self.sdk.getFriends.return_value = [make_friend(101, "Sumeet", "Singh")]
+        self.sdk.getGroups.return_value = []
+
+        self.backend = LocalCacheBackend()
+        self.agent = GeminiSplitwiseAgent(context_cache=ContextCache(self.backend, "gemini", min_chars=100))
+        self.chats = self.genai.Client.return_value.chats
+
+    def test_turns_use_cached_prefix_and_follow_roster_changes(self):
+        self.agent._send("hi")
+        config = self.chats.create.call_args.kwargs["config"]
+        self.assertEqual(config.cached_content, self.agent._cached_name)
+        self.assertIsNone(config.system_instruction)
+        instruction, tools = self.backend.entries[self.agent._cached_name][1:3]
+        self.assertIn("Sumeet Singh (ID: 101)", instruction)
+        self.assertEqual(tools[0].function_declarations[0].name, "_add_expense_impl")
+
+        created = self.chats.create.call_count
+        self.agent._send("again")
+        self.assertEqual(self.chats.create.call_count, created)
+
+        self.sdk.getFriends.return_value.append(make_friend(102, "Mridul", "Kumar"))
+        self.agent.splitwise.directory.refresh(force=True)
+        self.agent._send("and now")
+        self.assertEqual(self.chats.create.call_count, created + 1)
+        self.assertIn("history", self.chats.create.call_args.kwargs)
+        self.assertIn("Mridul Kumar", self.backend.entries[self.agent._cached_name][1])
+        self.assertEqual(len(self.backend.entries), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock
+from splitwise_mcp.directory import Directory
+
+def make_friend(fid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = fid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    return f
+
+def make_group(gid, name):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    return g
+
+class TestDirectory(unittest.TestCase):
+    def setUp(self):
+        self.friends = [make_friend(101, "Sumeet", "Singh"), make_friend(102, "Mridul", "Kumar")]
+        self.friends += [make_friend(1000 + i, f"Person{i}", f"Family{i}") for i in range(300)]
+        self.groups = [make_group(500, "Apartment"), make_group(501, "Goa Trip")]
+        self.fetch_friends = MagicMock(side_effect=lambda: self.friends)
+        self.fetch_groups = MagicMock(side_effect=lambda: self.groups)
+        self.directory = Directory(self.fetch_friends, self.fetch_groups, ttl=300)
+
+    def test_candidates_are_top_k(self):
+        friends, groups = self.directory.candidates("split 50 with sumeet in the apartment group", k_friends=3)
+        self.assertLessEqual(len(friends), 3)
+        self.assertEqual(friends[0][2], 101)
+        self.assertEqual(groups[0][2], 500)
+
+    def test_fetches_once_within_ttl(self):
+        self.directory.friends()
+        self.directory.groups()
+        self.directory.name_index()
+        self.assertEqual(self.fetch_friends.call_count, 1)
+
+    def test_version_and_index_follow_changes(self):
+        index = self.directory.name_index()
+        version = self.directory.version
+
+        # A refresh with identical contents keeps the version and the index.
+        self.directory.invalidate()
+        self.assertIs(self.directory.name_index(), index)
+        self.assertEqual(self.directory.version, version)
+
+        self.friends = self.friends + [make_friend(103, "Priya", "Shah")]
+        self.directory.invalidate()
+        self.assertIsNot(self.directory.name_index(), index)
+        self.assertEqual(self.directory.version, version + 1)
+        friends, _ = self.directory.candidates("Priya paid for lunch")
+        self.assertEqual(friends[0][2], 103)
+
+if __name__ == '__main__':
+    unittest.main()
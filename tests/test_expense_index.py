@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.expense_index import ExpenseIndex, ExpenseSync
+
+def make_expense(expense_id, description, cost, date, payer=999, others=(101,), group_id=None):
+    users = []
+    for uid in (payer,) + tuple(others):
+        u = MagicMock()
+        u.getId.return_value = uid
+        u.getPaidShare.return_value = str(cost) if uid == payer else "0.00"
+        u.getOwedShare.return_value = str(cost / (len(others) + 1))
+        users.append(u)
+    e = MagicMock()
+    e.getId.return_value = expense_id
+    e.getDescription.return_value = description
+    e.getCost.return_value = str(cost)
+    e.getCurrencyCode.return_value = "USD"
+    e.getDate.return_value = date
+    e.getGroupId.return_value = group_id
+    e.getUsers.return_value = users
+    e.getCategory.return_value = None
+    e.getUpdatedAt.return_value = date
+    e.getDeletedAt.return_value = None
+    return e
+
+class TestExpenseIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ExpenseIndex()
+        self.index.upsert([
+            make_expense(1, "Cab to airport", 30.0, "2024-03-05T09:00:00Z"),
+            make_expense(2, "Dinner", 80.0, "2024-03-05T20:00:00Z", others=(102,)),
+            make_expense(3, "Taxi home", 12.5, "2024-03-06T01:00:00Z", payer=101, others=(999,)),
+            make_expense(4, "Rent", 1200.0, "2024-03-01T00:00:00Z", group_id=500),
+        ])
+
+    def test_full_text_prefix_search(self):
+        rows, _ = self.index.query(text="cab")
+        self.assertEqual([r["id"] for r in rows], [1])
+        rows, _ = self.index.query(text="tax")
+        self.assertEqual([r["id"] for r in rows], [3])
+
+    def test_range_and_participant_filters(self):
+        rows, _ = self.index.query(dated_after="2024-03-05", dated_before="2024-03-05")
+        self.assertEqual([r["id"] for r in rows], [2, 1])
+        rows, _ = self.index.query(min_cost=20, max_cost=100)
+        self.assertEqual({r["id"] for r in rows}, {1, 2})
+        rows, _ = self.index.query(friend_id=102)
+        self.assertEqual([r["id"] for r in rows], [2])
+        rows, _ = self.index.query(payer_id=101)
+        self.assertEqual([r["id"] for r in rows], [3])
+        rows, _ = self.index.query(group_id=500)
+        self.assertEqual([r["id"] for r in rows], [4])
+
+    def test_pagination_and_streaming(self):
+        page1, cursor = self.index.query(limit=3)
+        self.assertEqual([r["id"] for r in page1], [3, 2, 1])
+        page2, cursor2 = self.index.query(limit=3, cursor=cursor)
+        self.assertEqual([r["id"] for r in page2], [4])
+        self.assertIsNone(cursor2)
+        self.assertEqual([r["id"] for r in self.index.iter_query(page_size=1)], [3, 2, 1, 4])
+
+    def test_update_and_delete(self):
+        self.index.upsert([make_expense(1, "Uber to airport", 30.0, "2024-03-05T09:00:00Z")])
+        self.assertEqual(self.index.query(text="cab")[0], [])
+        self.assertEqual([r["id"] for r in self.index.query(text="uber")[0]], [1])
+
+        deleted = make_expense(2, "Dinner", 80.0, "2024-03-05T20:00:00Z")
+        deleted.getDeletedAt.return_value = "2024-03-07T00:00:00Z"
+        self.index.upsert([deleted])
+        self.assertEqual(self.index.query(text="dinner")[0], [])
+
+    def test_sync_uses_updated_after(self):
+        sdk = MagicMock()
+        sdk.getExpenses.return_value = [make_expense(9, "Coffee", 4.0, "2024-03-08T08:00:00Z")]
+        sync = ExpenseSync(self.index)
+        self.assertEqual(sync.sync(sdk), 1)
+        self.assertIsNone(sdk.getExpenses.call_args.kwargs["updated_after"])
+
+        # Throttled until forced; the second pull only asks for newer changes.
+        self.assertEqual(sync.sync(sdk), 0)
+        sync.sync(sdk, force=True)
+        self.assertIsNotNone(sdk.getExpenses.call_args.kwargs["updated_after"])
+
+class TestIndexOwnership(unittest.TestCase):
+    @patch('splitwise_mcp.client.Splitwise')
+    def test_new_credentials_start_from_an_empty_index(self, mock_splitwise):
+        db = os.path.join(tempfile.mkdtemp(), "expenses.db")
+        with patch.dict('os.environ', {'SPLITWISE_API_KEY': 'alice_key', 'SPLITWISE_EXPENSE_DB': db}):
+            client = SplitwiseClient()
+            client.expense_index.upsert([make_expense(1, "Alice's rent", 900.0, "2024-03-01T00:00:00Z")])
+            client.expense_index.set_meta("updated_after", "2024-03-02T00:00:00Z")
+
+            # A restart with the same credentials keeps the index
+            client = SplitwiseClient()
+            self.assertEqual([r["id"] for r in client.expense_index.query(text="rent")[0]], [1])
+
+            client.configure(api_key="bob_key")
+            self.assertEqual(client.expense_index.query()[0], [])
+            self.assertIsNone(client.expense_index.get_meta("updated_after"))
+
+if __name__ == '__main__':
+    unittest.main()
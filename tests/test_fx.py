@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.fx import FakeRateSource, FxTable
+
+RATES = {
+    "2026-03-02": {"USD": 1.10, "GBP": 0.85, "INR": 90.0},
+    "2026-03-03": {"USD": 1.20, "GBP": 0.80, "INR": 96.0},
+}
+
+class TestFxTable(unittest.TestCase):
+    def setUp(self):
+        self.source = FakeRateSource(RATES)
+        self.fx = FxTable(self.source)
+
+    def test_cross_rates_by_day(self):
+        self.assertAlmostEqual(self.fx.rate("EUR", "USD", "2026-03-02"), 1.10)
+        self.assertAlmostEqual(self.fx.rate("USD", "GBP", "2026-03-03"), 0.80 / 1.20)
+        self.assertAlmostEqual(self.fx.convert(12, "usd", "inr", "2026-03-03T10:00:00Z"), 12 * 80.0)
+        # A day without its own rates is served from the last business day, fetched once
+        self.assertAlmostEqual(self.fx.rate("EUR", "USD", "2026-03-07"), 1.20)
+        calls = self.source.calls
+        self.assertAlmostEqual(self.fx.rate("EUR", "GBP", "2026-03-07"), 0.80)
+        self.assertEqual(self.source.calls, calls)
+        with self.assertRaises(ValueError):
+            self.fx.rate("EUR", "XYZ", "2026-03-02")
+
+    def test_convert_many_matches_single_lookups(self):
+        amounts = [10.0, 250.0, 3.5, 99.99]
+        froms = ["USD", "GBP", "INR", "EUR"]
+        days = ["2026-03-02", "2026-03-03", "2026-03-02", "2026-03-03"]
+        converted = self.fx.convert_many(amounts, froms, "EUR", days)
+        expected = [self.fx.convert(a, f, "EUR", d) for a, f, d in zip(amounts, froms, days)]
+        for got, want in zip(converted, expected):
+            self.assertAlmostEqual(got, want)
+
+    def test_convert_many_rejects_missing_rates(self):
+        fx = FxTable(FakeRateSource({"2026-03-02": {"USD": 1.10}, "2026-03-03": {"USD": 1.20, "JPY": 180.0}}))
+        fx.rate("EUR", "JPY", "2026-03-03")
+        for numpy in (True, False):
+            with self.subTest(numpy=numpy), patch.dict("sys.modules", {} if numpy else {"numpy": None}):
+                with self.assertRaisesRegex(ValueError, "No JPY/EUR rate for 2026-03-02"):
+                    fx.convert_many([1.0, 2.0], ["JPY", "JPY"], "EUR", ["2026-03-03", "2026-03-02"])
+                self.assertEqual(fx.convert_many([5.0], "EUR", "EUR", "2026-03-02"), [5.0])
+
+    def test_rate_reads_the_row_it_resolved(self):
+        rates = dict(RATES, **{"2026-03-01": {"USD": 1.00, "GBP": 0.90, "INR": 85.0}})
+
+        class Racing(FxTable):
+            raced = True
+
+            def _row_for(self, day):
+                row = super()._row_for(day)
+                if not self.raced:
+                    # Another thread fetches an earlier day, shifting the rows
+                    self.raced = True
+                    other = threading.Thread(target=super()._row_for, args=("2026-03-01",))
+                    other.start()
+                    other.join(0.2)
+                return row
+
+        fx = Racing(FakeRateSource(rates))
+        fx.rate("EUR", "USD", "2026-03-03")
+        fx.raced = False
+        self.assertAlmostEqual(fx.rate("EUR", "USD", "2026-03-02"), 1.10)
+        self.assertAlmostEqual(fx.rate("EUR", "USD", "2026-03-01"), 1.00)
+
+    def test_table_persists(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fx.json")
+            FxTable(self.source, path=path).rate("EUR", "USD", "2026-03-02")
+            calls = self.source.calls
+            reloaded = FxTable(self.source, path=path)
+            self.assertAlmostEqual(reloaded.rate("GBP", "USD", "2026-03-02"), 1.10 / 0.85)
+            self.assertEqual(self.source.calls, calls)
+
+class TestCurrencyExpense(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sdk = patch('splitwise_mcp.client.Splitwise')
+        sdk.start()
+        self.addCleanup(sdk.stop)
+        self.client = SplitwiseClient()
+        self.client.fx = FxTable(FakeRateSource(RATES))
+
+        me = MagicMock()
+        me.getId.return_value = 999
+        friend = MagicMock()
+        friend.getId.return_value = 101
+        friend.getFirstName.return_value = "Sumeet"
+        friend.getLastName.return_value = ""
+        self.client.client.getCurrentUser.return_value = me
+        self.client.client.getFriends.return_value = [friend]
+        self.client.client.getGroups.return_value = []
+        self.client.client.createExpense.return_value = (MagicMock(), None)
+
+    def test_currency_is_sent(self):
+        self.client.add_expense("50", "Dinner", ["Sumeet"], currency="eur")
+        expense = self.client.client.createExpense.call_args[0][0]
+        self.assertEqual(expense.getCurrencyCode(), "EUR")
+        self.assertEqual(expense.getCost(), "50.00")
+
+    def test_convert_to(self):
+        self.client.add_expense("50", "Dinner", ["Sumeet"], split_map={"me": "20", "Sumeet": "30"},
+                                date="2026-03-02", currency="EUR", convert_to="USD")
+        expense = self.client.client.createExpense.call_args[0][0]
+        self.assertEqual(expense.getCurrencyCode(), "USD")
+        self.assertEqual(expense.getCost(), "55.00")
+        self.assertEqual(sorted(u.getOwedShare() for u in expense.getUsers()), ["22.00", "33.00"])
+        self.assertIn("50.00 EUR", expense.getDetails())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+
+def make_friend(uid, first, last="", balance=None):
+    f = MagicMock()
+    f.getId.return_value = uid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    f.getEmail.return_value = None
+    balances = []
+    if balance is not None:
+        b = MagicMock()
+        b.getCurrencyCode.return_value = "USD"
+        b.getAmount.return_value = balance
+        balances.append(b)
+    f.getBalances.return_value = balances
+    return f
+
+def make_group(gid, name, members):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    g.getMembers.return_value = members
+    return g
+
+class TestListing(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sdk = patch('splitwise_mcp.client.Splitwise')
+        sdk.start()
+        self.addCleanup(sdk.stop)
+
+        self.client = SplitwiseClient()
+        sdk_client = self.client.client
+        self.friends = [
+            make_friend(101, "Sumeet", "Singh", "12.50"),
+            make_friend(102, "Mridul", "Kumar", "0.0"),
+            make_friend(103, "Anya", "Sharma"),
+            make_friend(104, "Sam", "Lee", "-4"),
+        ]
+        sdk_client.getFriends.return_value = self.friends
+        sdk_client.getGroups.return_value = [
+            make_group(500, "Apartment", [self.friends[0], self.friends[2]]),
+            make_group(501, "Trip", [self.friends[0], self.friends[3]]),
+        ]
+        sdk_client.getCurrentUser.return_value = make_friend(999, "Me")
+
+    def test_pages_follow_name_order(self):
+        page, cursor = self.client.list_friends(limit=3)
+        self.assertEqual([f["name"] for f in page], ["Anya Sharma", "Mridul Kumar", "Sam Lee"])
+        self.assertEqual(page[2]["balance"], {"USD": -4.0})
+        self.assertNotIn("balance", page[1])
+
+        page, cursor = self.client.list_friends(limit=3, cursor=cursor)
+        self.assertEqual([f["id"] for f in page], [101])
+        self.assertIsNone(cursor)
+
+    def test_filters(self):
+        ids = lambda page: [f["id"] for f in page[0]]
+        self.assertEqual(ids(self.client.list_friends(prefix="s")), [103, 104, 101])
+        self.assertEqual(ids(self.client.list_friends(has_balance=True)), [104, 101])
+        self.assertEqual(ids(self.client.list_friends(group_name="Apartment")), [103, 101])
+        self.assertEqual(ids(self.client.list_groups(member_name="Sam")), [501])
+        groups, _ = self.client.list_groups(prefix="apt")
+        self.assertEqual(groups, [])
+        groups, _ = self.client.list_groups()
+        self.assertEqual(groups[0], {"id": 500, "name": "Apartment", "members": 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.agent.backends import create_agent
+from splitwise_mcp.agent.local import LocalIntentAgent, parse_command
+
+class TestParseCommand(unittest.TestCase):
+    def test_equal_split(self):
+        self.assertEqual(
+            parse_command("Split $45.50 with Mridul, Priya and Sumeet for lunch"),
+            ("add_expense", {"amount": "45.50", "description": "Lunch", "friend_names": ["Mridul", "Priya", "Sumeet"]}),
+        )
+
+    def test_group_exclusion_and_payer(self):
+        tool, args = parse_command("Alice paid 120 in the Apartment group for groceries except Bob")
+        self.assertEqual(tool, "add_expense")
+        self.assertEqual(args["group_name"], "Apartment")
+        self.assertEqual(args["payer_name"], "Alice")
+        self.assertEqual(args["exclude_names"], ["Bob"])
+
+    def test_percentage_split(self):
+        _, args = parse_command("split 100 for rent, me 40% and alice 60%")
+        self.assertEqual(args["split_map"], {"me": "40%", "Alice": "60%"})
+        self.assertEqual(args["friend_names"], ["Alice"])
+
+    def test_delete_and_list(self):
+        self.assertEqual(parse_command("delete expense 12345"), ("delete_expense", {"expense_id": "12345"}))
+        self.assertEqual(parse_command("who are my friends"), ("list_friends", {}))
+        self.assertIsNone(parse_command("hello there"))
+
+    def test_currency(self):
+        _, args = parse_command("split 50 euros with Alice for dinner")
+        self.assertEqual(args["currency"], "EUR")
+        self.assertEqual(args["amount"], "50")
+
+    def test_update_amount(self):
+        self.assertEqual(
+            parse_command("change expense 12345 to 45.50"),
+            ("update_expense", {"expense_id": "12345", "amount": "45.50"}),
+        )
+
+class TestLocalAgentOffline(unittest.TestCase):
+    def setUp(self):
+        self.env = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key', 'SPLITWISE_LLM_BACKEND': 'local'})
+        self.env.start()
+        self.splitwise = patch('splitwise_mcp.client.Splitwise')
+        sdk = self.splitwise.start().return_value
+        friend = MagicMock()
+        friend.getId.return_value = 101
+        friend.getFirstName.return_value = "Sumeet"
+        friend.getLastName.return_value = "Singh"
+        sdk.getFriends.return_value = [friend]
+        sdk.getGroups.return_value = []
+        me = MagicMock()
+        me.getId.return_value = 999
+        sdk.getCurrentUser.return_value = me
+        sdk.createExpense.return_value = (MagicMock(), None)
+        self.sdk = sdk
+
+    def tearDown(self):
+        self.splitwise.stop()
+        self.env.stop()
+
+    def test_backend_selected_from_env(self):
+        self.assertIsInstance(create_agent(), LocalIntentAgent)
+
+    def test_process_and_execute(self):
+        reply = create_agent().process_and_execute("split 50 with sumeet for dinner")
+        self.assertIn("Added 'Dinner'", reply)
+        self.sdk.createExpense.assert_called_once()
+
+    def test_near_miss_clarified_locally(self):
+        agent = create_agent()
+        self.assertIn("Sumeet Singh", agent.process_and_execute("split 50 with humeet for dinner"))
+        agent.process_and_execute("yes")
+        self.sdk.createExpense.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -170,5 +170,72 @@ class TestSplitwiseLogic(unittest.TestCase):
         self.assertEqual(expense.getGroupId(), 500)
         self.assertEqual(expense.getDescription(), "Rent")
 
+    def _seed_dinner(self):
+        me = MagicMock()
+        me.getId.return_value = 999
+        me.getFirstName.return_value = "Me"
+        me.getLastName.return_value = ""
+        self.mock_client.getCurrentUser.return_value = me
+        f1 = MagicMock()
+        f1.getFirstName.return_value = "Sumeet"
+        f1.getLastName.return_value = "Singh"
+        f1.getId.return_value = 101
+        self.mock_client.getFriends.return_value = [f1]
+        self.mock_client.getGroups.return_value = []
+        self.client_wrapper.expense_index.upsert_rows([(
+            {"id": 77, "description": "Dinner", "cost": 90.0, "date": "2026-01-01T00:00:00Z",
+             "group_id": None, "payer_id": 999},
+            [(999, 90.0, 30.0), (101, 0.0, 30.0), (102, 0.0, 30.0)],
+        )])
+        self.mock_client.updateExpense.return_value = (MagicMock(), None)
+
+    def test_update_expense_sends_only_changes(self):
+        self._seed_dinner()
+
+        _, changed = self.client_wrapper.update_expense("77", amount="60", description="Dinner")
+
+        self.assertEqual(changed, ["cost", "shares"])
+        self.mock_client.createExpense.assert_not_called()
+        self.mock_client.deleteExpense.assert_not_called()
+        expense = self.mock_client.updateExpense.call_args[0][0]
+        self.assertEqual(expense.getId(), 77)
+        self.assertEqual(expense.getCost(), "60.00")
+        self.assertNotIn("description", expense.__dict__)
+        shares = {u.getId(): (u.getPaidShare(), u.getOwedShare()) for u in expense.getUsers()}
+        self.assertEqual(shares, {999: ("60.00", "20.00"), 101: ("0.00", "20.00"), 102: ("0.00", "20.00")})
+
+    def test_update_expense_split_map_and_noop(self):
+        self._seed_dinner()
+
+        _, changed = self.client_wrapper.update_expense("77", description="Dinner")
+        self.assertEqual(changed, [])
+        self.mock_client.updateExpense.assert_not_called()
+
+        _, changed = self.client_wrapper.update_expense("77", split_map={"me": "50%", "Sumeet": "50%"})
+        self.assertEqual(changed, ["shares"])
+        expense = self.mock_client.updateExpense.call_args[0][0]
+        self.assertNotIn("cost", expense.__dict__)
+        owed = {u.getId(): u.getOwedShare() for u in expense.getUsers()}
+        self.assertEqual(owed, {999: "45.00", 101: "45.00", 102: "0.00"})
+
+    def test_update_expense_keeps_multiple_payers(self):
+        self._seed_dinner()
+        self.client_wrapper.expense_index.upsert_rows([(
+            {"id": 78, "description": "Groceries", "cost": 90.0, "date": "2026-01-02T00:00:00Z",
+             "group_id": None, "payer_id": 999},
+            [(999, 45.0, 45.0), (101, 45.0, 45.0)],
+        )])
+
+        _, changed = self.client_wrapper.update_expense("78", description="Weekly groceries")
+        self.assertEqual(changed, ["description"])
+        expense = self.mock_client.updateExpense.call_args[0][0]
+        self.assertNotIn("users", expense.__dict__)
+
+        _, changed = self.client_wrapper.update_expense("78", amount="60")
+        self.assertEqual(changed, ["cost", "shares"])
+        expense = self.mock_client.updateExpense.call_args[0][0]
+        shares = {u.getId(): (u.getPaidShare(), u.getOwedShare()) for u in expense.getUsers()}
+        self.assertEqual(shares, {999: ("30.00", "30.00"), 101: ("30.00", "30.00")})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from splitwise_mcp.matching import NameIndex, phonetic_keys
+
+class TestPhoneticKeys(unittest.TestCase):
+    def test_sound_alike_names_share_keys(self):
+        self.assertEqual(phonetic_keys("Kathy"), phonetic_keys("Cathy"))
+        self.assertEqual(phonetic_keys("Philip"), phonetic_keys("Filip"))
+        self.assertEqual(phonetic_keys("Sumeet")[0], phonetic_keys("Sumit")[0])
+        self.assertNotEqual(phonetic_keys("Sumeet")[0], phonetic_keys("Mridul")[0])
+
+    def test_alternate_code_for_ambiguous_sounds(self):
+        primary, alternate = phonetic_keys("George")
+        self.assertNotEqual(primary, alternate)
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex([
+            ("friend", 101, "Sumeet Singh"),
+            ("friend", 102, "Mridul Kumar"),
+            ("friend", 103, "Priya Shah"),
+            ("group", 500, "Apartment"),
+        ])
+
+    def test_lookup_is_exact(self):
+        self.assertEqual(self.index.lookup("sumeet", kind="friend"), [("friend", 101, "Sumeet Singh")])
+        self.assertEqual(self.index.lookup("Mridul Kumar"), [("friend", 102, "Mridul Kumar")])
+        self.assertEqual(self.index.lookup("Humeet"), [])
+
+    def test_mistranscription_has_clear_winner(self):
+        match = self.index.resolve("Humeet", kind="friend")
+        self.assertTrue(match.clear)
+        self.assertEqual(match.entry[2], 101)
+
+    def test_ambiguous_names_are_not_clear(self):
+        index = NameIndex([("friend", 1, "Sumeet Singh"), ("friend", 2, "Sumit Rao")])
+        match = index.resolve("Sumeth", kind="friend")
+        self.assertFalse(match.clear)
+        self.assertEqual({c[2] for c in match.candidates}, {1, 2})
+
+    def test_unknown_name_has_no_candidates(self):
+        self.assertEqual(self.index.resolve("Zebediah", kind="friend").candidates, [])
+
+    def test_kind_filter_and_utterance_search(self):
+        results = self.index.search("split 40 with priya in the apartmnt group")
+        self.assertEqual({r[2] for r in results}, {103, 500})
+        self.assertEqual([r[2] for r in self.index.search("apartmnt", kind="friend")], [])
+
+if __name__ == '__main__':
+    unittest.main()
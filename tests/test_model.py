@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import MagicMock
+from splitwise_mcp.model import Group, User, build_directory
+
+def make_user(uid, first, last=""):
+    u = MagicMock()
+    u.getId.return_value = uid
+    u.getFirstName.return_value = first
+    u.getLastName.return_value = last
+    u.getEmail.return_value = None
+    return u
+
+class TestModel(unittest.TestCase):
+    def test_build_directory_shares_users(self):
+        sumeet = make_user(101, "Sumeet", "Singh")
+        group = MagicMock()
+        group.getId.return_value = 500
+        group.getName.return_value = "Apartment"
+        group.getMembers.return_value = [make_user(999, "Me"), make_user(101, "Sumeet", "Singh")]
+
+        me, friends, groups = build_directory(make_user(999, "Me"), [sumeet], [group])
+        self.assertIsInstance(friends[0], User)
+        self.assertEqual(friends[0].name, "Sumeet Singh")
+        self.assertIsInstance(groups[0], Group)
+        self.assertIs(groups[0].members[0], me)
+        self.assertIs(groups[0].members[1], friends[0])
+
+    def test_slots_and_sdk_getters(self):
+        user = User(101, "Sumeet", None)
+        self.assertFalse(hasattr(user, "__dict__"))
+        self.assertEqual(user.name, "Sumeet")
+        self.assertEqual((user.getId(), user.getFirstName(), user.getLastName()), (101, "Sumeet", None))
+        group = Group(500, "Apartment", [user])
+        self.assertEqual(group.getMembers(), [user])
+        self.assertIs(User.from_sdk(user), user)
+
+if __name__ == '__main__':
+    unittest.main()
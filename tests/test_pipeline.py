@@ -0,0 +1,80 @@
+import base64
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from splitwise_mcp.pipeline import DeadlineExceeded, JobCancelled, PipelineSaturated, VoicePipeline
+
+class SlowAgent:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def process_and_execute(self, text):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return f"done: {text}"
+
+class TestVoicePipeline(unittest.TestCase):
+    def setUp(self):
+        self.transcriber = MagicMock()
+        self.transcriber.transcribe_bytes.side_effect = lambda data: data.decode()
+        self.agent = SlowAgent()
+
+    def make(self, **kwargs):
+        pipeline = VoicePipeline(lambda: self.transcriber, lambda: self.agent, **kwargs)
+        self.addCleanup(pipeline.shutdown)
+        return pipeline
+
+    def test_audio_flows_through_all_stages(self):
+        pipeline = self.make()
+        job = pipeline.submit_audio(base64.b64encode(b"split 50 with sumeet").decode())
+        self.assertEqual(job.result(timeout=5), "done: split 50 with sumeet")
+        self.assertEqual(job.transcript, "split 50 with sumeet")
+
+    def test_empty_transcript_skips_agent(self):
+        self.transcriber.transcribe_bytes.side_effect = lambda data: "  "
+        job = self.make().submit_audio(base64.b64encode(b"noise").decode())
+        self.assertIsNone(job.result(timeout=5))
+
+    def test_backpressure_rejects_when_full(self):
+        self.agent.delay = 0.3
+        pipeline = self.make(max_pending=2)
+        jobs = [pipeline.submit_text("a"), pipeline.submit_text("b")]
+        with self.assertRaises(PipelineSaturated) as ctx:
+            pipeline.submit_text("c")
+        self.assertGreaterEqual(ctx.exception.retry_after, 1.0)
+        for job in jobs:
+            job.result(timeout=5)
+        # Slots are released once jobs finish.
+        pipeline.submit_text("d").result(timeout=5)
+
+    def test_agent_stage_is_serialised(self):
+        self.agent.delay = 0.05
+        pipeline = self.make(agent_workers=1)
+        jobs = [pipeline.submit_text(str(i)) for i in range(5)]
+        for job in jobs:
+            job.result(timeout=5)
+        self.assertEqual(self.agent.max_active, 1)
+
+    def test_deadline_and_cancellation(self):
+        self.agent.delay = 0.2
+        pipeline = self.make()
+        first = pipeline.submit_text("slow")
+        late = pipeline.submit_text("late", timeout=0.05)
+        with self.assertRaises(DeadlineExceeded):
+            late.result(timeout=5)
+        cancelled = pipeline.submit_text("cancel me")
+        cancelled.cancel()
+        with self.assertRaises(JobCancelled):
+            cancelled.result(timeout=5)
+        first.result(timeout=5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import unittest
+from splitwise_mcp.profiling import ProfilingMiddleware, SamplingProfiler, memory, profiled, tool_scope
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+class TestProfiling(unittest.TestCase):
+    def test_samples_are_attributed_to_tools(self):
+        stop = threading.Event()
+
+        def work():
+            with tool_scope("text_command"):
+                spin(stop)
+
+        t = threading.Thread(target=work, name="worker")
+        profiler = SamplingProfiler(interval=0.002).start()
+        t.start()
+        stop.wait(0.2)
+        stop.set()
+        t.join()
+        profiler.stop()
+
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(any(l.startswith("tool:text_command;thread:worker;") and "spin (" in l for l in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+
+    def test_memory_diff_and_per_tool_growth(self):
+        kept = []
+
+        @profiled("add_expense")
+        def leak():
+            kept.append(bytearray(200000))
+
+        memory.start()
+        try:
+            memory.snapshot("before")
+            leak()
+            memory.snapshot("after")
+            diff = memory.diff("before", "after", limit=3)
+        finally:
+            memory.stop()
+        self.assertGreater(diff["size_diff_bytes"], 150000)
+        self.assertEqual(diff["by_tool"]["add_expense"]["calls"], 1)
+        self.assertGreater(diff["by_tool"]["add_expense"]["net_bytes"], 150000)
+        with self.assertRaises(ValueError):
+            memory.diff("before", "missing")
+
+    def test_endpoints_require_token(self):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def call(path, token=None, query=b"", method="POST"):
+            sent = []
+            if isinstance(token, str):
+                token = f"Bearer {token}".encode()
+            headers = [(b"authorization", token)] if token else []
+            scope = {"type": "http", "method": method, "path": path,
+                     "headers": headers, "query_string": query}
+
+            async def send(message):
+                sent.append(message)
+            await ProfilingMiddleware(app, token="secret")(scope, None, send)
+            return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+        self.assertEqual(asyncio.run(call("/sse"))[0], 204)
+        self.assertEqual(asyncio.run(call("/admin/profile"))[0], 401)
+        self.assertEqual(asyncio.run(call("/admin/profile", "wrong"))[0], 401)
+        self.assertEqual(asyncio.run(call("/admin/profile", "Bearer s\xe9cret".encode("latin-1")))[0], 401)
+        self.assertEqual(asyncio.run(call("/admin/profile", "secret", method="GET"))[0], 405)
+        self.assertEqual(asyncio.run(call("/admin/memory/diff", "secret"))[0], 405)
+        self.assertEqual(asyncio.run(call("/admin/nothing", "secret"))[0], 404)
+        status, body = asyncio.run(call("/admin/profile", "secret", b"seconds=0.05&interval_ms=0"))
+        self.assertEqual(status, 200)
+        self.assertIn(b"thread:", body)
+
+if __name__ == '__main__':
+    unittest.main()
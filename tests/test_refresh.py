@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.refresh import BackgroundRefresher, Change, WebhookSimulator, parse_webhook, verify_secret
+
+def make_friend(fid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = fid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    return f
+
+def make_group(gid, name):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    return g
+
+def make_expense(expense_id, description):
+    payer = MagicMock()
+    payer.getId.return_value = 999
+    payer.getPaidShare.return_value = "30.00"
+    payer.getOwedShare.return_value = "30.00"
+    e = MagicMock()
+    e.getId.return_value = expense_id
+    e.getDescription.return_value = description
+    e.getCost.return_value = "30.00"
+    e.getCurrencyCode.return_value = "USD"
+    e.getDate.return_value = "2024-03-05T09:00:00Z"
+    e.getGroupId.return_value = None
+    e.getUsers.return_value = [payer]
+    e.getCategory.return_value = None
+    e.getUpdatedAt.return_value = "2024-03-05T09:00:00Z"
+    e.getDeletedAt.return_value = None
+    return e
+
+def make_notification(notification_type, source_type, source_id):
+    n = MagicMock()
+    n.getType.return_value = notification_type
+    n.getSource.return_value.getType.return_value = source_type
+    n.getSource.return_value.getId.return_value = source_id
+    return n
+
+class TestChangeNotifications(unittest.TestCase):
+    def setUp(self):
+        self.env = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key', 'SPLITWISE_WEBHOOK_SECRET': 's3cret'})
+        self.env.start()
+        self.splitwise = patch('splitwise_mcp.client.Splitwise')
+        sdk = self.splitwise.start().return_value
+        sdk.getFriends.return_value = [make_friend(101, "Sumeet", "Singh"), make_friend(102, "Mridul", "Kumar")]
+        sdk.getGroups.return_value = [make_group(500, "Apartment")]
+        sdk.getExpense.side_effect = lambda eid: make_expense(eid, "Cab")
+        sdk.getGroup.side_effect = lambda gid: make_group(gid, "Flat 4B")
+        self.sdk = sdk
+        self.client = SplitwiseClient()
+
+    def tearDown(self):
+        self.splitwise.stop()
+        self.env.stop()
+
+    def test_parse_webhook(self):
+        changes = parse_webhook({
+            "changes": [{"resource": "expense", "action": "delete", "id": "7"}],
+            "notifications": [{"type": 8, "source": {"type": "User", "id": 103}}, {"type": 10, "source": {}}],
+        })
+        self.assertEqual(changes, [Change("expense", "delete", 7), Change("friend", "upsert", 103)])
+        with self.assertRaises(ValueError):
+            parse_webhook({"changes": [{"resource": "balance", "id": 1}]})
+        self.assertTrue(verify_secret("s3cret"))
+        self.assertFalse(verify_secret("nope"))
+        self.assertFalse(verify_secret("s3cr\u00e9t"))
+
+    def test_apply_changes_touches_only_affected_entries(self):
+        self.client.get_groups()
+        version = self.client.directory.version
+        self.client.apply_changes([Change("expense", "upsert", 1), Change("group", "upsert", 500)])
+        self.assertEqual(self.client.expense_index.count(), 1)
+        self.assertEqual(self.client.find_group_by_name("Flat 4B").getId(), 500)
+        self.assertGreater(self.client.directory.version, version)
+        self.assertEqual(self.sdk.getGroups.call_count, 1)
+
+        self.client.apply_changes([Change("expense", "delete", 1), Change("friend", "delete", 102)])
+        self.assertEqual(self.client.expense_index.count(), 0)
+        self.assertIsNone(self.client.find_friend_by_name("Mridul"))
+        self.assertEqual(self.sdk.getFriends.call_count, 1)
+
+    def test_poll_changes_uses_notifications_since_last_poll(self):
+        self.assertEqual(self.client.poll_changes(), 0)
+        self.sdk.getNotifications.assert_not_called()
+        self.sdk.getNotifications.return_value = [make_notification(0, "Expense", 9), make_notification(1, "Expense", 9)]
+        self.assertEqual(self.client.poll_changes(), 1)
+        self.assertIsNotNone(self.sdk.getNotifications.call_args.kwargs["updated_after"])
+        self.sdk.getExpense.assert_called_once_with(9)
+
+    def test_adaptive_interval(self):
+        target = MagicMock()
+        target.poll_changes.return_value = 0
+        refresher = BackgroundRefresher(target, min_interval=5, max_interval=60)
+        refresher.note_write()
+        self.assertEqual(refresher.interval, 5)
+        for expected in (10, 20, 40, 60, 60):
+            refresher.poll_once()
+            self.assertEqual(refresher.interval, expected)
+        target.poll_changes.return_value = 2
+        refresher.poll_once()
+        self.assertEqual(refresher.interval, 5)
+
+    def test_simulator_round_trip(self):
+        def post(path, json=None, headers=None):
+            if not verify_secret(headers.get("X-Webhook-Secret")):
+                return 401
+            self.client.apply_changes(parse_webhook(json))
+            return 200
+
+        simulator = WebhookSimulator(post)
+        self.assertEqual(simulator.expense_added(3), 200)
+        self.assertEqual(self.client.expense_index.count(), 1)
+        self.assertEqual(simulator.expense_deleted(3), 200)
+        self.assertEqual(self.client.expense_index.count(), 0)
+        self.assertEqual(WebhookSimulator(post, secret="wrong").expense_added(4), 401)
+
+if __name__ == '__main__':
+    unittest.main()
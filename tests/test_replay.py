@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import requests
+from splitwise_mcp import capture
+from splitwise_mcp.capture import recorded
+from splitwise_mcp.replay import Replayer, load
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({"path": self.path, "served": "live"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@recorded()
+def fake_tool(payer_name: str, api_key: str = None, audio_base64: str = None, url: str = None):
+    if url:
+        return requests.get(url).json()["path"]
+    return f"Added for {payer_name}"
+
+def write_capture(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = "http://127.0.0.1:%d" % self.server.server_address[1]
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(capture.stop)
+
+    def test_records_sanitised_tools_and_upstreams(self):
+        capture.start(self.path)
+        self.assertEqual(fake_tool("Sumeet", api_key="sekrit", audio_base64="QUJD" * 10), "Added for Sumeet")
+        requests.get(self.base + "/api/v3.0/get_friends?token=abc&limit=5")
+        with httpx.Client() as client:
+            client.get(self.base + "/v1/listen")
+        capture.stop()
+
+        with open(self.path) as f:
+            text = f.read()
+        self.assertNotIn("sekrit", text)
+        calls, exchanges = load(self.path)
+        self.assertEqual(calls[0]["name"], "fake_tool")
+        self.assertEqual(calls[0]["args"], {"payer_name": "Sumeet", "api_key": "[redacted]", "audio_base64": {"$audio": 40}})
+        self.assertTrue(calls[0]["ok"])
+        self.assertEqual([e["url"].split("?")[0] for e in exchanges],
+                         [self.base + "/api/v3.0/get_friends", self.base + "/v1/listen"])
+        self.assertTrue(exchanges[0]["url"].endswith("?token=[redacted]&limit=5"))
+        self.assertEqual(json.loads(exchanges[1]["body"])["path"], "/v1/listen")
+
+    def test_streamed_bodies_are_recorded_as_consumed(self):
+        capture.start(self.path)
+        with requests.get(self.base + "/requests", stream=True) as response:
+            # Nothing is read (or recorded) before the caller consumes the body
+            self.assertEqual(load(self.path)[1], [])
+            self.assertEqual(json.loads(b"".join(response.iter_content(4)))["path"], "/requests")
+        with httpx.Client() as client, client.stream("GET", self.base + "/httpx") as response:
+            self.assertFalse(response.is_stream_consumed)
+            self.assertEqual(json.loads("".join(response.iter_lines()))["path"], "/httpx")
+
+        async def fetch():
+            async with httpx.AsyncClient() as client, client.stream("GET", self.base + "/async") as response:
+                await response.aread()
+                # A second pass is served from memory and not recorded again
+                return json.loads("".join([line async for line in response.aiter_lines()]))["path"]
+
+        self.assertEqual(asyncio.run(fetch()), "/async")
+        capture.stop()
+
+        _, exchanges = load(self.path)
+        self.assertEqual([json.loads(e["body"])["path"] for e in exchanges], ["/requests", "/httpx", "/async"])
+
+    def test_hooks_are_removed_when_stopped(self):
+        original = requests.Session.send
+        capture.start(self.path)
+        self.assertIsNot(requests.Session.send, original)
+        capture.stop()
+        self.assertIs(requests.Session.send, original)
+        self.assertIsNone(capture.recorder)
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def test_upstreams_are_served_from_capture(self):
+        url = "http://splitwise.invalid/api/v3.0/get_expenses"
+        write_capture(self.path, [
+            {"t": "start", "v": 1, "at": 0.0},
+            {"t": "tool", "seq": 1, "at": 0.0, "name": "fake_tool", "args": {"payer_name": "A", "url": url}, "ms": 5, "ok": True},
+            {"t": "http", "at": 0.001, "method": "GET", "url": url, "req": "", "status": 200,
+             "ct": "application/json", "body": json.dumps({"path": "recorded"}), "ms": 3},
+        ])
+        seen = []
+
+        def tool(payer_name, url):
+            seen.append(fake_tool(payer_name, url=url))
+            return "ok"
+
+        report = asyncio.run(Replayer(self.path, speed=0, tools={"fake_tool": tool}).run())
+        self.assertEqual(seen, ["recorded"])
+        self.assertEqual(report["calls"], 1)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["upstream"], {"hits": 1, "misses": 0})
+        self.assertEqual(report["tools"]["fake_tool"]["calls"], 1)
+
+    def test_paces_calls_and_limits_concurrency(self):
+        write_capture(self.path, [
+            {"t": "tool", "seq": i, "at": i * 0.2, "name": "slow", "args": {}, "ms": 50, "ok": True}
+            for i in range(4)
+        ])
+        active, peak = [0], [0]
+
+        def slow():
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            active[0] -= 1
+            return "done"
+
+        started = time.monotonic()
+        report = asyncio.run(Replayer(self.path, speed=4, tools={"slow": slow}).run())
+        # Offsets 0..0.6s at 4x speed: the last call starts ~0.15s in.
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(report["calls"], 4)
+
+        peak[0] = 0
+        asyncio.run(Replayer(self.path, speed=0, concurrency=1, tools={"slow": slow}).run())
+        self.assertEqual(peak[0], 1)
+
+    def test_unknown_tool_and_missing_upstream_count_as_errors(self):
+        write_capture(self.path, [
+            {"t": "tool", "seq": 1, "at": 0.0, "name": "gone", "args": {}, "ms": 1, "ok": True},
+            {"t": "tool", "seq": 2, "at": 0.0, "name": "fetch", "args": {}, "ms": 1, "ok": True},
+        ])
+
+        def fetch():
+            return "Error" if requests.get("http://nowhere.invalid/x").status_code == 502 else "ok"
+
+        replayer = Replayer(self.path, speed=0, tools={"fetch": fetch})
+        report = asyncio.run(replayer.run())
+        self.assertEqual(report["errors"], 2)
+        self.assertEqual(report["outcome_changed"], 2)
+        self.assertEqual(report["upstream"]["misses"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import base64
+import threading
+import time
+import unittest
+from splitwise_mcp.pipeline import VoicePipeline
+from splitwise_mcp.resilience import (
+    CircuitBreaker, CircuitOpen, Upstream, UpstreamTimeout, deadline_scope, remaining,
+)
+
+class FlakyService:
+    """Stalls on the calls listed in `stall`, answers immediately otherwise."""
+
+    def __init__(self, stall=(), delay=1.0):
+        self.stall = set(stall)
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        if n in self.stall:
+            time.sleep(self.delay)
+        return f"{value}#{n}"
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_failures_and_half_opens_after_reset(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failures=2, reset_after=10, clock=lambda: now[0])
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+        self.assertAlmostEqual(breaker.retry_after(), 10)
+
+        now[0] = 10.0
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # one trial at a time
+        breaker.failure()
+        self.assertEqual(breaker.state, "open")
+
+        now[0] = 20.0
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, "closed")
+
+class TestUpstream(unittest.TestCase):
+    def test_deadline_bounds_a_stalled_call(self):
+        upstream = Upstream("stt", timeout=30)
+        service = FlakyService(stall={1}, delay=1.0)
+        started = time.monotonic()
+        with deadline_scope(time.monotonic() + 0.1):
+            self.assertLess(remaining(), 0.2)
+            with self.assertRaises(UpstreamTimeout):
+                upstream.call(service, "audio")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertIsNone(remaining())
+        self.assertEqual(upstream.stats()["timeouts"], 1)
+
+    def test_short_deadline_does_not_open_the_circuit(self):
+        upstream = Upstream("stt", timeout=30, breaker=CircuitBreaker(failures=1, reset_after=60))
+        upstream.latency.min_samples = 1
+        service = FlakyService(stall={1}, delay=1.0)
+        with deadline_scope(time.monotonic() + 0.05):
+            with self.assertRaises(UpstreamTimeout):
+                upstream.call(service, "audio")
+        self.assertEqual(upstream.stats()["state"], "closed")
+        self.assertIsNone(upstream.latency.percentile(0))
+        self.assertEqual(upstream.call(service, "audio"), "audio#2")
+
+        # Timing out at the upstream's own timeout still counts
+        slow = Upstream("stt", timeout=0.05, breaker=CircuitBreaker(failures=1, reset_after=60))
+        with self.assertRaises(UpstreamTimeout):
+            slow.call(FlakyService(stall={1}, delay=1.0), "audio")
+        self.assertEqual(slow.stats()["state"], "open")
+
+    def test_hedge_answers_when_first_attempt_stalls(self):
+        upstream = Upstream("stt", timeout=5, hedge=True, hedge_after=0.05)
+        service = FlakyService(stall={1}, delay=1.0)
+        started = time.monotonic()
+        self.assertEqual(upstream.call(service, "audio"), "audio#2")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual((upstream.hedged, upstream.hedge_wins), (1, 1))
+
+    def test_fast_calls_are_not_hedged(self):
+        upstream = Upstream("stt", timeout=5, hedge=True, hedge_after=0.5)
+        service = FlakyService()
+        for _ in range(3):
+            upstream.call(service, "audio")
+        self.assertEqual((service.calls, upstream.hedged), (3, 0))
+
+    def test_open_circuit_fails_fast_with_user_message(self):
+        upstream = Upstream("llm", label="The assistant", breaker=CircuitBreaker(failures=1, reset_after=60))
+
+        def broken(_):
+            raise ConnectionError("reset by peer")
+
+        with self.assertRaises(ConnectionError):
+            upstream.call(broken, "hi")
+        with self.assertRaises(CircuitOpen) as ctx:
+            upstream.call(broken, "hi")
+        self.assertIn("The assistant is unavailable", str(ctx.exception))
+        self.assertEqual(upstream.stats()["state"], "open")
+
+    def test_stream_is_bounded_as_a_whole(self):
+        upstream = Upstream("llm", timeout=0.2)
+
+        def chunks():
+            yield "a"
+            time.sleep(1.0)
+            yield "b"
+
+        received = []
+        with self.assertRaises(UpstreamTimeout):
+            for chunk in upstream.stream(chunks):
+                received.append(chunk)
+        self.assertEqual(received, ["a"])
+        self.assertEqual(list(Upstream("llm").stream(lambda: iter("xy"))), ["x", "y"])
+
+    def test_stream_closed_early_releases_the_trial(self):
+        now = [0.0]
+        upstream = Upstream("llm", breaker=CircuitBreaker(failures=1, reset_after=10, clock=lambda: now[0]))
+        upstream.breaker.failure()
+        now[0] = 10.0
+        closed = threading.Event()
+
+        def chunks():
+            try:
+                yield from "abc"
+            finally:
+                closed.set()
+
+        for chunk in upstream.stream(chunks):
+            break  # the half-open trial
+        self.assertTrue(closed.wait(1))
+        self.assertEqual(upstream.stats()["state"], "half-open")
+        self.assertTrue(upstream.breaker.allow())
+
+class TestPipelineDeadline(unittest.TestCase):
+    def test_job_deadline_reaches_upstream_calls(self):
+        upstream = Upstream("stt", timeout=30)
+        service = FlakyService(stall={1}, delay=2.0)
+
+        class Transcriber:
+            def transcribe_bytes(self, data):
+                return upstream.call(service, data.decode())
+
+        class Agent:
+            def process_and_execute(self, text):
+                return text
+
+        pipeline = VoicePipeline(lambda: Transcriber(), lambda: Agent(), timeout=0.2)
+        self.addCleanup(pipeline.shutdown)
+        started = time.monotonic()
+        job = pipeline.submit_audio(base64.b64encode(b"split 20").decode())
+        with self.assertRaises(UpstreamTimeout):
+            job.result(timeout=5)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
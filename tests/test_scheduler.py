@@ -0,0 +1,177 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.scheduler import ScheduleStore, Scheduler, _tag, advance, in_window, parse_window
+
+def make_friend(fid, first, last=""):
+    f = MagicMock()
+    f.getId.return_value = fid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    return f
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.find_tagged_expense.return_value = None
+        self.sleeps = []
+        self.scheduler = Scheduler(self.client, ScheduleStore(), batch_size=50, rate_per_minute=60,
+                                   window="", max_catch_up=12)
+        self.scheduler._sleep = self.sleeps.append
+
+    def test_monthly_advance_clamps_to_month_end(self):
+        self.assertEqual(advance(datetime(2024, 1, 31), "monthly"), datetime(2024, 2, 29))
+        self.assertEqual(advance(datetime(2024, 12, 15), "monthly"), datetime(2025, 1, 15))
+        self.assertEqual(advance(datetime(2024, 3, 1), "weekly"), datetime(2024, 3, 8))
+        self.assertEqual(advance(datetime(2024, 2, 29), "monthly", anchor_day=31), datetime(2024, 3, 31))
+
+    def test_month_end_schedule_does_not_drift(self):
+        self.scheduler.add_recurring("Rent", "1200", every="monthly", start="2024-01-31", group_name="Apartment")
+        self.scheduler.run_due(now=datetime(2024, 4, 30))
+        dates = [c.kwargs["date"][:10] for c in self.client.add_expense.call_args_list]
+        self.assertEqual(dates, ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"])
+
+    def test_window(self):
+        window = parse_window("23:00-05:00")
+        self.assertTrue(in_window(window, datetime(2024, 3, 1, 2, 30)))
+        self.assertFalse(in_window(window, datetime(2024, 3, 1, 12, 0)))
+        self.assertTrue(in_window(None, datetime(2024, 3, 1, 12, 0)))
+
+    def test_catch_up_after_downtime(self):
+        rent = self.scheduler.add_recurring("Rent", "1200", every="monthly", start="2024-01-01", group_name="Apartment")
+        summary = self.scheduler.run_due(now=datetime(2024, 3, 15))
+        self.assertEqual(summary["expenses"], 3)
+        dates = [c.kwargs["date"][:10] for c in self.client.add_expense.call_args_list]
+        self.assertEqual(dates, ["2024-01-01", "2024-02-01", "2024-03-01"])
+        recurring, _ = self.scheduler.store.list()
+        self.assertEqual((recurring[0]["id"], recurring[0]["next_run"][:10]), (rent, "2024-04-01"))
+        # Writes are spaced to the configured rate
+        self.assertEqual(len(self.sleeps), 2)
+
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 20))["expenses"], 0)
+
+    def test_failed_occurrence_is_retried(self):
+        self.scheduler.add_recurring("Wifi", "60", every="monthly", start="2024-03-01", friend_names=["Sumeet"])
+        self.client.add_expense.side_effect = ValueError("Friend not found: Sumeet.")
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 2))["failed"], 1)
+        recurring, _ = self.scheduler.store.list()
+        self.assertEqual(recurring[0]["next_run"][:10], "2024-03-01")
+        self.assertIn("not found", recurring[0]["last_error"])
+
+        self.client.add_expense.side_effect = None
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 2))["expenses"], 1)
+
+    def test_retry_after_timeout_does_not_duplicate(self):
+        self.scheduler.add_recurring("Wifi", "60", every="monthly", start="2024-03-01", friend_names=["Sumeet"])
+        self.client.add_expense.side_effect = TimeoutError("read timed out")
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 2))["failed"], 1)
+        tag = self.client.add_expense.call_args.kwargs["details"]
+        self.assertIn("2024-03-01", tag)
+
+        # Splitwise created it after all
+        self.client.find_tagged_expense.return_value = MagicMock()
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 2))["expenses"], 1)
+        self.assertEqual(self.client.add_expense.call_count, 1)
+        self.assertEqual(self.client.find_tagged_expense.call_args.args[0], tag)
+        recurring, _ = self.scheduler.store.list()
+        self.assertEqual((recurring[0]["next_run"][:10], recurring[0]["attempts"]), ("2024-04-01", 0))
+
+    def test_recurring_occurrence_skipped_after_max_attempts(self):
+        self.scheduler.add_recurring("Wifi", "60", every="monthly", start="2024-03-01", friend_names=["Ghost"])
+        self.client.add_expense.side_effect = ValueError("Friend not found: Ghost.")
+        for _ in range(3):
+            self.scheduler.run_due(now=datetime(2024, 3, 2))
+        self.assertEqual(self.client.add_expense.call_count, 3)
+        recurring, _ = self.scheduler.store.list()
+        self.assertEqual(recurring[0]["next_run"][:10], "2024-04-01")
+        self.assertIn("Skipped 2024-03-01", recurring[0]["last_error"])
+        self.assertEqual(self.scheduler.run_due(now=datetime(2024, 3, 2))["failed"], 0)
+
+    def test_settlements_batched_and_give_up_after_retries(self):
+        payment = MagicMock()
+        payment.getId.return_value = 77
+
+        def record_payment(payer_name, recipient_name, amount, group_name=None, details=None):
+            if payer_name == "Ghost":
+                raise ValueError("Payer not found: Ghost.")
+            return payment
+
+        self.client.record_payment.side_effect = record_payment
+        self.scheduler.add_settlement("me", "Sumeet", "40", run_at="2024-03-01")
+        self.scheduler.add_settlement("Ghost", "me", "10", run_at="2024-03-01")
+        for _ in range(4):
+            self.scheduler.run_due(now=datetime(2024, 3, 2))
+        _, pending = self.scheduler.store.list()
+        self.assertEqual(pending, [])
+        # One success, then three attempts for the failing one
+        self.assertEqual(self.client.record_payment.call_count, 4)
+
+    def test_processes_sharing_the_db_take_turns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "schedule.db")
+            self.scheduler.store = ScheduleStore(path)
+            self.scheduler.add_recurring("Rent", "1200", start="2024-01-01", group_name="Apartment")
+            other = ScheduleStore(path)
+            self.assertTrue(other.acquire_lease("scheduler", "draining-worker", ttl=60))
+
+            summary = self.scheduler.run_due(now=datetime(2024, 1, 2))
+            self.assertTrue(summary["deferred"])
+            self.client.add_expense.assert_not_called()
+
+            # A holder that died stops blocking once its lease expires
+            self.assertTrue(other.acquire_lease("scheduler", "draining-worker", ttl=60, now=time.time() - 120))
+            self.assertEqual(self.scheduler.run_due(now=datetime(2024, 1, 2))["expenses"], 1)
+            self.assertTrue(other.acquire_lease("scheduler", "draining-worker", ttl=60))
+
+    def test_next_run_persists_across_restarts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "schedule.db")
+            self.scheduler.store = ScheduleStore(path)
+            self.scheduler.add_recurring("Rent", "1200", start="2024-01-01", group_name="Apartment")
+            self.scheduler.run_due(now=datetime(2024, 1, 2))
+            recurring, _ = ScheduleStore(path).list()
+            self.assertEqual(recurring[0]["next_run"][:10], "2024-02-01")
+
+class TestFindTaggedExpense(unittest.TestCase):
+    @patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'})
+    @patch('splitwise_mcp.client.Splitwise')
+    def test_tag_matches_whole_line(self, MockSplitwise):
+        def payment(expense_id, details):
+            e = MagicMock()
+            e.getId.return_value = expense_id
+            e.getDetails.return_value = details
+            e.getDeletedAt.return_value = None
+            return e
+
+        MockSplitwise.return_value.getExpenses.return_value = [
+            payment(1, _tag("settlement", 50)),
+            payment(2, "Converted from 10.00 USD at 0.9\n" + _tag("settlement", 5)),
+        ]
+        client = SplitwiseClient()
+        self.assertEqual(client.find_tagged_expense(_tag("settlement", 5)).getId(), 2)
+        self.assertEqual(client.find_tagged_expense(_tag("settlement", 50)).getId(), 1)
+        self.assertIsNone(client.find_tagged_expense(_tag("settlement", 500)))
+
+class TestRecordPayment(unittest.TestCase):
+    def test_payment_shares(self):
+        with patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'}), patch('splitwise_mcp.client.Splitwise') as MockSplitwise:
+            sdk = MockSplitwise.return_value
+            me = make_friend(999, "Me")
+            sdk.getCurrentUser.return_value = me
+            sdk.getFriends.return_value = [make_friend(101, "Sumeet", "Singh")]
+            sdk.getGroups.return_value = []
+            sdk.createExpense.return_value = (MagicMock(), None)
+
+            SplitwiseClient().record_payment("me", "Sumeet", "40")
+
+            expense = sdk.createExpense.call_args.args[0]
+            self.assertTrue(expense.getPayment())
+            shares = [(u.getId(), u.getPaidShare(), u.getOwedShare()) for u in expense.getUsers()]
+            self.assertEqual(shares, [(999, "40.00", "0.00"), (101, "0.00", "40.00")])
+
+if __name__ == '__main__':
+    unittest.main()
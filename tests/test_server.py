@@ -0,0 +1,43 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from splitwise_mcp import server
+
+class TestLazyComponents(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        env = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key',
+                                        'SPLITWISE_SCHEDULE_DB': os.path.join(tmp.name, "schedule.db")})
+        env.start()
+        self.addCleanup(env.stop)
+        splitwise = patch('splitwise_mcp.client.Splitwise')
+        splitwise.start()
+        self.addCleanup(splitwise.stop)
+        saved = (server.client, server._scheduler)
+        server.client = server._scheduler = None
+
+        def restore():
+            if server._scheduler is not None:
+                server._scheduler.stop()
+            server.client, server._scheduler = saved
+        self.addCleanup(restore)
+
+    def test_scheduler_first_starts_one_worker(self):
+        scheduler = server._get_scheduler()
+        self.assertIs(scheduler.client, server._get_client())
+        self.assertIs(server._get_scheduler(), scheduler)
+        workers = [t for t in threading.enumerate() if t.name == "splitwise-scheduler"]
+        self.assertEqual(len(workers), 1)
+
+    def test_schedule_tools_report_errors(self):
+        with patch.dict('os.environ', {'SPLITWISE_SCHEDULE_DB': '/nonexistent/dir/schedule.db'}), \
+                self.assertLogs(server.logger):
+            self.assertIsNotNone(server._get_client())
+            self.assertTrue(server.list_scheduled().startswith("Error"))
+            self.assertTrue(server.cancel_scheduled("recurring", 1).startswith("Error"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.directory import Directory
+from splitwise_mcp.snapshot import DirectorySnapshot, credential_key
+
+def make_user(uid, first, last=""):
+    u = MagicMock()
+    u.getId.return_value = uid
+    u.getFirstName.return_value = first
+    u.getLastName.return_value = last
+    u.getEmail.return_value = f"{first.lower()}@example.com"
+    return u
+
+def make_group(gid, name, members):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    g.getMembers.return_value = members
+    return g
+
+class TestDirectorySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.me = make_user(999, "Shashwat")
+        self.friends = [make_user(101, "Sumeet", "Singh"), make_user(102, "Mridul", "Kumar")]
+        self.groups = [make_group(500, "Apartment", [self.me, self.friends[0], make_user(103, "Anya")])]
+        self.snapshot = DirectorySnapshot(self.tmp.name, credential_key("api-key"))
+
+    def test_round_trip(self):
+        self.snapshot.save(self.me, self.friends, self.groups)
+        me, friends, groups = self.snapshot.load()
+        self.assertEqual(me.getId(), 999)
+        self.assertEqual([(f.getId(), f.getLastName()) for f in friends], [(101, "Singh"), (102, "Kumar")])
+        self.assertEqual(groups[0].getName(), "Apartment")
+        self.assertEqual([m.getId() for m in groups[0].getMembers()], [999, 101, 103])
+        self.assertEqual(friends[0].getEmail(), "sumeet@example.com")
+
+    def test_keyed_per_credential(self):
+        self.assertNotEqual(credential_key("api-key"), credential_key("other-key"))
+        self.snapshot.save(self.me, self.friends, self.groups)
+        self.assertIsNone(DirectorySnapshot(self.tmp.name, credential_key("other-key")).load())
+
+    def test_warm_start_serves_snapshot_then_revalidates(self):
+        self.snapshot.save(self.me, self.friends, self.groups)
+        fetched = threading.Event()
+        release = threading.Event()
+
+        def slow_friends():
+            release.wait(5)
+            fetched.set()
+            return self.friends + [make_user(104, "Priya")]
+
+        directory = Directory(slow_friends, lambda: self.groups, ttl=300,
+                              fetch_me=lambda: self.me, snapshot=self.snapshot)
+        self.assertTrue(directory.warm())
+        # Served from disk while the API call is still in flight
+        self.assertEqual(len(directory.friends()), 2)
+        self.assertEqual(directory.resolve("sumeet", kind="friend").entry[2], 101)
+
+        release.set()
+        self.assertTrue(fetched.wait(5))
+        for _ in range(100):
+            if len(directory.friends()) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(directory.friends()), 3)
+        self.assertEqual(len(self.snapshot.load()[1]), 3)
+
+    def test_client_warms_from_snapshot(self):
+        env = {'SPLITWISE_API_KEY': 'fake_key', 'SPLITWISE_SNAPSHOT_DIR': self.tmp.name}
+        with patch.dict('os.environ', env), patch('splitwise_mcp.client.Splitwise') as MockSplitwise:
+            DirectorySnapshot(self.tmp.name, credential_key(None, None, "fake_key", None)).save(
+                self.me, self.friends, self.groups
+            )
+            sdk = MockSplitwise.return_value
+            sdk.getFriends.side_effect = RuntimeError("API down")
+            client = SplitwiseClient()
+            self.assertEqual(client.find_friend_by_name("Mridul").getId(), 102)
+            self.assertEqual(client.get_current_user().getId(), 999)
+            self.assertTrue(os.path.exists(client.directory.snapshot.path))
+
+if __name__ == '__main__':
+    unittest.main()
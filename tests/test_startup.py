@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Cold-start budget for `import splitwise_mcp.server` in a fresh interpreter.
+# stdio hosts spawn one process per session, so this is user-visible latency.
+IMPORT_BUDGET_MS = float(os.getenv("SPLITWISE_IMPORT_BUDGET_MS", "750"))
+
+# Optional stacks that a text-only MCP session must not import at startup.
+HEAVY_MODULES = ["splitwise", "google.genai", "deepgram", "sounddevice", "scipy", "numpy", "streamlit", "fastapi"]
+
+PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import splitwise_mcp.server
+elapsed = (time.perf_counter() - t0) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(elapsed)
+print(",".join(heavy))
+"""
+
+def _run_probe():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+        env={**os.environ, "SPLITWISE_API_KEY": "fake_key"},
+    ).stdout.splitlines()
+    return float(out[0]), [m for m in out[1].split(",") if m] if len(out) > 1 else []
+
+class TestStartup(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        _, heavy = _run_probe()
+        self.assertEqual(heavy, [])
+
+    def test_import_time_budget(self):
+        # Best of three to keep the test stable on noisy CI machines.
+        elapsed = min(_run_probe()[0] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET_MS, f"import splitwise_mcp.server took {elapsed:.0f}ms")
+
+if __name__ == '__main__':
+    unittest.main()
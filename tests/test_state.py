@@ -0,0 +1,121 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+from splitwise_mcp.admission import SharedRateLimiter
+from splitwise_mcp.directory import Directory
+from splitwise_mcp.snapshot import SharedDirectoryCache
+from splitwise_mcp.state import IdempotencyJournal, LocalRespServer, MemoryBackend, RedisBackend, SessionStore
+
+def make_user(uid, first, last=""):
+    u = MagicMock()
+    u.getId.return_value = uid
+    u.getFirstName.return_value = first
+    u.getLastName.return_value = last
+    u.getEmail.return_value = None
+    return u
+
+def make_group(gid, name, members):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    g.getMembers.return_value = members
+    return g
+
+class BackendContract:
+    def test_set_get_delete(self):
+        self.assertIsNone(self.backend.get("k"))
+        self.assertTrue(self.backend.set("k", "v"))
+        self.assertEqual(self.backend.get("k"), "v")
+        self.backend.delete("k")
+        self.assertIsNone(self.backend.get("k"))
+
+    def test_nx_and_ttl(self):
+        self.assertTrue(self.backend.set("lock", "a", ttl=0.05, nx=True))
+        self.assertFalse(self.backend.set("lock", "b", nx=True))
+        self.assertEqual(self.backend.get("lock"), "a")
+        time.sleep(0.1)
+        self.assertIsNone(self.backend.get("lock"))
+        self.assertTrue(self.backend.set("lock", "b", nx=True))
+
+    def test_incr(self):
+        self.assertEqual(self.backend.incr("n", ttl=10), 1)
+        self.assertEqual(self.backend.incr("n", 4), 5)
+
+class TestMemoryBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.backend = MemoryBackend()
+
+class TestRedisBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.server = LocalRespServer().start()
+        self.addCleanup(self.server.stop)
+        self.backend = RedisBackend(self.server.url)
+        self.addCleanup(self.backend.close)
+
+    def test_replicas_see_each_others_writes(self):
+        other = RedisBackend(self.server.url)
+        self.addCleanup(other.close)
+        self.backend.set("session:default", "x")
+        self.assertEqual(other.get("session:default"), "x")
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.backend = MemoryBackend()
+
+    def test_session_sync_reconfigures_other_replica(self):
+        store = SessionStore(self.backend)
+        first, second = MagicMock(spec=["configure"]), MagicMock(spec=["configure"])
+        store.save("default", {"access_token": "tok"}, client=first)
+
+        self.assertFalse(store.sync(first))
+        self.assertTrue(store.sync(second))
+        second.configure.assert_called_once_with(access_token="tok")
+        self.assertFalse(store.sync(second))
+
+    def test_session_save_keeps_fields_not_given(self):
+        store = SessionStore(self.backend)
+        store.save("default", {"consumer_key": "ck", "consumer_secret": "cs"})
+        store.save("default", {"api_key": "ak", "consumer_key": None})
+        self.assertEqual(store.load("default"), {"consumer_key": "ck", "consumer_secret": "cs", "api_key": "ak"})
+
+    def test_idempotency_journal(self):
+        journal = IdempotencyJournal(self.backend)
+        self.assertTrue(journal.claim("req-1"))
+        self.assertFalse(journal.claim("req-1"))
+        self.assertEqual(journal.result("req-1"), (False, None))
+        journal.record("req-1", {"id": 42})
+        self.assertEqual(journal.result("req-1"), (True, {"id": 42}))
+
+        self.assertTrue(journal.claim("req-2"))
+        journal.release("req-2")
+        self.assertTrue(journal.claim("req-2"))
+
+    def test_directory_replicas_share_one_fetch(self):
+        me = make_user(999, "Shashwat")
+        friends = [make_user(101, "Sumeet", "Singh")]
+        groups = [make_group(500, "Apartment", [me, friends[0]])]
+        fetch_friends = MagicMock(return_value=friends)
+        fetch_groups = MagicMock(return_value=groups)
+        cache = SharedDirectoryCache(self.backend, "key", ttl=60)
+
+        Directory(fetch_friends, fetch_groups, fetch_me=lambda: me, shared=cache).friends()
+        replica_fetch = MagicMock()
+        replica = Directory(replica_fetch, MagicMock(), fetch_me=MagicMock(), shared=cache)
+
+        self.assertEqual([f.name for f in replica.friends()], ["Sumeet Singh"])
+        self.assertEqual([m.id for m in replica.groups()[0].members], [999, 101])
+        self.assertEqual(fetch_friends.call_count, 1)
+        replica_fetch.assert_not_called()
+
+    def test_shared_rate_limiter_counts_across_replicas(self):
+        now = [100.0]
+        a = SharedRateLimiter(self.backend, rate=1, burst=2, clock=lambda: now[0])
+        b = SharedRateLimiter(self.backend, rate=1, burst=2, clock=lambda: now[0])
+        self.assertEqual(a.take("t"), 0.0)
+        self.assertEqual(b.take("t"), 0.0)
+        self.assertAlmostEqual(a.take("t"), 2.0)
+        now[0] = 102.0
+        self.assertEqual(b.take("t"), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
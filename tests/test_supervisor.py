@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import MagicMock
+from splitwise_mcp.supervisor import HashRing, Supervisor, parse_head, rewrite_head
+
+def make_worker(slot, alive=True):
+    w = MagicMock()
+    w.slot = slot
+    w.alive.return_value = alive
+    return w
+
+class TestHashRing(unittest.TestCase):
+    def test_stable_and_spread(self):
+        ring = HashRing(range(4))
+        tenants = [f"tenant-{i}" for i in range(2000)]
+        placement = {t: ring.lookup(t) for t in tenants}
+        self.assertEqual(placement, {t: ring.lookup(t) for t in tenants})
+        counts = [list(placement.values()).count(slot) for slot in range(4)]
+        self.assertTrue(all(300 < c < 700 for c in counts), counts)
+
+    def test_adding_a_slot_moves_few_tenants(self):
+        before, after = HashRing(range(4)), HashRing(range(5))
+        tenants = [f"tenant-{i}" for i in range(2000)]
+        moved = sum(before.lookup(t) != after.lookup(t) for t in tenants)
+        self.assertLess(moved, 2000 * 0.35)
+
+class TestProxying(unittest.TestCase):
+    def test_rewrite_head_forces_single_request(self):
+        head = b"POST /messages/?session_id=ab HTTP/1.1\r\nHost: x\r\nConnection: keep-alive\r\n\r\n"
+        method, target, headers = parse_head(head)
+        self.assertEqual((method, target), ("POST", "/messages/?session_id=ab"))
+        self.assertIn((b"host", b"x"), headers)
+
+        rewritten = rewrite_head(head, [(b"X-Tenant-ID", b"alice")])
+        self.assertNotIn(b"keep-alive", rewritten)
+        self.assertTrue(rewritten.endswith(b"X-Tenant-ID: alice\r\nConnection: close\r\n\r\n"))
+
+    def test_route_prefers_session_owner(self):
+        supervisor = Supervisor(workers=2)
+        supervisor.workers = {0: make_worker(0), 1: make_worker(1)}
+        slot = supervisor.ring.lookup("alice")
+        self.assertIs(supervisor.route("alice", "/sse"), supervisor.workers[slot])
+
+        # A stream opened before a reload stays with its (draining) worker
+        old = make_worker(slot)
+        supervisor.sessions["ab"] = old
+        self.assertIs(supervisor.route("bob", "/messages/?session_id=ab"), old)
+        old.alive.return_value = False
+        self.assertIs(supervisor.route("alice", "/messages/?session_id=ab"), supervisor.workers[slot])
+
+if __name__ == '__main__':
+    unittest.main()
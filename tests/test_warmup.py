@@ -0,0 +1,122 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from splitwise_mcp.supervisor import Supervisor, Worker
+from splitwise_mcp.warmup import HealthMiddleware, Warmup, selected_steps
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not predicate():
+        time.sleep(0.01)
+    return predicate()
+
+class TestWarmup(unittest.TestCase):
+    def test_selected_steps(self):
+        self.assertEqual(selected_steps("auto"), (["splitwise", "agent", "transcriber", "pipeline"], []))
+        self.assertEqual(selected_steps("off"), ([], []))
+        self.assertEqual(selected_steps("agent, splitwise"), (["agent", "splitwise"], ["agent", "splitwise"]))
+        with self.assertRaises(ValueError):
+            selected_steps("agent,gpu")
+
+    def test_steps_run_in_parallel_and_gate_readiness(self):
+        release = threading.Event()
+        running = []
+
+        def slow(name):
+            def step():
+                running.append(name)
+                release.wait(2)
+            return step
+
+        warmup = Warmup({"agent": slow("agent"), "transcriber": slow("transcriber")})
+        self.assertFalse(warmup.ready)
+        warmup.start()
+        self.assertTrue(wait_for(lambda: len(running) == 2))
+        self.assertFalse(warmup.ready)
+        release.set()
+        self.assertTrue(wait_for(lambda: warmup.ready))
+        self.assertEqual(warmup.status()["steps"]["agent"]["state"], "ok")
+
+    def test_optional_failure_does_not_block_but_required_is_retried(self):
+        def broken():
+            raise ValueError("Missing GEMINI_API_KEY")
+
+        optional = Warmup({"agent": broken}).start()
+        self.assertTrue(wait_for(lambda: optional.ready))
+        self.assertEqual(optional.status()["steps"]["agent"]["error"], "Missing GEMINI_API_KEY")
+
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise ConnectionError("reset")
+
+        required = Warmup({"splitwise": flaky}, required=["splitwise"], retry_max=0.05).start()
+        self.addCleanup(required.stop)
+        self.assertTrue(wait_for(lambda: required.ready, timeout=3))
+        self.assertEqual(required.status()["steps"]["splitwise"]["attempts"], 2)
+
+    def test_stalled_optional_step_stops_blocking_after_timeout(self):
+        stall = threading.Event()
+        self.addCleanup(stall.set)
+        warmup = Warmup({"transcriber": lambda: stall.wait(5)}, timeout=0.1).start()
+        self.assertFalse(warmup.ready)
+        self.assertTrue(wait_for(lambda: warmup.ready))
+
+class TestProbes(unittest.TestCase):
+    def test_health_and_readiness(self):
+        app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("hi"))])
+        release = threading.Event()
+        self.addCleanup(release.set)
+        warmup = Warmup({"pipeline": lambda: release.wait(2)}).start()
+        http = TestClient(HealthMiddleware(app, warmup))
+
+        self.assertEqual(http.get("/healthz").json(), {"status": "ok"})
+        response = http.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["steps"]["pipeline"]["state"], "running")
+        release.set()
+        self.assertTrue(wait_for(lambda: warmup.ready))
+        self.assertEqual(http.get("/readyz").status_code, 200)
+        self.assertEqual(http.get("/").text, "hi")
+
+class TestSupervisorReadiness(unittest.TestCase):
+    def test_waits_for_readyz(self):
+        socket_dir = tempfile.mkdtemp()
+        path = os.path.join(socket_dir, "worker.sock")
+        probes = []
+
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            probes.append(1)
+            status = b"503 Service Unavailable" if len(probes) < 3 else b"200 OK"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_unix_server(handle, path=path)
+            process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(10)"])
+            try:
+                worker = Worker(0, 1, path, process)
+                return await Supervisor(workers=1)._wait_ready(worker, timeout=5)
+            finally:
+                process.kill()
+                process.wait()
+                server.close()
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(len(probes), 3)
+
+if __name__ == '__main__':
+    unittest.main()
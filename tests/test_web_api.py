@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from splitwise_mcp import web_api
+from splitwise_mcp.client import SplitwiseClient
+from splitwise_mcp.state import MemoryBackend, SessionStore
+
+def make_friend(uid, first, last="", balance=None):
+    f = MagicMock()
+    f.getId.return_value = uid
+    f.getFirstName.return_value = first
+    f.getLastName.return_value = last
+    f.getEmail.return_value = None
+    balances = []
+    if balance is not None:
+        b = MagicMock()
+        b.getCurrencyCode.return_value = "USD"
+        b.getAmount.return_value = balance
+        balances.append(b)
+    f.getBalances.return_value = balances
+    return f
+
+def make_group(gid, name, members):
+    g = MagicMock()
+    g.getId.return_value = gid
+    g.getName.return_value = name
+    g.getMembers.return_value = members
+    return g
+
+class TestWebApi(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict('os.environ', {'SPLITWISE_API_KEY': 'fake_key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sdk = patch('splitwise_mcp.client.Splitwise')
+        sdk.start()
+        self.addCleanup(sdk.stop)
+
+        self.client = SplitwiseClient()
+        self.sdk = self.client.client
+        self.friends = [make_friend(100 + i, f"Friend{i:03d}", "Lee", "5") for i in range(60)]
+        self.sdk.getFriends.return_value = self.friends
+        self.sdk.getGroups.return_value = [make_group(500, "Apartment", self.friends[:2])]
+        self.sdk.getCurrentUser.return_value = make_friend(999, "Me")
+
+        client_patch = patch.object(web_api, "client", self.client)
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+        web_api._pages.clear()
+        self.http = TestClient(web_api.app)
+
+    def test_list_friends_revalidates_with_etag(self):
+        first = self.http.get("/list_friends", params={"limit": 2})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([f["id"] for f in first.json()["friends"]], [100, 101])
+        etag = first.headers["etag"]
+        self.assertIn("must-revalidate", first.headers["cache-control"])
+
+        again = self.http.get("/list_friends", params={"limit": 2}, headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b"")
+
+        other_page = self.http.get("/list_friends", params={"limit": 3}, headers={"If-None-Match": etag})
+        self.assertEqual(other_page.status_code, 200)
+
+    def test_etag_changes_when_balances_change(self):
+        etag = self.http.get("/list_friends").headers["etag"]
+        self.friends[0].getBalances.return_value = []
+        self.client.directory.refresh(force=True)
+        response = self.http.get("/list_friends", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], etag)
+        self.assertNotIn("balance", response.json()["friends"][0])
+
+    def test_etag_does_not_depend_on_process_local_version(self):
+        etag = self.http.get("/list_friends", params={"limit": 100}).headers["etag"]
+
+        def restarted():
+            # A restarted process (or another replica) starts its version counter over
+            fresh = SplitwiseClient()
+            fresh.client = self.sdk
+            web_api._pages.clear()
+            return patch.object(web_api, "client", fresh)
+
+        with restarted():
+            self.assertEqual(self.http.get("/list_friends", params={"limit": 100},
+                                           headers={"If-None-Match": etag}).status_code, 304)
+        self.friends[0].getFirstName.return_value = "Renamed"
+        with restarted():
+            # Same version number as before the rename, different contents
+            response = self.http.get("/list_friends", params={"limit": 100}, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Renamed Lee", [f["name"] for f in response.json()["friends"]])
+
+    def test_large_bodies_are_compressed(self):
+        response = self.http.get("/list_friends", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers.get("content-encoding"), "gzip")
+        self.assertEqual(len(response.json()["friends"]), 50)
+
+    def test_add_expense_supports_group_and_split_map(self):
+        expense = MagicMock()
+        expense.getId.return_value = 77
+        with patch.object(self.client, "add_expense", return_value=expense) as add:
+            response = self.http.post("/add_expense", json={
+                "amount": "30", "description": "Dinner", "group_name": "Apartment",
+                "split_map": {"me": "10", "Friend000": "20"}, "payer_name": "Friend000",
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], 77)
+        args, kwargs = add.call_args
+        self.assertEqual(args, ("30", "Dinner", []))
+        self.assertEqual(kwargs["group_name"], "Apartment")
+        self.assertEqual(kwargs["split_map"], {"me": "10", "Friend000": "20"})
+        self.assertEqual(kwargs["payer_name"], "Friend000")
+
+    def test_validation_errors_are_400(self):
+        with patch.object(self.client, "add_expense", side_effect=ValueError("Friend 'Zed' not found")):
+            response = self.http.post("/add_expense", json={"amount": "5", "description": "x", "friend_names": ["Zed"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Zed", response.json()["detail"])
+
+    def test_unconfigured_client_is_401(self):
+        self.client.client = None
+        self.assertEqual(self.http.get("/list_groups").status_code, 401)
+
+    def test_configure_keeps_credentials_not_sent(self):
+        sessions = SessionStore(MemoryBackend())
+        with patch.object(web_api, "sessions", sessions):
+            sessions.save(sessions.DEFAULT, {"consumer_key": "ck", "consumer_secret": "cs"})
+            self.assertEqual(self.http.post("/configure", json={"api_key": "new_key"}).status_code, 200)
+        self.assertEqual(sessions.load(sessions.DEFAULT),
+                         {"consumer_key": "ck", "consumer_secret": "cs", "api_key": "new_key"})
+
+    def test_lifespan_starts_and_stops_background_work(self):
+        warmup = MagicMock()
+        with patch.object(web_api, "warmup", warmup):
+            with TestClient(web_api.app):
+                warmup.start.assert_called_once()
+                warmup.stop.assert_not_called()
+        warmup.stop.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()